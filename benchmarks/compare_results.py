@@ -0,0 +1,172 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+
+Compare two benchmark results files (see run_benchmarks.py), e.g. the baseline of the previous release with the
+results of the current code:
+
+    python compare_results.py baseline.json results.json --tolerance 20
+
+The exit code is 1 in case of regressions: a median time or a memory growth grown more than the tolerance (and, for
+the memory, more than MEMORY_NOISE_MB), more requests sent or more failed runs.
+"""
+
+
+import argparse
+import json
+import sys
+
+# The MB of memory growth within the noise of the measure (e.g. the allocator and the garbage collector)
+MEMORY_NOISE_MB = 2.0
+
+
+def load_results(file_path):
+    """
+        Load the results file.
+        :param file_path: The file path
+        :type file_path: str
+        :return: The results
+        :rtype: dict
+    """
+    with open(file_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def get_change(baseline_value, current_value):
+    """
+        Compute the relative change, in percentage.
+        :param baseline_value: The baseline value
+        :type baseline_value: float
+        :param current_value: The current value
+        :type current_value: float
+        :return: The change or None if it can't be computed
+        :rtype: float
+    """
+    if baseline_value is None or current_value is None or baseline_value == 0:
+        return None
+    return (current_value - baseline_value) * 100.0 / baseline_value
+
+
+def compare_results(baseline, current, tolerance):
+    """
+        Compare the scenarios found in both the results.
+        :param baseline: The baseline results
+        :type baseline: dict
+        :param current: The current results
+        :type current: dict
+        :param tolerance: The allowed growth of the times and of the memory, in percentage
+        :type tolerance: float
+        :return: The rows (scenario, metric, baseline value, current value, change, regression)
+        :rtype: list of tuple
+    """
+    rows = []
+    baseline_scenarios = baseline.get("scenarios", {})
+    current_scenarios = current.get("scenarios", {})
+    for name in sorted(set(baseline_scenarios) | set(current_scenarios)):
+        if name not in baseline_scenarios or name not in current_scenarios:
+            rows.append((name, "missing in " + ("baseline" if name not in baseline_scenarios else "results"),
+                         None, None, None, False))
+            continue
+
+        old = baseline_scenarios[name]
+        new = current_scenarios[name]
+
+        # The times and the memory depend on the machine: only a growth beyond the tolerance is a regression
+        change = get_change(old["time"]["median"], new["time"]["median"])
+        rows.append((name, "time median (s)", old["time"]["median"], new["time"]["median"], change,
+                     change is not None and change > tolerance))
+        for metric, key in [("rss peak growth (MB)", "rss_peak_growth_mb"), ("rss growth (MB)", "rss_growth_mb")]:
+            old_value = old.get(key)
+            new_value = new.get(key)
+            change = get_change(old_value, new_value)
+            regression = change is not None and change > tolerance and new_value - old_value > MEMORY_NOISE_MB
+            rows.append((name, metric, old_value, new_value, change, regression))
+
+        # The requests and the failures don't depend on the machine: any growth is a regression
+        old_requests = sum(old["requests"].values())
+        new_requests = sum(new["requests"].values())
+        rows.append((name, "requests", old_requests, new_requests, get_change(old_requests, new_requests),
+                     new_requests > old_requests))
+        rows.append((name, "failures", old["failures"], new["failures"], None, new["failures"] > old["failures"]))
+    return rows
+
+
+def format_value(value):
+    """
+        Format a value of the report.
+        :param value: The value
+        :type value: type
+        :return: The formatted value
+        :rtype: str
+    """
+    if value is None:
+        return "-"
+    if isinstance(value, float):
+        return "{:.3f}".format(value)
+    return str(value)
+
+
+def print_report(rows, output=sys.stdout):
+    """
+        Print the comparison report.
+        :param rows: The rows computed by compare_results
+        :type rows: list of tuple
+        :param output: The output stream
+        :type output: file
+        :return: The number of regressions
+        :rtype: int
+    """
+    row_format = "{:<28} {:<18} {:>12} {:>12} {:>9} {}"
+    print(row_format.format("scenario", "metric", "baseline", "current", "change", "").rstrip(), file=output)
+    regressions = 0
+    for name, metric, old_value, new_value, change, regression in rows:
+        regressions += 1 if regression else 0
+        print(row_format.format(name, metric, format_value(old_value), format_value(new_value),
+                                "-" if change is None else "{:+.1f}%".format(change),
+                                "REGRESSION" if regression else "").rstrip(), file=output)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare two benchmark results files")
+    parser.add_argument("baseline", help="The baseline results file")
+    parser.add_argument("results", help="The results file")
+    parser.add_argument("--tolerance", type=float, default=20.0,
+                        help="The allowed growth of the times and of the memory, in percentage (default 20)")
+    args = parser.parse_args()
+
+    rows = compare_results(load_results(args.baseline), load_results(args.results), args.tolerance)
+    return 1 if print_report(rows) > 0 else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,499 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+
+Benchmarks of the JsManager operations against the stand-in AtlanteWI backend (see stand_in_backend.py), running
+the plugin in a headless QgsApplication with the 'offscreen' Qt platform:
+
+    python run_benchmarks.py --repeat 5 --output results.json --baseline baseline.json
+
+Each scenario reports the elapsed time, the growth of the resident memory of the process during the operation
+(its peak and what is left at the end) and the requests received by the backend. The QGIS settings and the plugin
+data are kept in a temporary profile, so the user profile isn't touched.
+"""
+
+
+import argparse
+import collections
+import configparser
+import datetime
+import importlib
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+from qgis.PyQt.QtCore import QSettings, QTimer, QUrl, QT_VERSION_STR
+from qgis.PyQt.QtNetwork import QNetworkRequest
+from qgis.PyQt.QtWidgets import QApplication
+from qgis.core import Qgis, QgsApplication, QgsProject
+
+from compare_results import compare_results, load_results, print_report
+from stand_in_backend import StandInBackend, EPSG_CODE, WMS_LAYERS_COUNT
+
+
+# The plugin directory, containing this 'benchmarks' directory
+PLUGIN_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The scenarios, in the execution order
+SCENARIOS = ["dock_startup", "coalesced_get", "package_download", "package_revalidation", "add_wms", "add_wms_layers",
+             "add_wfs_qml", "add_layer_set"]
+
+# The number of layers of each type added by the 'add_layer_set' scenario
+LAYER_SET_SIZE = 5
+
+
+def import_plugin_module(module_name):
+    """
+        Import a module of the plugin, which is imported as a package since it uses relative imports.
+        :param module_name: The module name (e.g. modules.js_manager)
+        :type module_name: str
+        :return: The module
+        :rtype: module
+    """
+    if os.path.dirname(PLUGIN_DIR) not in sys.path:
+        sys.path.insert(0, os.path.dirname(PLUGIN_DIR))
+    return importlib.import_module("{}.{}".format(os.path.basename(PLUGIN_DIR), module_name))
+
+
+def get_plugin_version():
+    """
+        Retrieve the plugin version from the metadata.txt file.
+        :return: The version
+        :rtype: str
+    """
+    metadata = configparser.ConfigParser()
+    metadata.read(os.path.join(PLUGIN_DIR, "metadata.txt"), encoding="utf-8")
+    return metadata.get("general", "version", fallback="")
+
+
+def get_rss_mb():
+    """
+        Retrieve the current resident memory of the process, in MB. Unlike the peak of the process, it can be compared
+        before and after each scenario.
+        :return: The memory or None if not available on the platform (i.e. without /proc nor psutil)
+        :rtype: float
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / (1024.0 * 1024.0)
+    except (OSError, ValueError, AttributeError, IndexError):
+        pass
+
+    try:
+        import psutil
+    except ImportError:
+        return None
+    return psutil.Process().memory_info().rss / (1024.0 * 1024.0)
+
+
+class BenchmarkRunner(object):
+    """
+        Run the scenarios through the 'qgis' Javascript object of the catalog page, as the AtlanteWI does.
+        The message boxes opened by the plugin are closed automatically and make the run failed.
+    """
+
+    def __init__(self, backend, timeout):
+        """
+            Initialize the runner.
+            :param backend: The stand-in backend
+            :type backend: StandInBackend
+            :param timeout: The seconds after which an operation not completed is failed
+            :type timeout: float
+        """
+        self.backend = backend
+        self.timeout = timeout
+        self.dock_module = import_plugin_module("modules.csi_atlante_wi_dockwidget")
+        self.dock = None
+        self.runs = collections.OrderedDict()
+        self.dialogs = []
+        # The highest resident memory sampled during the running operation
+        self.rss_peak = None
+
+        self.dialog_timer = QTimer()
+        self.dialog_timer.setInterval(100)
+        self.dialog_timer.timeout.connect(self.slot_close_dialogs)
+        self.dialog_timer.start()
+
+    def slot_close_dialogs(self):
+        """
+            Close the message box opened by the plugin, if any, keeping its text.
+        """
+        widget = QApplication.activeModalWidget()
+        if widget is None:
+            return
+
+        self.dialogs.append(widget.text() if hasattr(widget, "text") else widget.windowTitle())
+        widget.reject()
+
+    def wait_until(self, condition):
+        """
+            Process the events until the condition is met.
+            :param condition: The function returning True once the operation is completed
+            :type condition: function
+            :return: False in case of timeout
+            :rtype: bool
+        """
+        deadline = time.perf_counter() + self.timeout
+        while not condition():
+            if time.perf_counter() > deadline:
+                return False
+            QgsApplication.processEvents()
+            self.sample_rss()
+            time.sleep(0.002)
+        return True
+
+    def sample_rss(self):
+        """
+            Update the highest resident memory of the running operation.
+        """
+        rss = get_rss_mb()
+        if rss is not None and self.rss_peak is not None:
+            self.rss_peak = max(self.rss_peak, rss)
+
+    def measure(self, scenario, action, condition=None):
+        """
+            Run the action and wait for its completion, recording the elapsed time, the growth of the resident memory
+            (its peak and what is left at the end) and the requests received by the backend in the meantime.
+            :param scenario: The scenario name
+            :type scenario: str
+            :param action: The function starting the operation
+            :type action: function
+            :param condition: The function returning True once the operation is completed, None if 'action' is
+                synchronous
+            :type condition: function
+        """
+        counters = self.backend.get_counters()
+        dialogs_count = len(self.dialogs)
+        rss_start = get_rss_mb()
+        self.rss_peak = rss_start
+
+        start = time.perf_counter()
+        action()
+        completed = condition is None or self.wait_until(condition)
+        elapsed = time.perf_counter() - start
+
+        self.sample_rss()
+        rss_end = get_rss_mb()
+
+        requests = {}
+        for route, count in self.backend.get_counters().items():
+            if count > counters.get(route, 0):
+                requests[route] = count - counters.get(route, 0)
+
+        self.runs.setdefault(scenario, []).append({
+            "time": elapsed,
+            "rss_peak_growth_mb": self.rss_peak - rss_start if rss_start is not None else None,
+            "rss_growth_mb": rss_end - rss_start if rss_start is not None else None,
+            "requests": requests,
+            "failed": not completed or len(self.dialogs) > dialogs_count,
+            "messages": self.dialogs[dialogs_count:] + ([] if completed else ["timeout"])
+        })
+
+    def evaluate(self, script):
+        """
+            Evaluate the Javascript in the catalog page.
+            :param script: The script
+            :type script: str
+            :return: The result
+            :rtype: type
+        """
+        return self.dock.dlg.webview.page().mainFrame().evaluateJavaScript(script)
+
+    def call_js(self, function_name, *args):
+        """
+            Call a function of the 'qgis' object from the catalog page.
+            :param function_name: The function name (e.g. addWms)
+            :type function_name: str
+            :param args: The arguments
+            :type args: tuple
+        """
+        self.evaluate("qgis.{}({});".format(function_name, ", ".join(json.dumps(arg) for arg in args)))
+
+    def get_events(self):
+        """
+            Retrieve the events collected by the catalog page.
+            :return: The events, with 'name' and 'detail'
+            :rtype: list of dict
+        """
+        return json.loads(self.evaluate("JSON.stringify(window.benchEvents)") or "[]")
+
+    def download_ended(self, url, events_count):
+        """
+            Build the condition of the end of the download.
+            :param url: The downloaded URL
+            :type url: str
+            :param events_count: The number of events before the download started
+            :type events_count: int
+            :return: The condition
+            :rtype: function
+        """
+        def condition():
+            for event in self.get_events()[events_count:]:
+                if event["name"] == "qgis:download" and event["detail"].get("url") == url and \
+                        event["detail"].get("status") in ("completed", "failed"):
+                    return True
+            return False
+        return condition
+
+    def batch_ended(self, group_name, events_count):
+        """
+            Build the condition of the end of the addition of a set of layers.
+            :param group_name: The group name of the set
+            :type group_name: str
+            :param events_count: The number of events before the addition started
+            :type events_count: int
+            :return: The condition
+            :rtype: function
+        """
+        def condition():
+            for event in self.get_events()[events_count:]:
+                if event["name"] == "qgis:batch" and event["detail"].get("group") == group_name and \
+                        event["detail"].get("status") == "completed":
+                    return True
+            return False
+        return condition
+
+    @staticmethod
+    def layer_added(name):
+        """
+            Build the condition of the addition of the layer.
+            :param name: The layer name
+            :type name: str
+            :return: The condition
+            :rtype: function
+        """
+        return lambda: len(QgsProject.instance().mapLayersByName(name)) > 0
+
+    def run_dock_startup(self, index):
+        def action():
+            if self.dock is not None:
+                self.dock.close()
+                self.dock.deleteLater()
+            self.dock = self.dock_module.CSIAtlanteWIDockWidget()
+
+        self.measure("dock_startup", action, lambda: self.evaluate("window.benchReady === true") is True)
+
+    def run_coalesced_get(self, index):
+        # Two identical GET requests in flight together (e.g. the same *.qml for two layers) share one backend request
+        url = QUrl("{}/qml/coalesced_{}.qml".format(self.backend.url, index))
+        replies = []
+
+        def action():
+            for _ in range(2):
+                replies.append(self.dock.network_access_manager.get(QNetworkRequest(url)))
+
+        self.measure("coalesced_get", action, lambda: all(reply.isFinished() for reply in replies))
+        for reply in replies:
+            reply.deleteLater()
+
+        run = self.runs["coalesced_get"][-1]
+        if run["requests"].get("qml", 0) != 1:
+            run["failed"] = True
+            run["messages"].append("backend requests: {} instead of 1".format(run["requests"].get("qml", 0)))
+
+    def run_package_download(self, index):
+        url = "{}/packages/punti_{}.zip".format(self.backend.url, index)
+        name = "pacchetto_{}".format(index)
+        self.measure("package_download", lambda: self.call_js("apriFileRemoto", name, url),
+                     self.download_ended(url, len(self.get_events())))
+
+    def run_package_revalidation(self, index):
+        # The package downloaded by 'package_download' is requested again, the backend answers 'Not Modified'
+        url = "{}/packages/punti_{}.zip".format(self.backend.url, index)
+        name = "pacchetto_{}_bis".format(index)
+        self.measure("package_revalidation", lambda: self.call_js("apriFileRemoto", name, url),
+                     self.download_ended(url, len(self.get_events())))
+
+    def run_add_wms(self, index):
+        name = "wms_{}".format(index)
+        self.measure("add_wms", lambda: self.call_js("addWms", name, self.backend.url + "/wms", "layer_0",
+                                                     "image/png", str(EPSG_CODE), ""), self.layer_added(name))
+
+    def run_add_wms_layers(self, index):
+        name = "wms_layers_{}".format(index)
+        self.measure("add_wms_layers", lambda: self.call_js("addWms", name, self.backend.url + "/wms",
+                                                            "layer_0,layer_1,layer_2", "image/png", str(EPSG_CODE),
+                                                            ""), self.layer_added(name))
+
+    def run_add_wfs_qml(self, index):
+        name = "wfs_{}".format(index)
+        qml_url = "{}/qml/punti_{}.qml".format(self.backend.url, index)
+        self.measure("add_wfs_qml", lambda: self.call_js("addWfsQML", name, self.backend.url + "/wfs",
+                                                         "bench:punti|{}".format(EPSG_CODE), qml_url),
+                     self.layer_added(name))
+
+    def run_add_layer_set(self, index):
+        group_name = "tematismo_{}".format(index)
+        descriptors = []
+        for i in range(LAYER_SET_SIZE):
+            descriptors.append({"type": "wms", "wms_name": "{}_wms_{}".format(group_name, i),
+                                "url": self.backend.url + "/wms", "layers": "layer_{}".format(i % WMS_LAYERS_COUNT),
+                                "mime_type": "image/png", "epsg_code": str(EPSG_CODE)})
+            descriptors.append({"type": "wfs", "name": "{}_wfs_{}".format(group_name, i),
+                                "url": self.backend.url + "/wfs", "data": "bench:punti|{}".format(EPSG_CODE),
+                                "qml_url": "{}/qml/{}_{}.qml".format(self.backend.url, group_name, i)})
+        self.measure("add_layer_set", lambda: self.call_js("addLayerSet", group_name, json.dumps(descriptors)),
+                     self.batch_ended(group_name, len(self.get_events())))
+
+    def run(self, scenarios, repeat):
+        """
+            Run the scenarios, each 'repeat' times. The dock is started first, since the other scenarios use its
+            catalog page.
+            :param scenarios: The scenarios names
+            :type scenarios: list of str
+            :param repeat: The number of runs of each scenario
+            :type repeat: int
+        """
+        if "dock_startup" not in scenarios:
+            self.run_dock_startup(0)
+            self.runs.pop("dock_startup")
+
+        for index in range(repeat):
+            for scenario in SCENARIOS:
+                if scenario in scenarios:
+                    getattr(self, "run_" + scenario)(index)
+                    QgsProject.instance().removeAllMapLayers()
+                    QgsProject.instance().layerTreeRoot().removeAllChildren()
+
+    def close(self):
+        """
+            Close the dock and stop closing the message boxes.
+        """
+        self.dialog_timer.stop()
+        if self.dock is not None:
+            self.dock.close()
+            self.dock.deleteLater()
+            self.dock = None
+
+    def get_results(self):
+        """
+            Summarize the runs of each scenario.
+            :return: The summary by scenario
+            :rtype: dict
+        """
+        scenarios = collections.OrderedDict()
+        for scenario, runs in self.runs.items():
+            times = [run["time"] for run in runs]
+            rss_peak_growth = [run["rss_peak_growth_mb"] for run in runs if run["rss_peak_growth_mb"] is not None]
+            rss_growth = [run["rss_growth_mb"] for run in runs if run["rss_growth_mb"] is not None]
+            scenarios[scenario] = {
+                "runs": len(runs),
+                "failures": sum(1 for run in runs if run["failed"]),
+                "time": {"min": min(times), "median": statistics.median(times), "max": max(times)},
+                "rss_peak_growth_mb": statistics.median(rss_peak_growth) if rss_peak_growth else None,
+                "rss_growth_mb": statistics.median(rss_growth) if rss_growth else None,
+                # The requests of the last run, once the first run warmed the caches
+                "requests": runs[-1]["requests"],
+                "messages": sorted(set(message for run in runs for message in run["messages"]))
+            }
+        return scenarios
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the plugin against the stand-in AtlanteWI backend")
+    parser.add_argument("--repeat", type=int, default=3, help="The number of runs of each scenario (default 3)")
+    parser.add_argument("--features", type=int, default=1000,
+                        help="The number of features of the packages and of the WFS (default 1000)")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS),
+                        help="The comma separated scenarios to run (default all: {})".format(", ".join(SCENARIOS)))
+    parser.add_argument("--timeout", type=float, default=60.0,
+                        help="The seconds after which an operation is failed (default 60)")
+    parser.add_argument("--output", default="benchmark_results.json", help="The results file")
+    parser.add_argument("--baseline", help="The results file to compare with, e.g. of the previous release")
+    parser.add_argument("--tolerance", type=float, default=20.0,
+                        help="The allowed growth of the times and of the memory, in percentage (default 20)")
+    args = parser.parse_args()
+
+    scenarios = [scenario.strip() for scenario in args.scenarios.split(",") if scenario.strip()]
+    unknown_scenarios = set(scenarios) - set(SCENARIOS)
+    if unknown_scenarios:
+        parser.error("Unknown scenarios: {}".format(", ".join(sorted(unknown_scenarios))))
+
+    # Headless, in a temporary QGIS profile
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    work_dir = tempfile.mkdtemp(prefix="csiatlantewi_benchmarks_")
+    qgs_application = QgsApplication([], True, os.path.join(work_dir, "profile"))
+    qgs_application.initQgis()
+
+    backend = StandInBackend(args.features)
+    backend.start()
+
+    download_folder_path = os.path.join(work_dir, "pacchetti")
+    os.makedirs(download_folder_path)
+    qgs_settings = QSettings()
+    qgs_settings.setValue("CSIAtlanteWI/url_plugin", backend.url + "/catalog.html")
+    qgs_settings.setValue("CSIAtlanteWI/cartellaScaricoPacchetti", download_folder_path)
+    qgs_settings.sync()
+
+    runner = BenchmarkRunner(backend, args.timeout)
+    try:
+        runner.run(scenarios, args.repeat)
+        results = collections.OrderedDict([
+            ("environment", {
+                "date": datetime.datetime.now().isoformat(),
+                "plugin_version": get_plugin_version(),
+                "qgis_version": Qgis.QGIS_VERSION,
+                "qt_version": QT_VERSION_STR,
+                "python_version": platform.python_version(),
+                "platform": platform.platform(),
+                "features": args.features,
+                "repeat": args.repeat
+            }),
+            ("scenarios", runner.get_results())
+        ])
+    finally:
+        runner.close()
+        backend.stop()
+        qgs_application.exitQgis()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+
+    for scenario, result in results["scenarios"].items():
+        print("{:<28} median {:8.3f}s  requests {:4d}  failures {}".format(
+            scenario, result["time"]["median"], sum(result["requests"].values()), result["failures"]))
+
+    if args.baseline:
+        print()
+        if print_report(compare_results(load_results(args.baseline), results, args.tolerance)) > 0:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
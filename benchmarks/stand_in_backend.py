@@ -0,0 +1,547 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+
+Local HTTP server standing in for the AtlanteWI backend during the benchmarks.
+It serves:
+    - /catalog.html: a catalog page using the 'qgis' Javascript object and collecting the events sent by the plugin
+    - /qml/<name>.qml: a QML style
+    - /packages/<name>.zip: a zipped point shapefile, with the number of features given by the 'features' query
+      parameter (or the backend default). The ETag allows the conditional requests.
+    - /wms: a WMS 1.3.0 stub (GetCapabilities, GetMap, GetLegendGraphic)
+    - /wfs: a WFS 1.1.0 stub (GetCapabilities, DescribeFeatureType, GetFeature)
+The requests are counted by route, so that the benchmarks can report the requests sent by each operation.
+"""
+
+
+import collections
+import datetime
+import hashlib
+import io
+import json
+import struct
+import threading
+import zipfile
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlsplit, parse_qsl
+
+
+# The number of layers published by the WMS stub (i.e. layer_0, layer_1, ...)
+WMS_LAYERS_COUNT = 5
+
+# The EPSG code of the published data
+EPSG_CODE = 32632
+
+# The extent of the published data, in EPSG_CODE coordinates
+EXTENT = (313000.0, 4876000.0, 517000.0, 5146000.0)
+
+# The events of the plugin collected by the catalog page in 'window.benchEvents'
+PAGE_EVENTS = ["qgis:batch", "qgis:download", "qgis:layer", "qgis:offline"]
+
+CATALOG_PAGE = """<!DOCTYPE html>
+<html>
+<head>
+<meta charset="utf-8">
+<title>AtlanteWI (benchmark)</title>
+<script>
+window.benchEvents = [];
+window.benchReady = false;
+{events}.forEach(function (name) {{
+    document.addEventListener(name, function (event) {{
+        window.benchEvents.push({{name: name, detail: event.detail}});
+    }});
+}});
+// Invoked by the plugin once the 'qgis' object is available
+function start() {{
+    document.body.style.backgroundColor = qgis.getColorBG();
+    window.benchOffline = qgis.isOffline();
+    window.benchReady = true;
+}}
+</script>
+</head>
+<body>
+<h1>AtlanteWI</h1>
+<ul>
+<li><a href="{url}/packages/punti.zip">punti</a></li>
+<li><a href="{url}/wms">WMS</a></li>
+<li><a href="{url}/wfs">WFS</a></li>
+</ul>
+</body>
+</html>
+"""
+
+QML_STYLE = """<!DOCTYPE qgis PUBLIC 'http://mrcc.com/qgis.dtd' 'SYSTEM'>
+<qgis version="3.4.0-Madeira" styleCategories="AllStyleCategories">
+  <renderer-v2 type="singleSymbol" forceraster="0" symbollevels="0" enableorderby="0">
+    <symbols>
+      <symbol type="marker" name="0" alpha="1" clip_to_extent="1" force_rhr="0">
+        <layer class="SimpleMarker" pass="0" locked="0" enabled="1">
+          <prop k="color" v="219,30,42,255"/>
+          <prop k="name" v="circle"/>
+          <prop k="size" v="2"/>
+        </layer>
+      </symbol>
+    </symbols>
+  </renderer-v2>
+  <layerOpacity>1</layerOpacity>
+</qgis>
+"""
+
+WMS_CAPABILITIES = """<?xml version="1.0" encoding="UTF-8"?>
+<WMS_Capabilities version="1.3.0" xmlns="http://www.opengis.net/wms" xmlns:xlink="http://www.w3.org/1999/xlink">
+<Service>
+<Name>WMS</Name>
+<Title>AtlanteWI benchmark WMS</Title>
+<OnlineResource xlink:href="{url}/wms"/>
+</Service>
+<Capability>
+<Request>
+<GetCapabilities>
+<Format>text/xml</Format>
+<DCPType><HTTP><Get><OnlineResource xlink:href="{url}/wms?"/></Get></HTTP></DCPType>
+</GetCapabilities>
+<GetMap>
+<Format>image/png</Format>
+<DCPType><HTTP><Get><OnlineResource xlink:href="{url}/wms?"/></Get></HTTP></DCPType>
+</GetMap>
+</Request>
+<Exception><Format>XML</Format></Exception>
+<Layer>
+<Title>AtlanteWI</Title>
+<CRS>EPSG:{epsg}</CRS>
+<EX_GeographicBoundingBox>
+<westBoundLongitude>6.6</westBoundLongitude><eastBoundLongitude>9.2</eastBoundLongitude>
+<southBoundLatitude>44.0</southBoundLatitude><northBoundLatitude>46.5</northBoundLatitude>
+</EX_GeographicBoundingBox>
+<BoundingBox CRS="EPSG:{epsg}" minx="{minx}" miny="{miny}" maxx="{maxx}" maxy="{maxy}"/>
+{layers}
+</Layer>
+</Capability>
+</WMS_Capabilities>
+"""
+
+WMS_LAYER = """<Layer queryable="0"><Name>{name}</Name><Title>{name}</Title><CRS>EPSG:{epsg}</CRS>
+<BoundingBox CRS="EPSG:{epsg}" minx="{minx}" miny="{miny}" maxx="{maxx}" maxy="{maxy}"/></Layer>"""
+
+WFS_CAPABILITIES = """<?xml version="1.0" encoding="UTF-8"?>
+<wfs:WFS_Capabilities version="1.1.0" xmlns:wfs="http://www.opengis.net/wfs" xmlns:ows="http://www.opengis.net/ows"
+    xmlns:ogc="http://www.opengis.net/ogc" xmlns:xlink="http://www.w3.org/1999/xlink" xmlns:bench="{url}/bench">
+<ows:ServiceIdentification><ows:Title>AtlanteWI benchmark WFS</ows:Title><ows:ServiceType>WFS</ows:ServiceType>
+<ows:ServiceTypeVersion>1.1.0</ows:ServiceTypeVersion></ows:ServiceIdentification>
+<ows:OperationsMetadata>
+<ows:Operation name="GetCapabilities"><ows:DCP><ows:HTTP><ows:Get xlink:href="{url}/wfs?"/></ows:HTTP></ows:DCP>
+</ows:Operation>
+<ows:Operation name="DescribeFeatureType"><ows:DCP><ows:HTTP><ows:Get xlink:href="{url}/wfs?"/></ows:HTTP></ows:DCP>
+</ows:Operation>
+<ows:Operation name="GetFeature"><ows:DCP><ows:HTTP><ows:Get xlink:href="{url}/wfs?"/></ows:HTTP></ows:DCP>
+<ows:Parameter name="outputFormat"><ows:Value>text/xml; subtype=gml/3.1.1</ows:Value></ows:Parameter>
+</ows:Operation>
+</ows:OperationsMetadata>
+<wfs:FeatureTypeList>
+<wfs:FeatureType><wfs:Name>bench:punti</wfs:Name><wfs:Title>punti</wfs:Title>
+<wfs:DefaultSRS>urn:ogc:def:crs:EPSG::{epsg}</wfs:DefaultSRS>
+<ows:WGS84BoundingBox><ows:LowerCorner>6.6 44.0</ows:LowerCorner><ows:UpperCorner>9.2 46.5</ows:UpperCorner>
+</ows:WGS84BoundingBox>
+</wfs:FeatureType>
+</wfs:FeatureTypeList>
+</wfs:WFS_Capabilities>
+"""
+
+WFS_SCHEMA = """<?xml version="1.0" encoding="UTF-8"?>
+<xsd:schema xmlns:xsd="http://www.w3.org/2001/XMLSchema" xmlns:gml="http://www.opengis.net/gml"
+    xmlns:bench="{url}/bench" targetNamespace="{url}/bench" elementFormDefault="qualified">
+<xsd:import namespace="http://www.opengis.net/gml" schemaLocation="http://schemas.opengis.net/gml/3.1.1/base/gml.xsd"/>
+<xsd:complexType name="puntiType">
+<xsd:complexContent><xsd:extension base="gml:AbstractFeatureType"><xsd:sequence>
+<xsd:element name="id" type="xsd:int"/>
+<xsd:element name="nome" type="xsd:string"/>
+<xsd:element name="geom" type="gml:PointPropertyType"/>
+</xsd:sequence></xsd:extension></xsd:complexContent>
+</xsd:complexType>
+<xsd:element name="punti" type="bench:puntiType" substitutionGroup="gml:_Feature"/>
+</xsd:schema>
+"""
+
+WFS_FEATURE = """<gml:featureMember><bench:punti gml:id="punti.{id}"><bench:id>{id}</bench:id>
+<bench:nome>punto {id}</bench:nome><bench:geom><gml:Point srsName="urn:ogc:def:crs:EPSG::{epsg}">
+<gml:pos>{x} {y}</gml:pos></gml:Point></bench:geom></bench:punti></gml:featureMember>"""
+
+SERVICE_EXCEPTION = """<?xml version="1.0" encoding="UTF-8"?>
+<ServiceExceptionReport version="1.3.0" xmlns="http://www.opengis.net/ogc">
+<ServiceException>{message}</ServiceException>
+</ServiceExceptionReport>
+"""
+
+
+def get_point(index, count):
+    """
+        Compute the coordinates of a point, spreading the points on a grid covering EXTENT.
+        :param index: The point index
+        :type index: int
+        :param count: The number of points
+        :type count: int
+        :return: The coordinates
+        :rtype: tuple of float
+    """
+    side = max(1, int(count ** 0.5))
+    step_x = (EXTENT[2] - EXTENT[0]) / side
+    step_y = (EXTENT[3] - EXTENT[1]) / side
+    return EXTENT[0] + step_x * (index % side), EXTENT[1] + step_y * (index // side % side)
+
+
+def build_shapefile_zip(name, count):
+    """
+        Build the zip archive of a point shapefile with 'count' features, having the fields 'id' and 'nome'.
+        :param name: The shapefile name (i.e. the name of the files in the archive)
+        :type name: str
+        :param count: The number of features
+        :type count: int
+        :return: The zip archive
+        :rtype: bytes
+    """
+    points = [get_point(i, count) for i in range(count)]
+    if points:
+        bbox = (min(p[0] for p in points), min(p[1] for p in points),
+                max(p[0] for p in points), max(p[1] for p in points))
+    else:
+        bbox = (0.0, 0.0, 0.0, 0.0)
+
+    # Each record is made of the 8 bytes header and of the 20 bytes of the point, the lengths are in 16-bit words
+    record_size = 28
+
+    def header(file_length):
+        return struct.pack(">7i", 9994, 0, 0, 0, 0, 0, file_length // 2) + struct.pack("<2i4d4d", 1000, 1, *bbox,
+                                                                                       0.0, 0.0, 0.0, 0.0)
+
+    shp = io.BytesIO()
+    shx = io.BytesIO()
+    shp.write(header(100 + record_size * count))
+    shx.write(header(100 + 8 * count))
+    for i, (x, y) in enumerate(points):
+        shx.write(struct.pack(">2i", (100 + record_size * i) // 2, 10))
+        shp.write(struct.pack(">2i", i + 1, 10) + struct.pack("<i2d", 1, x, y))
+
+    # The dBase table: the 'id' numeric and the 'nome' character fields
+    fields = [(b"id", b"N", 10), (b"nome", b"C", 20)]
+    record_length = 1 + sum(field[2] for field in fields)
+    header_length = 32 + 32 * len(fields) + 1
+    today = datetime.date.today()
+    dbf = io.BytesIO()
+    dbf.write(struct.pack("<4BI2H20x", 3, today.year - 1900, today.month, today.day, count, header_length,
+                          record_length))
+    for field_name, field_type, field_length in fields:
+        dbf.write(struct.pack("<11sc4xBB14x", field_name, field_type, field_length, 0))
+    dbf.write(b"\r")
+    for i in range(count):
+        dbf.write(b" " + str(i + 1).rjust(10).encode("ascii") + "punto {}".format(i + 1).ljust(20).encode("ascii"))
+    dbf.write(b"\x1a")
+
+    prj = 'PROJCS["WGS_1984_UTM_Zone_32N",GEOGCS["GCS_WGS_1984",DATUM["D_WGS_1984",' \
+          'SPHEROID["WGS_1984",6378137.0,298.257223563]],PRIMEM["Greenwich",0.0],UNIT["Degree",0.0174532925199433]],' \
+          'PROJECTION["Transverse_Mercator"],PARAMETER["False_Easting",500000.0],PARAMETER["False_Northing",0.0],' \
+          'PARAMETER["Central_Meridian",9.0],PARAMETER["Scale_Factor",0.9996],PARAMETER["Latitude_Of_Origin",0.0],' \
+          'UNIT["Meter",1.0]]'
+
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, "w", zipfile.ZIP_DEFLATED) as zip_file:
+        zip_file.writestr(name + ".shp", shp.getvalue())
+        zip_file.writestr(name + ".shx", shx.getvalue())
+        zip_file.writestr(name + ".dbf", dbf.getvalue())
+        zip_file.writestr(name + ".prj", prj)
+    return archive.getvalue()
+
+
+def build_png(width, height):
+    """
+        Build a PNG image of the given size, filled with a semi-transparent color.
+        :param width: The width
+        :type width: int
+        :param height: The height
+        :type height: int
+        :return: The PNG image
+        :rtype: bytes
+    """
+    def chunk(chunk_type, data):
+        return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+    row = b"\x00" + b"\xdb\x1e\x2a\x80" * width
+    return b"\x89PNG\r\n\x1a\n" + chunk(b"IHDR", struct.pack(">2I5B", width, height, 8, 6, 0, 0, 0)) + \
+        chunk(b"IDAT", zlib.compress(row * height)) + chunk(b"IEND", b"")
+
+
+class StandInRequestHandler(BaseHTTPRequestHandler):
+    """
+        Serve the requests for the StandInBackend of the server.
+    """
+
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.serve(True)
+
+    def do_HEAD(self):
+        self.serve(False)
+
+    def log_message(self, format, *args):
+        # The benchmarks report the counters instead of the access log
+        pass
+
+    def serve(self, with_body):
+        """
+            Route the request.
+            :param with_body: False for sending only the headers (i.e. HEAD request)
+            :type with_body: bool
+        """
+        backend = self.server.backend
+        url = urlsplit(self.path)
+        query = dict((key.lower(), value) for key, value in parse_qsl(url.query))
+
+        if url.path == "/catalog.html":
+            backend.count("catalog")
+            content = CATALOG_PAGE.format(events=json.dumps(PAGE_EVENTS), url=backend.url).encode("utf-8")
+            self.send_content(200, "text/html; charset=utf-8", content, with_body)
+        elif url.path.startswith("/qml/") and url.path.endswith(".qml"):
+            backend.count("qml")
+            self.send_content(200, "application/xml", QML_STYLE.encode("utf-8"), with_body)
+        elif url.path.startswith("/packages/") and url.path.endswith(".zip"):
+            backend.count("package")
+            name = url.path[len("/packages/"):-len(".zip")]
+            count = int(query.get("features", backend.features))
+            content = backend.get_package(name, count)
+            etag = '"{}"'.format(hashlib.md5(content).hexdigest())
+            if self.headers.get("If-None-Match") == etag:
+                self.send_content(304, None, b"", False, {"ETag": etag})
+            else:
+                self.send_content(200, "application/zip", content, with_body, {"ETag": etag})
+        elif url.path == "/wms":
+            self.serve_wms(backend, query, with_body)
+        elif url.path == "/wfs":
+            self.serve_wfs(backend, query, with_body)
+        else:
+            backend.count("not_found")
+            self.send_content(404, "text/plain", b"Not found", with_body)
+
+    def serve_wms(self, backend, query, with_body):
+        """
+            Serve the WMS requests.
+            :param backend: The backend
+            :type backend: StandInBackend
+            :param query: The query parameters, with lower case names
+            :type query: dict
+            :param with_body: False for sending only the headers
+            :type with_body: bool
+        """
+        request = query.get("request", "")
+        backend.count("wms:" + request)
+        bounds = dict(minx=EXTENT[0], miny=EXTENT[1], maxx=EXTENT[2], maxy=EXTENT[3], epsg=EPSG_CODE)
+        if request.lower() == "getcapabilities":
+            layers = "\n".join(WMS_LAYER.format(name="layer_{}".format(i), **bounds) for i in range(WMS_LAYERS_COUNT))
+            content = WMS_CAPABILITIES.format(url=backend.url, layers=layers, **bounds)
+            self.send_content(200, "text/xml", content.encode("utf-8"), with_body)
+        elif request.lower() in ("getmap", "getlegendgraphic"):
+            width = min(int(query.get("width", 20)), 4096)
+            height = min(int(query.get("height", 20)), 4096)
+            self.send_content(200, "image/png", backend.get_png(width, height), with_body)
+        else:
+            content = SERVICE_EXCEPTION.format(message="Request not supported: {}".format(request))
+            self.send_content(200, "text/xml", content.encode("utf-8"), with_body)
+
+    def serve_wfs(self, backend, query, with_body):
+        """
+            Serve the WFS requests.
+            :param backend: The backend
+            :type backend: StandInBackend
+            :param query: The query parameters, with lower case names
+            :type query: dict
+            :param with_body: False for sending only the headers
+            :type with_body: bool
+        """
+        request = query.get("request", "")
+        backend.count("wfs:" + request)
+        if request.lower() == "getcapabilities":
+            content = WFS_CAPABILITIES.format(url=backend.url, epsg=EPSG_CODE)
+        elif request.lower() == "describefeaturetype":
+            content = WFS_SCHEMA.format(url=backend.url)
+        elif request.lower() == "getfeature":
+            count = backend.features
+            features = []
+            for i in range(count):
+                x, y = get_point(i, count)
+                features.append(WFS_FEATURE.format(id=i + 1, x=x, y=y, epsg=EPSG_CODE))
+            content = '<?xml version="1.0" encoding="UTF-8"?>\n<wfs:FeatureCollection ' \
+                      'xmlns:wfs="http://www.opengis.net/wfs" xmlns:gml="http://www.opengis.net/gml" ' \
+                      'xmlns:bench="{}/bench" numberOfFeatures="{}">\n{}\n</wfs:FeatureCollection>\n' \
+                .format(backend.url, count, "\n".join(features))
+        else:
+            content = SERVICE_EXCEPTION.format(message="Request not supported: {}".format(request))
+        self.send_content(200, "text/xml", content.encode("utf-8"), with_body)
+
+    def send_content(self, status, content_type, content, with_body, headers=None):
+        """
+            Send the response.
+            :param status: The HTTP status code
+            :type status: int
+            :param content_type: The content type, None for no content
+            :type content_type: str
+            :param content: The content
+            :type content: bytes
+            :param with_body: False for sending only the headers
+            :type with_body: bool
+            :param headers: The additional headers
+            :type headers: dict
+        """
+        self.send_response(status)
+        if content_type is not None:
+            self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(content)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if with_body and content:
+            self.wfile.write(content)
+
+
+class StandInBackend(object):
+    """
+        The stand-in backend, serving the requests from a background thread.
+    """
+
+    def __init__(self, features=1000, host="127.0.0.1", port=0):
+        """
+            Initialize the server, on a free port in case 'port' is 0.
+            :param features: The default number of features of the packages and of the WFS
+            :type features: int
+            :param host: The address to listen to
+            :type host: str
+            :param port: The port to listen to
+            :type port: int
+        """
+        self.features = features
+        self.counters = collections.Counter()
+        self.lock = threading.Lock()
+        self.packages = {}
+        self.images = {}
+        self.server = ThreadingHTTPServer((host, port), StandInRequestHandler)
+        self.server.daemon_threads = True
+        self.server.backend = self
+        self.thread = None
+
+    @property
+    def url(self):
+        """
+            The base URL of the backend (e.g. http://127.0.0.1:8080).
+        """
+        return "http://{}:{}".format(*self.server.server_address[:2])
+
+    def start(self):
+        """
+            Start serving the requests in background.
+        """
+        self.thread = threading.Thread(target=self.server.serve_forever, name="StandInBackend", daemon=True)
+        self.thread.start()
+
+    def stop(self):
+        """
+            Stop serving the requests.
+        """
+        self.server.shutdown()
+        self.server.server_close()
+
+    def count(self, route):
+        """
+            Count a request.
+            :param route: The route (e.g. wms:GetMap)
+            :type route: str
+        """
+        with self.lock:
+            self.counters[route] += 1
+
+    def get_counters(self):
+        """
+            Retrieve a copy of the requests counters.
+            :return: The number of requests by route
+            :rtype: dict
+        """
+        with self.lock:
+            return dict(self.counters)
+
+    def get_package(self, name, count):
+        """
+            Retrieve the zipped shapefile, building it on the first request.
+            :param name: The shapefile name
+            :type name: str
+            :param count: The number of features
+            :type count: int
+            :return: The zip archive
+            :rtype: bytes
+        """
+        with self.lock:
+            key = (name, count)
+            if key not in self.packages:
+                self.packages[key] = build_shapefile_zip(name, count)
+            return self.packages[key]
+
+    def get_png(self, width, height):
+        """
+            Retrieve the PNG image of the given size, building it on the first request.
+            :param width: The width
+            :type width: int
+            :param height: The height
+            :type height: int
+            :return: The PNG image
+            :rtype: bytes
+        """
+        with self.lock:
+            key = (width, height)
+            if key not in self.images:
+                self.images[key] = build_png(width, height)
+            return self.images[key]
+
+
+if __name__ == "__main__":
+    import argparse
+    import time
+
+    parser = argparse.ArgumentParser(description="Start the stand-in AtlanteWI backend")
+    parser.add_argument("--port", type=int, default=8080, help="The port to listen to")
+    parser.add_argument("--features", type=int, default=1000, help="The default number of features")
+    args = parser.parse_args()
+
+    backend = StandInBackend(args.features, port=args.port)
+    backend.start()
+    print("Catalog: {}/catalog.html".format(backend.url))
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        backend.stop()
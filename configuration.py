@@ -38,11 +38,119 @@ DEBUG = False
 DEBUG_ON_FILE = False
 LOGGER_TAG = "CSI Atlante WI"
 NETWORK_LOGGER_TAG = "CSI Atlante WI (Network)"
-CSI_LOG_FILE_PATH = r"C:\csiatlantewi.log"
+# The minimum level (i.e. 0 info, 1 warning, 2 critical) of the messages written to the QGIS message log, lowered to
+# info in debug mode
+LOGGER_LEVEL = 1
+# The log file path, by default "logs/csiatlantewi.log" in the plugin data directory of the QGIS profile
+CSI_LOG_FILE_PATH = ""
+# The tags (comma separated, "*" for all) and the minimum level (i.e. 0 info, 1 warning, 2 critical) of the messages
+# written to the log file
+LOG_TAGS = LOGGER_TAG + "," + NETWORK_LOGGER_TAG
+LOG_LEVEL = 0
+# The log file is rotated once larger than LOG_MAX_SIZE bytes or older than LOG_MAX_AGE seconds, keeping
+# LOG_BACKUP_COUNT previous files
+LOG_MAX_SIZE = 5 * 1024 * 1024
+LOG_MAX_AGE = 7 * 24 * 60 * 60
+LOG_BACKUP_COUNT = 5
+# Seconds between the writes of the queued messages
+LOG_FLUSH_INTERVAL = 1.0
+
+# SETTINGS related
+# Milliseconds without changes after which the changed settings are written
+SETTINGS_FLUSH_DELAY = 1000
 
 # ATLANTE WI related
 ATLANTEWI_URL = ""
 
+# DOWNLOAD related
+# Maximum amount of bytes buffered by Qt for each download before being written to disk
+DOWNLOAD_READ_BUFFER_SIZE = 4 * 1024 * 1024
+# Maximum number of concurrent downloads (e.g. *.qml files and packages of a batch of layers)
+MAX_PARALLEL_DOWNLOADS = 4
+# Automatic retries of a resumable download after a network failure, and the delay in milliseconds between them
+DOWNLOAD_RETRIES = 3
+DOWNLOAD_RETRY_DELAY = 2000
+
+# QML CACHE related
+# Seconds a cached *.qml file is used without revalidating it with the server
+QML_CACHE_MAX_AGE = 24 * 60 * 60
+# Maximum size in bytes of the cached *.qml files
+QML_CACHE_MAX_SIZE = 20 * 1024 * 1024
+
+# LAYERS related
+# Build the layers (i.e. WMS, WFS and PostGIS tables) in background through the QGIS task manager
+LAYER_TASKS = True
+# Seconds a WMS GetCapabilities document is used without downloading it again (0 for disabling the cache)
+WMS_CAPABILITIES_MAX_AGE = 6 * 60 * 60
+# Add each layer of a WMS as a separate raster layer, in a group, instead of a single source composed by the server
+WMS_SPLIT_LAYERS = False
+
+# NETWORK CACHE related
+# Maximum size in bytes of the plugin cache for the web interface static assets (HTML, JS, CSS, images)
+CACHE_SIZE_STATIC = 100 * 1024 * 1024
+# Maximum size in bytes of the plugin cache for the catalog data (JSON, XML)
+CACHE_SIZE_DATA = 50 * 1024 * 1024
+
+# Cache policy rules overriding the server headers (see CsiCachePolicyRules) and seconds between their reloads
+CACHE_RULES = ""
+CACHE_RULES_RELOAD_INTERVAL = 30
+# Identical GET requests in flight share the same reply, for bodies up to COALESCE_MAX_SIZE bytes
+COALESCE_REQUESTS = True
+COALESCE_MAX_SIZE = 1024 * 1024
+
+# NETWORK METRICS related
+# Collect the timings and sizes of the requests, keeping the most recent NETWORK_METRICS_SIZE ones
+NETWORK_METRICS = True
+NETWORK_METRICS_SIZE = 1000
+
+# SSL related
+# Attach a client certificate to the HTTPS requests, taken from the QGIS authentication configuration SSL_AUTHCFG,
+# from the PEM files SSL_CERTIFICATE_FILE and SSL_KEY_FILE or from the CsiCertificate class
+SSL_CLIENT_CERTIFICATE = False
+SSL_AUTHCFG = ""
+SSL_CERTIFICATE_FILE = ""
+SSL_KEY_FILE = ""
+# Seconds between the checks for changes of the certificate source
+SSL_PROFILE_CHECK_INTERVAL = 5
+# Persist the TLS sessions of the backend host, kept for TLS_SESSION_LIFETIME seconds unless the server states it
+TLS_SESSION_PERSISTENCE = True
+TLS_SESSION_LIFETIME = 12 * 60 * 60
+
+# OFFLINE related
+# Start in the offline mode, in which the backend requests are answered from the local snapshot
+OFFLINE_MODE = False
+# Store the catalog page and its JSON responses in the local snapshot, up to OFFLINE_SNAPSHOT_MAX_ENTRY_SIZE bytes
+# each and OFFLINE_SNAPSHOT_MAX_SIZE bytes overall. The snapshot is not encrypted: the authenticated responses are
+# never stored
+OFFLINE_SNAPSHOT = False
+OFFLINE_SNAPSHOT_MAX_ENTRY_SIZE = 5 * 1024 * 1024
+OFFLINE_SNAPSHOT_MAX_SIZE = 50 * 1024 * 1024
+# The query string parameters ignored by the snapshot (i.e. the cache-busting ones), separated by comma
+OFFLINE_SNAPSHOT_IGNORED_PARAMETERS = "_,_dc,nocache,rnd,timestamp"
+
+# STARTUP related
+# Import the dock widget modules WARM_IMPORT_DELAY milliseconds after the plugin loading, instead of at the first
+# dock opening
+WARM_IMPORT = False
+WARM_IMPORT_DELAY = 5000
+# Build the dock widget hidden PREWARM_DELAY milliseconds after the QGIS startup, postponing it by PREWARM_RETRY_DELAY
+# milliseconds while the map canvas is rendering
+PREWARM = False
+PREWARM_DELAY = 10000
+PREWARM_RETRY_DELAY = 2000
+
+# CONNECTIONS related
+# Negotiate HTTP/2 with the HTTPS servers, if supported by the Qt version
+HTTP2 = False
+# Open the connection to the backend when QGIS starts
+PRECONNECT = False
+# Seconds between the requests keeping alive the connections to the backend (0 for disabling them), sent until the
+# backend is idle for KEEP_ALIVE_IDLE_LIMIT seconds
+KEEP_ALIVE_INTERVAL = 25
+KEEP_ALIVE_IDLE_LIMIT = 5 * 60
+# The static resource requested for keeping alive the connections, absolute or relative to the backend URL
+KEEP_ALIVE_URL = "/favicon.ico"
+
 # PROXY related
 CSI_PROXY = None
 CSI_PROXY_PORT = None
@@ -33,13 +33,19 @@ The content of this file is based on
 """
 
 import os
-from qgis.PyQt.QtCore import QSettings, QTranslator, qVersion, QCoreApplication, Qt
+from qgis.PyQt.QtCore import QSettings, QTranslator, qVersion, QCoreApplication, Qt, QTimer
 from qgis.PyQt.QtWidgets import QAction
 from qgis.PyQt.QtGui import QIcon
+from qgis.core import QgsApplication, QgsNetworkAccessManager
 
 # Import the Qt resources from file 'resources.py' (required for successfully show the icon)
 from . import resources
-from .modules.csi_atlante_wi_dockwidget import CSIAtlanteWIDockWidget
+# The dock widget modules (i.e. QtWebKit and the network stack) are imported on the first use, so that loading the
+# plugin at QGIS startup only registers the action
+from . import configuration
+from .modules import csi_utils
+from .modules.csi_log_writer import CsiLogWriter
+from .modules.csi_settings import CsiSettings
 
 
 class CSIAtlanteWI(object):
@@ -85,6 +91,11 @@ class CSIAtlanteWI(object):
         self.pluginIsActive = False
         self.dockwidget = None
         self.windowPosition = None
+        self.network_access_manager = None
+        # The timers of the operations postponed after the QGIS startup, stopped by 'unload'
+        self.pre_connect_timer = None
+        self.warm_import_timer = None
+        self.prewarm_timer = None
         self.load_configs()
 
     def translate(self, message):
@@ -170,11 +181,127 @@ class CSIAtlanteWI(object):
             callback=self.run,
             parent=self.iface.mainWindow())
 
+        settings = CsiSettings.instance()
+
+        # Opening in background the connection to the backend, so that the first dock opening doesn't wait for it
+        if settings.value("CSIAtlanteWI/preconnect", default=configuration.PRECONNECT, value_type=bool):
+            self.pre_connect_timer = self.start_timer(0, self.pre_connect)
+
+        # Importing the dock widget modules once QGIS is idle, so that the first dock opening doesn't wait for them
+        if settings.value("CSIAtlanteWI/warm_import", default=configuration.WARM_IMPORT, value_type=bool):
+            self.warm_import_timer = self.start_timer(configuration.WARM_IMPORT_DELAY, self.warm_import)
+
+        # Building the dock widget hidden once QGIS is idle, so that the first opening shows the page already loaded
+        if settings.value("CSIAtlanteWI/prewarm", default=configuration.PREWARM, value_type=bool):
+            if self.iface.mainWindow().isVisible():
+                self.schedule_prewarm()
+            else:
+                self.iface.initializationCompleted.connect(self.schedule_prewarm)
+
+    def start_timer(self, interval, slot):
+        """
+            Start a single shot timer owned by the QGIS main window, which 'unload' stops.
+            :param interval: The milliseconds before the timeout
+            :type interval: int
+            :param slot: The function invoked on timeout
+            :type slot: function
+            :return: The timer
+            :rtype: QTimer
+        """
+        timer = QTimer(self.iface.mainWindow())
+        timer.setSingleShot(True)
+        timer.timeout.connect(slot)
+        timer.start(interval)
+        return timer
+
+    @staticmethod
+    def stop_timer(timer):
+        """
+            Stop and release the timer, if any.
+            :param timer: The timer
+            :type timer: QTimer
+        """
+        if timer is None:
+            return
+
+        timer.stop()
+        timer.deleteLater()
+
+    def schedule_prewarm(self):
+        """
+            Schedule the building of the hidden dock widget after the QGIS startup.
+        """
+        self.prewarm_timer = self.start_timer(configuration.PREWARM_DELAY, self.prewarm)
+
+    def prewarm(self):
+        """
+            Build the dock widget hidden, loading the AtlanteWI page in background.
+            The building runs in the main thread, so it is postponed while the map canvas is rendering.
+        """
+        if self.dockwidget is not None:
+            return
+
+        if self.iface.mapCanvas().isDrawing():
+            self.prewarm_timer.start(configuration.PREWARM_RETRY_DELAY)
+            return
+
+        self.create_dockwidget()
+
+    def create_dockwidget(self):
+        """
+            Build the dock widget, which starts loading the AtlanteWI page.
+        """
+        from .modules.csi_atlante_wi_dockwidget import CSIAtlanteWIDockWidget
+
+        self.dockwidget = CSIAtlanteWIDockWidget(network_access_manager=self.network_access_manager)
+
+    def warm_import(self):
+        """
+            Import the dock widget modules, without building the dock widget.
+        """
+        from .modules import csi_atlante_wi_dockwidget
+
+    def pre_connect(self):
+        """
+            Create the CsiNetworkAccessManager used by the dock widget and connect it to the backend.
+        """
+        from .modules.csi_network_access_manager import CsiNetworkAccessManager
+
+        if self.network_access_manager is None:
+            self.network_access_manager = CsiNetworkAccessManager.build(
+                QgsNetworkAccessManager.instance(),
+                CsiSettings.instance().value("CSIAtlanteWI/debug", default=configuration.DEBUG, value_type=bool))
+        self.network_access_manager.pre_connect()
+
     def unload(self):
         """
             Removes the plugin menu item and icon from QGIS GUI.
         """
         self.save_configs()
+        CsiSettings.instance().flush()
+
+        # Canceling the operations postponed after the QGIS startup, not yet run
+        try:
+            self.iface.initializationCompleted.disconnect(self.schedule_prewarm)
+        except TypeError:
+            pass
+        self.stop_timer(self.pre_connect_timer)
+        self.stop_timer(self.warm_import_timer)
+        self.stop_timer(self.prewarm_timer)
+        self.pre_connect_timer = None
+        self.warm_import_timer = None
+        self.prewarm_timer = None
+
+        # Canceling the layers being built in background
+        if self.dockwidget is not None:
+            self.dockwidget.jsManager.layer_pipeline.cancel_all()
+
+        # Stopping the log file writer, if started
+        try:
+            QgsApplication.messageLog().messageReceived.disconnect(csi_utils.write_log_message)
+        except TypeError:
+            pass
+        CsiLogWriter.shutdown()
 
         for action in self.actions:
             self.iface.removePluginMenu(
@@ -190,7 +317,7 @@ class CSIAtlanteWI(object):
         """
         self.windowPosition = Qt.LeftDockWidgetArea
         if self.dockwidget is None:
-            self.dockwidget = CSIAtlanteWIDockWidget()
+            self.create_dockwidget()
             self.iface.addDockWidget(self.windowPosition, self.dockwidget)
             self.dockwidget.show()
         else:
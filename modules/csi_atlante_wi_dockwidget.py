@@ -42,7 +42,9 @@ from qgis.core import QgsNetworkAccessManager, Qgis, QgsApplication
 from . import csi_utils
 from .. import configuration
 from .csi_class_helper import CsiClassHelper
+from .csi_log_writer import CsiLogWriter
 from .csi_network_access_manager import CsiNetworkAccessManager
+from .csi_settings import CsiSettings
 from .csi_web_view import CsiWebView
 from ..csi_atlante_wi_dockwidget_base import Ui_DockWidget
 from .js_manager import JsManager
@@ -59,7 +61,15 @@ class CSIAtlanteWIDockWidget(QtWidgets.QDockWidget, Ui_DockWidget):
         Represents the CSIAtlanteWI QGIS plugin dock widget, which is the main element in the plugin.
     """
 
-    def __init__(self, parent=None):
+    def __init__(self, parent=None, network_access_manager=None):
+        """
+            Constructor.
+            :param parent: The parent widget
+            :type parent: QWidget
+            :param network_access_manager: The CsiNetworkAccessManager wrapping the QgsNetworkAccessManager, if already
+                created by the plugin
+            :type network_access_manager: CsiNetworkAccessManager
+        """
         QtWidgets.QDialog.__init__(self, parent)
         self.dlg = Ui_DockWidget()
         self.dlg.setupUi(self)
@@ -67,19 +77,19 @@ class CSIAtlanteWIDockWidget(QtWidgets.QDockWidget, Ui_DockWidget):
         # Getting the logger
         qgs_logger = QgsApplication.messageLog()
 
-        # Retrieving configurations
+        # Retrieving configurations, loading them again since they could have been changed outside the plugin
         qgs_logger.logMessage(message="Settings retrieved from the default file: " + QtCore.QSettings().fileName(),
                               tag=configuration.LOGGER_TAG, level=Qgis.Info)
-        self.debug = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/debug",
-                                                                 default=configuration.DEBUG, value_type=bool)
+        self.settings = CsiSettings.instance()
+        self.settings.reload()
+        self.debug = self.settings.value("CSIAtlanteWI/debug", default=configuration.DEBUG, value_type=bool)
         qgs_logger.logMessage('debug: {}'.format(str(self.debug)), tag=configuration.LOGGER_TAG, level=Qgis.Info)
-        self.debug_log = csi_utils.get_qgs_settings_value_or_default(
+        self.debug_log = self.settings.value(
             "CSIAtlanteWI/debug_log", default=configuration.DEBUG_ON_FILE, value_type=bool)
         qgs_logger.logMessage('debug_log: {}'.format(str(self.debug)), tag=configuration.LOGGER_TAG, level=Qgis.Info)
         
         # Getting the log file path from configuration
-        self.log_file_path = csi_utils.get_qgs_settings_value_or_default(
-            "CSIAtlanteWI/logfile", default=configuration.CSI_LOG_FILE_PATH, value_type=str)
+        self.log_file_path = CsiLogWriter.get_log_file_path()
         qgs_logger.logMessage(
             'logfilename: {}'.format(self.log_file_path), tag=configuration.LOGGER_TAG, level=Qgis.Info)
 
@@ -88,21 +98,18 @@ class CSIAtlanteWIDockWidget(QtWidgets.QDockWidget, Ui_DockWidget):
             qgs_logger.messageReceived.connect(csi_utils.write_log_message)
 
         # Setting the proxy
-        proxy_enabled = csi_utils.get_qgs_settings_value_or_default("proxy/proxyEnabled", default=False, value_type=bool)
+        proxy_enabled = self.settings.value("proxy/proxyEnabled", default=False, value_type=bool)
         qgs_logger.logMessage(
             'proxy_enabled: {}'.format(str(proxy_enabled)), tag=configuration.LOGGER_TAG, level=Qgis.Info)
 
         # In case the proxy is required, set it
         if proxy_enabled:
-            proxy_host = csi_utils.get_qgs_settings_value_or_default(
-                "proxy/proxyHost", default=configuration.CSI_PROXY, value_type=str)
+            proxy_host = self.settings.value("proxy/proxyHost", default=configuration.CSI_PROXY, value_type=str)
             qgs_logger.logMessage('proxy_host: {}'.format(proxy_host), tag=configuration.LOGGER_TAG, level=Qgis.Info)
-            proxy_port = csi_utils.get_qgs_settings_value_or_default(
-                "proxy/proxyPort", default=configuration.CSI_PROXY_PORT, value_type=int)
+            proxy_port = self.settings.value("proxy/proxyPort", default=configuration.CSI_PROXY_PORT, value_type=int)
             qgs_logger.logMessage(
                 'proxy_port: {}'.format(str(proxy_port)), tag=configuration.LOGGER_TAG, level=Qgis.Info)
-            proxy_type = csi_utils.get_qgs_settings_value_or_default(
-                "proxy/proxyType", default=configuration.CSI_PROXY_TYPE, value_type=str)
+            proxy_type = self.settings.value("proxy/proxyType", default=configuration.CSI_PROXY_TYPE, value_type=str)
             qgs_logger.logMessage('proxy_type: {}'.format(proxy_type), tag=configuration.LOGGER_TAG, level=Qgis.Info)
 
             # Preparing the proxy
@@ -137,22 +144,25 @@ class CSIAtlanteWIDockWidget(QtWidgets.QDockWidget, Ui_DockWidget):
         self.dlg.gridLayout.addWidget(self.dlg.webview, 0, 0, 1, 1)
 
         # Getting the configuration for which NetworkAccessManager to use
-        self.use_qgs_networkaccessmanager = csi_utils.get_qgs_settings_value_or_default(
+        self.use_qgs_networkaccessmanager = self.settings.value(
             "CSIAtlanteWI/use_qgs_networkaccessmanager", default=True, value_type=bool)
         qgs_logger.logMessage('use_qgs_networkaccessmanager: {}'
                               .format(self.use_qgs_networkaccessmanager), tag=configuration.LOGGER_TAG, level=Qgis.Info)
 
         # Setting the proper NetworAccessManager
-        if self.use_qgs_networkaccessmanager:
+        if self.use_qgs_networkaccessmanager and network_access_manager is not None:
+            # Using the CsiNetworkAccessManager created by the plugin (e.g. already connected to the backend)
+            self.network_access_manager = network_access_manager
+        elif self.use_qgs_networkaccessmanager:
             # Getting the current NetworkAccessManager in use
             self.network_access_manager = QgsNetworkAccessManager.instance()
             # Wrap on the CsiNetworkAccessManager
-            self.network_access_manager = CsiNetworkAccessManager(self.network_access_manager, self.debug)
+            self.network_access_manager = CsiNetworkAccessManager.build(self.network_access_manager, self.debug)
         else:
             # Getting the NetworkAccessManager used by the view
             self.network_access_manager = self.dlg.webview.page().networkAccessManager()
             # Wrap on the CsiNetworkAccessManager
-            self.network_access_manager = CsiNetworkAccessManager(self.network_access_manager, self.debug)
+            self.network_access_manager = CsiNetworkAccessManager.build(self.network_access_manager, self.debug)
 
         # Logging the NetworAccessManager
         if self.debug:
@@ -182,9 +192,16 @@ class CSIAtlanteWIDockWidget(QtWidgets.QDockWidget, Ui_DockWidget):
         self.dlg.webview.loadFinished.connect(self.slot_engage_javascript)
 
         # Retrieve the AtlanteWI URL
-        self.url_plugin = csi_utils.get_qgs_settings_value_or_default(
+        self.url_plugin = self.settings.value(
             "CSIAtlanteWI/url_plugin", default=configuration.ATLANTEWI_URL, value_type=str)
 
+        # Without network the AtlanteWI is loaded from the local snapshot, if any, without waiting for the timeouts
+        offline_snapshot = getattr(self.network_access_manager, "offline_snapshot", None)
+        if offline_snapshot is not None and offline_snapshot.contains(self.url_plugin) and \
+                self.network_access_manager.networkAccessible() == QtNetwork.QNetworkAccessManager.NotAccessible:
+            self.network_access_manager.set_offline(True)
+        self.dlg.webview.loadFinished.connect(self.slot_switch_offline)
+
         # Load the AtlanteWI in the WebView
         self.dlg.webview.load(QUrl(self.url_plugin))
 
@@ -196,6 +213,24 @@ class CSIAtlanteWIDockWidget(QtWidgets.QDockWidget, Ui_DockWidget):
         qgs_logger.logMessage(
             "--------------------------------------------", tag=configuration.LOGGER_TAG, level=Qgis.Info)
 
+    def slot_switch_offline(self, ok):
+        """
+            Switch to the offline mode in case the AtlanteWI could not be loaded from the backend and it is available
+            in the local snapshot.
+            :param ok: True if the page was loaded successfully
+            :type ok: bool
+        """
+        offline_snapshot = getattr(self.network_access_manager, "offline_snapshot", None)
+        if ok or offline_snapshot is None or self.network_access_manager.offline or \
+                not offline_snapshot.contains(self.url_plugin):
+            return
+
+        qgs_logger = QgsApplication.messageLog()
+        qgs_logger.logMessage("url_plugin non raggiungibile, caricamento dalla copia locale",
+                              tag=configuration.LOGGER_TAG, level=Qgis.Warning)
+        self.network_access_manager.set_offline(True)
+        self.dlg.webview.load(QUrl(self.url_plugin))
+
     def slot_enable_developer_extra_tools(self):
         """
             Enable the additional settings for developers
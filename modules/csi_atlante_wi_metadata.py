@@ -39,7 +39,7 @@ from qgis.PyQt.QtWidgets import QDialog
 from qgis._core import QgsApplication, Qgis
 
 from .. import configuration
-from . import csi_utils
+from .csi_settings import CsiSettings
 from ..csi_atlante_wi_metadata_base import *
 
 try:
@@ -58,7 +58,7 @@ class DialogMetadata(QDialog):
         QDialog.__init__(self, parent)
         self.dlg = Ui_Dialog()
         self.dlg.setupUi(self)
-        self.debug = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/debug", default=False, value_type=bool)
+        self.debug = CsiSettings.instance().value("CSIAtlanteWI/debug", default=False, value_type=bool)
 
         if hasattr(self.dlg, 'webview'):
             self.dlg.gridLayout.removeWidget(self.dlg.webview)
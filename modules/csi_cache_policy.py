@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import time
+import fnmatch
+from qgis.PyQt import QtNetwork
+from qgis.PyQt.QtCore import QDateTime
+from qgis.core import Qgis, QgsApplication
+
+from . import csi_utils
+from .. import configuration
+
+# The request attribute storing the seconds the response is kept fresh in cache, overriding the server headers
+TTL_ATTRIBUTE = QtNetwork.QNetworkRequest.Attribute(QtNetwork.QNetworkRequest.User + 1)
+# The request attribute marking the background revalidations, which are not subject to the rules
+REVALIDATION_ATTRIBUTE = QtNetwork.QNetworkRequest.Attribute(QtNetwork.QNetworkRequest.User + 2)
+
+PREFER_CACHE = "PreferCache"
+PREFER_NETWORK = "PreferNetwork"
+ALWAYS_CACHE = "AlwaysCache"
+ALWAYS_NETWORK = "AlwaysNetwork"
+STALE_WHILE_REVALIDATE = "StaleWhileRevalidate"
+
+LOAD_CONTROLS = {
+    PREFER_CACHE: QtNetwork.QNetworkRequest.PreferCache,
+    PREFER_NETWORK: QtNetwork.QNetworkRequest.PreferNetwork,
+    ALWAYS_CACHE: QtNetwork.QNetworkRequest.AlwaysCache,
+    ALWAYS_NETWORK: QtNetwork.QNetworkRequest.AlwaysNetwork
+}
+
+
+class CsiCachePolicyRule(object):
+    """
+        Maps the URLs matching a pattern to a cache policy.
+    """
+
+    def __init__(self, pattern, policy, ttl):
+        """
+            Initialize the rule.
+            :param pattern: The URL pattern, in shell style (e.g. https://host/themes/*)
+            :type pattern: str
+            :param policy: The policy: PreferCache, PreferNetwork, AlwaysCache, AlwaysNetwork or StaleWhileRevalidate
+            :type policy: str
+            :param ttl: The seconds a response is considered fresh, regardless of the server headers. 0 for keeping
+            the server expiration
+            :type ttl: int
+        """
+        self.pattern = pattern
+        self.policy = policy
+        self.ttl = ttl
+
+    def get_load_control(self, meta_data):
+        """
+            Choose how to load the URL, given the cached response.
+            :param meta_data: The meta data of the cached response, invalid if not cached
+            :type meta_data: QNetworkCacheMetaData
+            :return: The cache load control and True in case the cached response must be revalidated in background
+            :rtype: tuple
+        """
+        cached = meta_data.isValid()
+        expired = not cached or not meta_data.expirationDate().isValid() or \
+            meta_data.expirationDate() < QDateTime.currentDateTimeUtc()
+
+        # Serving the cached response, even if stale, while refreshing it from the network
+        if self.policy == STALE_WHILE_REVALIDATE:
+            if not cached:
+                return QtNetwork.QNetworkRequest.PreferNetwork, False
+            return QtNetwork.QNetworkRequest.PreferCache, expired
+
+        # Qt serves any cached response with PreferCache: once the 'ttl' is elapsed the response is revalidated
+        if self.policy == PREFER_CACHE and self.ttl > 0 and expired:
+            return QtNetwork.QNetworkRequest.PreferNetwork, False
+
+        return LOAD_CONTROLS[self.policy], False
+
+
+class CsiCachePolicyRules(object):
+    """
+        The cache policy rules for the URLs requested by the web interface, overriding the server 'Cache-Control'.
+        The rules are read from the 'CSIAtlanteWI/cache_rules' setting, which is a list of rules separated by ';'.
+        Each rule is made of the URL pattern, the policy and the optional TTL in seconds, separated by spaces, e.g.:
+            */themes/* PreferCache 604800; */catalogo/*.json StaleWhileRevalidate 3600; */user/* AlwaysNetwork
+        The first rule matching the URL applies. The setting is read again every CACHE_RULES_RELOAD_INTERVAL seconds,
+        so that a change takes effect without restarting QGIS.
+    """
+
+    def __init__(self):
+        self.rules = []
+        self.loaded_time = None
+        self.load()
+
+    def load(self):
+        """
+            Load the rules from the settings.
+        """
+        qgs_logger = QgsApplication.messageLog()
+
+        rules_setting = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/cache_rules",
+                                                                    default=configuration.CACHE_RULES, value_type=str)
+        self.rules = []
+        for rule_string in rules_setting.split(";"):
+            pieces = rule_string.split()
+            if len(pieces) == 0:
+                continue
+
+            try:
+                if pieces[1] not in LOAD_CONTROLS and pieces[1] != STALE_WHILE_REVALIDATE:
+                    raise ValueError("unknown policy " + pieces[1])
+                self.rules.append(CsiCachePolicyRule(pieces[0], pieces[1], int(pieces[2]) if len(pieces) > 2 else 0))
+            except (IndexError, ValueError) as e:
+                qgs_logger.logMessage('Cache rule ignored "{}": {}'.format(rule_string, e),
+                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+
+        self.loaded_time = time.monotonic()
+
+    def get_rule(self, url):
+        """
+            Retrieve the rule for the given URL.
+            :param url: The URL
+            :type url: str
+            :return: The first matching rule or None
+            :rtype: CsiCachePolicyRule
+        """
+        if time.monotonic() - self.loaded_time > configuration.CACHE_RULES_RELOAD_INTERVAL:
+            self.load()
+
+        for rule in self.rules:
+            if fnmatch.fnmatchcase(url, rule.pattern):
+                return rule
+
+        return None
@@ -11,13 +11,13 @@ class CsiCertificate(object):
     def get_certificate(cls):
         # Set a value in case of use
         s = ""
-        qba = QByteArray(s)
+        qba = QByteArray(s.encode("ascii"))
         return qba
 
     @classmethod
     def get_key(cls):
         # Set a value in case of use
         s = ""
-        qba = QByteArray(s)
+        qba = QByteArray(s.encode("ascii"))
         return qba
 
@@ -67,5 +67,8 @@ class CsiClassHelper(object):
                 self.instance.maximumCacheSize()), tag=configuration.LOGGER_TAG, level=Qgis.Info)
             qgs_logger.logMessage("cacheSize(): {}".format(
                 self.instance.cacheSize()), tag=configuration.LOGGER_TAG, level=Qgis.Info)
+        elif self.class_name == "CsiNetworkCache":
+            for key, value in self.instance.get_statistics().items():
+                qgs_logger.logMessage("{}: {}".format(key, value), tag=configuration.LOGGER_TAG, level=Qgis.Info)
         else:
             qgs_logger.logMessage("Unknown class name!", tag=configuration.LOGGER_TAG, level=Qgis.Info)
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import time
+from qgis.PyQt import QtCore, QtNetwork
+from qgis.PyQt.QtCore import QUrl
+from qgis.core import Qgis, QgsApplication
+
+from .. import configuration
+from .csi_network_metrics import ORIGIN_ATTRIBUTE, UNTRACKED_ATTRIBUTE
+from .csi_network_replies import COALESCE_ATTRIBUTE
+
+# The origin of the requests sent for keeping the connections alive
+KEEP_ALIVE_ORIGIN = "keepalive"
+
+
+class CsiConnectionWarmer(QtCore.QObject):
+    """
+        Keeps warm the pooled connections of a CsiNetworkAccessManager to the backend URLs:
+        - 'pre_connect' opens the connections (including the TLS handshake) before the first request
+        - while the backend is in use, a HEAD request for a static resource is sent every 'interval' seconds, so that
+          the idle connections are not closed by the server or the proxy. The requests stop once the backend is idle
+          for 'idle_limit' seconds. They are not reported in the network metrics
+    """
+
+    def __init__(self, network_access_manager, urls, interval, idle_limit, keep_alive_url, parent=None):
+        """
+            Initialize the warmer.
+            :param network_access_manager: The manager owning the connections
+            :type network_access_manager: CsiNetworkAccessManager
+            :param urls: The backend URLs
+            :type urls: list of str
+            :param interval: The seconds between the keep-alive requests, 0 for disabling them
+            :type interval: int
+            :param idle_limit: The seconds of inactivity after which the keep-alive requests stop
+            :type idle_limit: int
+            :param keep_alive_url: The URL of the resource requested for keeping alive the connections, absolute or
+            relative to each backend URL
+            :type keep_alive_url: str
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiConnectionWarmer, self).__init__(parent)
+        self.network_access_manager = network_access_manager
+        self.urls = [QUrl(u) for u in urls if u]
+        self.hosts = set(u.host().lower() for u in self.urls)
+        self.keep_alive_urls = [u.resolved(QUrl(keep_alive_url)) for u in self.urls]
+        self.idle_limit = idle_limit
+        self.last_activity = 0
+
+        self.timer = QtCore.QTimer(self)
+        self.timer.setInterval(interval * 1000)
+        self.timer.timeout.connect(self.slot_keep_alive)
+
+    def pre_connect(self):
+        """
+            Open in background the connections to the backend URLs.
+        """
+        for url in self.urls:
+            QgsApplication.messageLog().logMessage('CsiConnectionWarmer: pre-connect {}'.format(url.host()),
+                                                   tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
+            if url.scheme().lower() == "https":
+                request = self.network_access_manager.apply_ssl(QtNetwork.QNetworkRequest(url))
+                self.network_access_manager.connectToHostEncrypted(url.host(), url.port(443),
+                                                                   request.sslConfiguration())
+            else:
+                self.network_access_manager.connectToHost(url.host(), url.port(80))
+
+    def notify_request(self, request):
+        """
+            Track the activity towards the backend, starting the keep-alive requests if needed.
+            :param request: The request being sent
+            :type request: QNetworkRequest
+        """
+        if request.url().host().lower() not in self.hosts or request.attribute(ORIGIN_ATTRIBUTE) == KEEP_ALIVE_ORIGIN:
+            return
+
+        self.last_activity = time.time()
+        if self.timer.interval() > 0 and not self.timer.isActive():
+            self.timer.start()
+
+    def slot_keep_alive(self):
+        """
+            Send the keep-alive requests, unless the backend is idle.
+        """
+        if time.time() - self.last_activity > self.idle_limit:
+            self.timer.stop()
+            return
+
+        for url in self.keep_alive_urls:
+            request = QtNetwork.QNetworkRequest(url)
+            request.setAttribute(ORIGIN_ATTRIBUTE, KEEP_ALIVE_ORIGIN)
+            request.setAttribute(UNTRACKED_ATTRIBUTE, True)
+            request.setAttribute(COALESCE_ATTRIBUTE, False)
+            request.setAttribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute,
+                                 QtNetwork.QNetworkRequest.AlwaysNetwork)
+            request.setAttribute(QtNetwork.QNetworkRequest.CacheSaveControlAttribute, False)
+            reply = self.network_access_manager.head(request)
+            reply.finished.connect(reply.deleteLater)
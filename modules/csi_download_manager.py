@@ -0,0 +1,160 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+from qgis.PyQt import QtCore
+
+from .. import configuration
+from .csi_file_download import CsiFileDownload
+from .csi_settings import CsiSettings
+
+
+class CsiDownloadManager(QtCore.QObject):
+    """
+        Runs the file downloads in background, without blocking the caller.
+        Every download notifies its completion through the given callback, invoked in the GUI thread. Requests for a
+        file which is already being downloaded share the transfer in progress.
+        At most 'max_parallel_downloads' transfers run at the same time, the others wait in a queue.
+    """
+
+    def __init__(self, network_access_manager, parent=None):
+        """
+            Initialize the manager with the NetworkAccessManager to use for the requests.
+            :param network_access_manager: The NetworkAccessManager to use for the requests
+            :type network_access_manager: QNetworkAccessManager
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiDownloadManager, self).__init__(parent)
+        self.network_access_manager = network_access_manager
+        self.max_parallel_downloads = max(1, CsiSettings.instance().value(
+            "CSIAtlanteWI/max_parallel_downloads", default=configuration.MAX_PARALLEL_DOWNLOADS, value_type=int))
+        # The downloads either in progress or queued, referenced until they finish
+        self.downloads = []
+        # The downloads waiting for a free slot
+        self.queue = []
+
+    def download(self, url, local_file_path, callback=None, headers=None, resumable=False, origin=None):
+        """
+            Schedule the download of the remote file and return immediately.
+            :param url: The URL of the remote file
+            :type url: str
+            :param local_file_path: The destination file path
+            :type local_file_path: str
+            :param callback: The function invoked with the CsiFileDownload once the transfer ends
+            :type callback: function
+            :param headers: The additional request headers
+            :type headers: dict
+            :param resumable: True for resuming the transfer, from the partial data, in case of failure
+            :type resumable: bool
+            :param origin: The name of the operation requesting the download, reported in the network metrics
+            :type origin: str
+            :return: The scheduled download
+            :rtype: CsiFileDownload
+        """
+        # A transfer towards the same file is in progress: wait for it rather than writing the file twice
+        for download in self.downloads:
+            if download.url == url and download.local_file_path == local_file_path:
+                if callback is not None:
+                    download.finished.connect(callback)
+                return download
+
+        download = CsiFileDownload(self.network_access_manager, url, local_file_path, headers, resumable, origin,
+                                   self)
+        download.finished.connect(self.slot_download_finished)
+        if callback is not None:
+            download.finished.connect(callback)
+
+        self.downloads.append(download)
+        self.queue.append(download)
+        self.start_queued_downloads()
+
+        return download
+
+    def download_batch(self, requests, callback, origin=None):
+        """
+            Schedule the download of a set of remote files, which are transferred concurrently.
+            :param requests: The list of (URL, destination file path, request headers, resumable) tuples
+            :type requests: list of tuple
+            :param callback: The function invoked with the list of CsiFileDownload once all the transfers end
+            :type callback: function
+            :param origin: The name of the operation requesting the downloads, reported in the network metrics
+            :type origin: str
+        """
+        if len(requests) == 0:
+            QtCore.QTimer.singleShot(0, lambda: callback([]))
+            return
+
+        downloads = []
+        remaining = [len(requests)]
+
+        def slot_batch_item_finished(download):
+            remaining[0] -= 1
+            if remaining[0] == 0:
+                callback(downloads)
+
+        for url, local_file_path, headers, resumable in requests:
+            downloads.append(self.download(url, local_file_path, slot_batch_item_finished, headers, resumable,
+                                           origin))
+
+    def is_downloading(self, local_file_path):
+        """
+            Check if a download towards the given local file is in progress.
+            :param local_file_path: The destination file path
+            :type local_file_path: str
+            :return: True in case the file is being downloaded
+            :rtype: bool
+        """
+        return any(d.local_file_path == local_file_path for d in self.downloads)
+
+    def start_queued_downloads(self):
+        """
+            Start the queued downloads while there are free slots.
+        """
+        while self.queue and len(self.downloads) - len(self.queue) < self.max_parallel_downloads:
+            download = self.queue.pop(0)
+            if not download.start():
+                # Notifying the failure asynchronously, as for any other download
+                QtCore.QTimer.singleShot(0, lambda d=download: d.finished.emit(d))
+
+    def slot_download_finished(self, download):
+        """
+            Release the reference to the finished download and start the next queued one.
+            :param download: The finished download
+            :type download: CsiFileDownload
+        """
+        if download in self.downloads:
+            self.downloads.remove(download)
+        download.deleteLater()
+        self.start_queued_downloads()
@@ -0,0 +1,329 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+from qgis.PyQt import QtCore, QtNetwork
+from qgis.PyQt.QtCore import QUrl
+from qgis.core import Qgis, QgsApplication
+
+from . import csi_utils
+from .. import configuration
+from .csi_network_metrics import ORIGIN_ATTRIBUTE
+from .csi_network_replies import COALESCE_ATTRIBUTE
+
+
+class CsiFileDownload(QtCore.QObject):
+    """
+        Streams a remote file to the local filesystem.
+        The data is written in a temporary '.part' file as soon as it arrives from the network, so that the memory in
+        use doesn't depend on the file size. The temporary file replaces the destination only when the transfer
+        completed successfully and its size matches the one declared by the server.
+        A resumable download keeps the '.part' file in case of failure, together with a '.part.json' file storing the
+        server validators: the next attempt continues from the last received byte with an HTTP 'Range' request.
+    """
+
+    # Emitted with the CsiFileDownload instance when the transfer ends, either successfully or not
+    finished = QtCore.pyqtSignal(object)
+
+    def __init__(self, network_access_manager, url, local_file_path, headers=None, resumable=False, origin=None,
+                 parent=None):
+        """
+            Prepare the download, which is started by 'start'.
+            :param network_access_manager: The NetworkAccessManager to use for the request
+            :type network_access_manager: QNetworkAccessManager
+            :param url: The URL of the remote file
+            :type url: str
+            :param local_file_path: The destination file path
+            :type local_file_path: str
+            :param headers: The additional request headers (e.g. If-None-Match for a conditional request)
+            :type headers: dict
+            :param resumable: True for keeping the partial data in case of failure and resuming the transfer
+            :type resumable: bool
+            :param origin: The name of the operation requesting the download, reported in the network metrics
+            :type origin: str
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiFileDownload, self).__init__(parent)
+        self.network_access_manager = network_access_manager
+        self.url = url
+        self.local_file_path = local_file_path
+        self.headers = headers or {}
+        self.resumable = resumable
+        self.origin = origin
+        self.part_file_path = local_file_path + ".part"
+        self.metadata_file_path = self.part_file_path + ".json"
+        # The server validators and the expected size of the file being downloaded
+        self.metadata = {}
+        self.part_file = None
+        self.reply = None
+        # The bytes already in the '.part' file when the request was sent
+        self.offset = 0
+        self.bytes_written = 0
+        self.retries = 0
+        self.accept_data = False
+        self.status_code = None
+        self.response_headers = {}
+        self.succeeded = False
+        # True in case the server answered '304 Not Modified' to a conditional request: the destination is untouched
+        self.not_modified = False
+        self.error_message = ""
+
+    def start(self):
+        """
+            Send the request and start streaming the reply to the '.part' file.
+            :return: False in case the download couldn't be started
+            :rtype: bool
+        """
+        headers = dict(self.headers)
+
+        # Resuming the previous attempt, which is possible only if the remote file can be checked for changes
+        self.offset = 0
+        self.metadata = {}
+        if self.resumable and os.path.isfile(self.part_file_path):
+            metadata = csi_utils.load_json_file(self.metadata_file_path, default={})
+            validator = metadata.get("etag") or metadata.get("last_modified")
+            if metadata.get("url") == self.url and validator:
+                self.metadata = metadata
+                self.offset = os.path.getsize(self.part_file_path)
+
+        if self.offset > 0:
+            # The conditional headers refer to the complete local file, not to the partial one
+            headers.pop("If-None-Match", None)
+            headers.pop("If-Modified-Since", None)
+            headers["Range"] = "bytes={}-".format(self.offset)
+            headers["If-Range"] = self.metadata.get("etag") or self.metadata.get("last_modified")
+
+        try:
+            self.part_file = open(self.part_file_path, "ab" if self.offset > 0 else "wb")
+        except OSError as e:
+            self.error_message = str(e)
+            return False
+
+        request = QtNetwork.QNetworkRequest(QUrl(self.url))
+        # The downloaded files are stored by the plugin: avoid filling the browser cache with them and let the
+        # conditional requests reach the server
+        request.setAttribute(QtNetwork.QNetworkRequest.CacheSaveControlAttribute, False)
+        request.setAttribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute,
+                             QtNetwork.QNetworkRequest.AlwaysNetwork)
+        # The content is streamed to disk through a bounded read buffer: it must not be held in memory to be shared
+        # with identical requests (the CsiDownloadManager already shares the downloads of the same file)
+        request.setAttribute(COALESCE_ATTRIBUTE, False)
+        for header, value in headers.items():
+            request.setRawHeader(header.encode("utf-8"), value.encode("utf-8"))
+        if self.origin:
+            request.setAttribute(ORIGIN_ATTRIBUTE, self.origin)
+
+        self.accept_data = True
+        self.reply = self.network_access_manager.get(request)
+        # Limit the data buffered by Qt in case the disk is slower than the network
+        self.reply.setReadBufferSize(configuration.DOWNLOAD_READ_BUFFER_SIZE)
+        self.reply.metaDataChanged.connect(self.slot_meta_data_changed)
+        self.reply.readyRead.connect(self.slot_ready_read)
+        self.reply.finished.connect(self.slot_finished)
+        return True
+
+    def get_total_size(self):
+        """
+            Retrieve the size of the complete remote file from the response headers.
+            :return: The size in bytes or None if unknown
+            :rtype: int
+        """
+        try:
+            if self.status_code == 206:
+                # e.g. "bytes 1000-1999/2000"
+                return int(self.response_headers.get("content-range", "").split("/")[-1])
+
+            # The data transparently decompressed by Qt doesn't match the declared length
+            if "content-encoding" not in self.response_headers:
+                return int(self.response_headers["content-length"])
+        except (KeyError, ValueError):
+            pass
+
+        return None
+
+    def slot_meta_data_changed(self):
+        """
+            Process the response headers before any data is written.
+        """
+        self.status_code = self.reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        self.response_headers = {bytes(k).decode("latin-1").lower(): bytes(v).decode("latin-1")
+                                 for k, v in self.reply.rawHeaderPairs()}
+
+        # Just the file content is written, not the body of the error pages
+        self.accept_data = self.status_code in (None, 200, 206)
+
+        # The server sent the whole file (e.g. it changed since the previous attempt): restart from the beginning
+        if self.offset > 0 and self.status_code == 200:
+            self.part_file.seek(0)
+            self.part_file.truncate()
+            self.offset = 0
+
+        if self.resumable and self.status_code in (200, 206):
+            self.metadata = {
+                "url": self.url,
+                "etag": self.response_headers.get("etag", self.metadata.get("etag", "")),
+                "last_modified": self.response_headers.get("last-modified", self.metadata.get("last_modified", "")),
+                "total_size": self.get_total_size()
+            }
+            csi_utils.save_json_file(self.metadata_file_path, self.metadata)
+
+    def slot_ready_read(self):
+        """
+            Write to the '.part' file the chunk of data available in the reply.
+        """
+        chunk = self.reply.readAll()
+        if chunk.isEmpty() or not self.accept_data:
+            return
+
+        self.part_file.write(chunk.data())
+        self.bytes_written += chunk.size()
+
+    def slot_finished(self):
+        """
+            Complete the transfer: on success the '.part' file replaces the destination.
+            In case of a network failure a resumable download is retried, continuing from the received data.
+        """
+        qgs_logger = QgsApplication.messageLog()
+
+        # Writing the data arrived together with the 'finished' signal
+        self.slot_ready_read()
+        self.part_file.close()
+
+        error = self.reply.error()
+        error_string = self.reply.errorString()
+        self.reply.deleteLater()
+        self.reply = None
+
+        if error == QtNetwork.QNetworkReply.NoError and self.status_code == 304:
+            self.not_modified = True
+            self.succeeded = True
+        elif error == QtNetwork.QNetworkReply.NoError and self.is_file_content():
+            self.complete()
+        elif error == QtNetwork.QNetworkReply.NoError:
+            # e.g. a redirection not followed: the destination is untouched
+            self.error_message = "Risposta inattesa del server: HTTP {}".format(self.status_code)
+        elif self.status_code == 416:
+            # The '.part' file doesn't match the remote file anymore
+            self.error_message = "Dati parziali non validi"
+            self.discard_part()
+        else:
+            self.error_message = error_string
+
+        if not self.succeeded and self.can_retry(error):
+            self.retries += 1
+            qgs_logger.logMessage('CsiFileDownload: {} -> {}, retry {} of {}'
+                                  .format(self.url, self.error_message, self.retries, configuration.DOWNLOAD_RETRIES),
+                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+            QtCore.QTimer.singleShot(configuration.DOWNLOAD_RETRY_DELAY, self.slot_retry)
+            return
+
+        if not self.succeeded:
+            qgs_logger.logMessage('CsiFileDownload: {} -> {}'.format(self.url, self.error_message),
+                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+            if not self.resumable:
+                self.discard_part()
+        elif os.path.exists(self.part_file_path):
+            os.remove(self.part_file_path)
+
+        self.finished.emit(self)
+
+    def is_file_content(self):
+        """
+            Check if the body of the reply is the file content, which is the case for the successful HTTP responses
+            and for the non-HTTP URLs (e.g. file://), which have no status code.
+            :return: True if the reply can replace the destination
+            :rtype: bool
+        """
+        if self.status_code is None:
+            return QUrl(self.url).scheme().lower() not in ("http", "https")
+        return self.status_code in (200, 206)
+
+    def complete(self):
+        """
+            Verify the size of the '.part' file and move it to the destination.
+        """
+        total_size = self.metadata.get("total_size") if self.resumable else self.get_total_size()
+        size = os.path.getsize(self.part_file_path)
+        if total_size is not None and size != total_size:
+            self.error_message = "Dimensione del file scaricato non corrispondente: {} byte invece di {}"\
+                .format(size, total_size)
+            self.discard_part()
+            return
+
+        try:
+            os.replace(self.part_file_path, self.local_file_path)
+            self.succeeded = True
+        except OSError as e:
+            self.error_message = str(e)
+            return
+
+        if os.path.exists(self.metadata_file_path):
+            os.remove(self.metadata_file_path)
+
+    def discard_part(self):
+        """
+            Remove the '.part' file and its metadata.
+        """
+        for file_path in (self.part_file_path, self.metadata_file_path):
+            if os.path.exists(file_path):
+                os.remove(file_path)
+
+    def can_retry(self, error):
+        """
+            Check if a resumable download can be retried after the given error.
+            :param error: The reply error
+            :type error: QNetworkReply.NetworkError
+            :return: True in case of a network failure and the retries are not exhausted
+            :rtype: bool
+        """
+        if not self.resumable or self.retries >= configuration.DOWNLOAD_RETRIES:
+            return False
+
+        # The invalid partial data is discarded, so the download restarts from the beginning
+        if self.status_code == 416:
+            return True
+
+        # Connection errors (e.g. remote host closed, timeout, temporary network failure) but the user cancellation
+        return 0 < int(error) < 100 and error != QtNetwork.QNetworkReply.OperationCanceledError
+
+    def slot_retry(self):
+        """
+            Retry the download, continuing from the received data.
+        """
+        self.status_code = None
+        self.response_headers = {}
+        if not self.start():
+            self.finished.emit(self)
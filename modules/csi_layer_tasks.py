@@ -0,0 +1,265 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+
+from qgis.PyQt import QtCore
+from qgis.core import QgsApplication, QgsRasterLayer, QgsTask, QgsVectorLayer
+
+
+# The page event notifying the progress of the layers built in background
+LAYER_EVENT = "qgis:layer"
+
+
+class CsiLayerTask(QgsTask):
+    """
+        Build a layer and apply its QML style in background: the provider initialization (e.g. the WMS
+        GetCapabilities, the WFS DescribeFeatureType or the PostGIS metadata queries) doesn't block the GUI thread.
+        Once valid, the layer is moved to the main thread, ready to be added to the project.
+    """
+
+    def __init__(self, layer_name, uri, provider_key, raster=False, qml_file_path=None, load_default_style=True):
+        """
+            Initialize the task.
+            :param layer_name: The layer name
+            :type layer_name: str
+            :param uri: The layer data source URI
+            :type uri: str
+            :param provider_key: The provider key (e.g. wms, WFS, postgres)
+            :type provider_key: str
+            :param raster: True for a raster layer, False for a vector layer
+            :type raster: bool
+            :param qml_file_path: The *.qml file path of the style to apply, if any
+            :type qml_file_path: str
+            :param load_default_style: False for not loading the default style of a vector layer
+            :type load_default_style: bool
+        """
+        super(CsiLayerTask, self).__init__("CSI Atlante WI: {}".format(layer_name), QgsTask.CanCancel)
+        self.layer_name = layer_name
+        self.uri = uri
+        self.provider_key = provider_key
+        self.raster = raster
+        self.qml_file_path = qml_file_path
+        self.load_default_style = load_default_style
+        self.layer = None
+        self.error_message = ""
+        self.style_error_message = ""
+
+    def run(self):
+        """
+            Build the layer, in the task manager thread.
+            :return: True in case the layer is valid
+            :rtype: bool
+        """
+        try:
+            if self.raster:
+                layer = QgsRasterLayer(self.uri, self.layer_name, self.provider_key)
+            else:
+                layer = QgsVectorLayer(self.uri, self.layer_name, self.provider_key,
+                                       QgsVectorLayer.LayerOptions(self.load_default_style))
+            if self.isCanceled():
+                return False
+
+            if not layer.isValid():
+                self.error_message = layer.error().summary()
+                return False
+            self.setProgress(70)
+
+            # The style is applied before the layer is added, so that the first rendering already uses it
+            if self.qml_file_path:
+                message, loaded = layer.loadNamedStyle(self.qml_file_path)
+                if not loaded:
+                    self.style_error_message = message
+
+            # The layer is handed to the main thread, where it is added to the project
+            layer.moveToThread(QgsApplication.instance().thread())
+            self.layer = layer
+            self.setProgress(100)
+            return True
+        except Exception as e:
+            self.error_message = str(e)
+            return False
+
+
+class CsiLayerPipeline(QtCore.QObject):
+    """
+        Run the CsiLayerTask through the QGIS task manager, invoking the callbacks on the main thread once each task
+        ends. When not in background, the tasks are run immediately in the calling thread.
+    """
+
+    def __init__(self, background=True, parent=None):
+        """
+            Initialize the pipeline.
+            :param background: False for running the tasks in the calling thread
+            :type background: bool
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiLayerPipeline, self).__init__(parent)
+        self.background = background
+        # The running tasks and the canceled ones, referenced until they end
+        self.tasks = set()
+        self.canceled_tasks = set()
+
+    def submit(self, task, completed_callback, failed_callback, progress_callback=None):
+        """
+            Run the task.
+            :param task: The task
+            :type task: CsiLayerTask
+            :param completed_callback: The function invoked with the task once the layer is built
+            :type completed_callback: function
+            :param failed_callback: The function invoked with the task in case the layer is not valid or the task is
+                canceled
+            :type failed_callback: function
+            :param progress_callback: The function invoked with the task and the progress percentage
+            :type progress_callback: function
+        """
+        if not self.background:
+            if task.run():
+                completed_callback(task)
+            else:
+                failed_callback(task)
+            return
+
+        self.tasks.add(task)
+        task.taskCompleted.connect(lambda: self.finish(task, completed_callback))
+        task.taskTerminated.connect(lambda: self.finish(task, failed_callback))
+        if progress_callback is not None:
+            task.progressChanged.connect(lambda progress: self.progress(task, progress, progress_callback))
+        QgsApplication.taskManager().addTask(task)
+
+    def progress(self, task, progress, callback):
+        """
+            Invoke the progress callback of the task, unless it was canceled through the pipeline.
+            :param task: The task
+            :type task: CsiLayerTask
+            :param progress: The progress percentage
+            :type progress: float
+            :param callback: The callback
+            :type callback: function
+        """
+        if task in self.tasks:
+            callback(task, progress)
+
+    def finish(self, task, callback):
+        """
+            Invoke the callback of the ended task, unless it was canceled through the pipeline.
+            :param task: The task
+            :type task: CsiLayerTask
+            :param callback: The callback
+            :type callback: function
+        """
+        if task in self.canceled_tasks:
+            self.canceled_tasks.discard(task)
+            return
+
+        self.tasks.discard(task)
+        callback(task)
+
+    def cancel_all(self):
+        """
+            Cancel the running tasks, without invoking their callbacks.
+        """
+        self.canceled_tasks.update(self.tasks)
+        self.tasks = set()
+        for task in self.canceled_tasks:
+            task.cancel()
+
+
+class CsiLayerSet(object):
+    """
+        Collect the tasks building a set of layers, so that the layers are added to the project together once every
+        task ended.
+    """
+
+    def __init__(self, pipeline, finished_callback, task_callback=None):
+        """
+            Initialize the set.
+            :param pipeline: The pipeline running the tasks
+            :type pipeline: CsiLayerPipeline
+            :param finished_callback: The function invoked with the set once every task ended
+            :type finished_callback: function
+            :param task_callback: The function invoked with the set and the task once each task ends
+            :type task_callback: function
+        """
+        self.pipeline = pipeline
+        self.finished_callback = finished_callback
+        self.task_callback = task_callback
+        # The tasks, in the order given, with the data related to each one
+        self.entries = []
+        # The names of the layers failed before building them
+        self.failed_names = []
+        self.pending = 0
+
+    def add(self, task, data=None):
+        """
+            Add a task to the set.
+            :param task: The task
+            :type task: CsiLayerTask
+            :param data: The data related to the task, given back with it
+            :type data: type
+        """
+        self.entries.append((task, data))
+
+    def add_failure(self, layer_name):
+        """
+            Add to the set a layer failed before building it.
+            :param layer_name: The layer name
+            :type layer_name: str
+        """
+        self.failed_names.append(layer_name)
+
+    def start(self):
+        """
+            Run the tasks of the set.
+        """
+        self.pending = len(self.entries)
+        if self.pending == 0:
+            self.finished_callback(self)
+            return
+
+        for task, data in list(self.entries):
+            self.pipeline.submit(task, self.task_ended, self.task_ended)
+
+    def task_ended(self, task):
+        """
+            Count the ended task, invoking the finished callback after the last one.
+            :param task: The ended task
+            :type task: CsiLayerTask
+        """
+        self.pending -= 1
+        if self.task_callback is not None:
+            self.task_callback(self, task)
+        if self.pending == 0:
+            self.finished_callback(self)
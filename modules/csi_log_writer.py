@@ -0,0 +1,247 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+import time
+import queue
+import datetime
+import threading
+
+from . import csi_utils
+from .. import configuration
+from .csi_settings import CsiSettings
+
+
+class CsiLogWriter(object):
+    """
+        Writes the log records to file from a background thread, so that logging never blocks the GUI thread.
+        The records are queued by 'write' and the thread appends them to the file in batches, at most every
+        'flush_interval' seconds. The file is rotated once it exceeds 'max_size' bytes or it is older than 'max_age'
+        seconds, keeping 'backup_count' previous files (e.g. csiatlantewi.log.1, csiatlantewi.log.2, ...).
+    """
+
+    # The maximum number of records waiting to be written: further records are discarded
+    QUEUE_SIZE = 10000
+
+    # The shared instance
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """
+            Retrieve the shared instance, configured from the settings and started on the first use.
+            :return: The writer
+            :rtype: CsiLogWriter
+        """
+        if cls._instance is None:
+            settings = CsiSettings.instance()
+            cls._instance = CsiLogWriter(
+                cls.get_log_file_path(),
+                settings.value("CSIAtlanteWI/log_max_size", default=configuration.LOG_MAX_SIZE, value_type=int),
+                settings.value("CSIAtlanteWI/log_max_age", default=configuration.LOG_MAX_AGE, value_type=int),
+                settings.value("CSIAtlanteWI/log_backup_count", default=configuration.LOG_BACKUP_COUNT,
+                               value_type=int),
+                configuration.LOG_FLUSH_INTERVAL)
+            cls._instance.tags = set(t.strip() for t in settings.value(
+                "CSIAtlanteWI/log_tags", default=configuration.LOG_TAGS, value_type=str).split(","))
+            cls._instance.min_level = settings.value("CSIAtlanteWI/log_level", default=configuration.LOG_LEVEL,
+                                                     value_type=int)
+        return cls._instance
+
+    @classmethod
+    def shutdown(cls):
+        """
+            Stop the shared instance, if started.
+        """
+        if cls._instance is not None:
+            cls._instance.stop()
+            cls._instance = None
+
+    @staticmethod
+    def get_log_file_path():
+        """
+            Retrieve the configured log file path, by default in the plugin data directory.
+            :return: The log file path
+            :rtype: str
+        """
+        return CsiSettings.instance().value("CSIAtlanteWI/logfile", default=configuration.CSI_LOG_FILE_PATH,
+                                            value_type=str) or csi_utils.get_plugin_data_dir("logs", "csiatlantewi.log")
+
+    def __init__(self, log_file_path, max_size, max_age, backup_count, flush_interval):
+        """
+            Start the writer thread.
+            :param log_file_path: The log file path
+            :type log_file_path: str
+            :param max_size: The size in bytes after which the file is rotated, 0 for no limit
+            :type max_size: int
+            :param max_age: The age in seconds after which the file is rotated, 0 for no limit
+            :type max_age: int
+            :param backup_count: The number of rotated files kept
+            :type backup_count: int
+            :param flush_interval: The seconds between the writes
+            :type flush_interval: float
+        """
+        self.log_file_path = log_file_path
+        self.max_size = max_size
+        self.max_age = max_age
+        self.backup_count = backup_count
+        self.flush_interval = flush_interval
+        self.records = queue.Queue(self.QUEUE_SIZE)
+        self.dropped = 0
+        self.opened = None
+        # The tags of the messages to write ("*" for all) and the minimum level
+        self.tags = {"*"}
+        self.min_level = 0
+
+        self.thread = threading.Thread(target=self.run, name="CsiLogWriter")
+        self.thread.daemon = True
+        self.thread.start()
+
+    def accepts(self, tag, level):
+        """
+            Check if the messages with the given tag and level must be written.
+            :param tag: The tag
+            :type tag: str
+            :param level: The level
+            :type level: int
+            :return: True if the message must be written
+            :rtype: bool
+        """
+        return level >= self.min_level and ("*" in self.tags or tag in self.tags)
+
+    def write(self, message, tag, level):
+        """
+            Queue the record for writing. The method returns immediately.
+            :param message: The message to log
+            :type message: str
+            :param tag: The tag to use
+            :type tag: str
+            :param level: The level
+            :type level: int
+        """
+        log_time = datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S")
+        try:
+            self.records.put_nowait('[{logtime}] [{tag}] [{level}] : {message} \n'
+                                    .format(logtime=log_time, tag=tag, level=level, message=message))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self):
+        """
+            Write the queued records and stop the writer thread.
+        """
+        self.records.put(None)
+        self.thread.join(5)
+
+    def run(self):
+        """
+            The writer thread loop.
+        """
+        running = True
+        while running:
+            lines = [self.records.get()]
+            # Collecting the records queued meanwhile
+            time.sleep(self.flush_interval)
+            while True:
+                try:
+                    lines.append(self.records.get_nowait())
+                except queue.Empty:
+                    break
+
+            if None in lines:
+                running = False
+                lines = [line for line in lines if line is not None]
+
+            if self.dropped > 0:
+                lines.append('[{}] [CsiLogWriter] : {} record scartati \n'.format(
+                    datetime.datetime.now().strftime("%Y-%m-%dT%H:%M:%S"), self.dropped))
+                self.dropped = 0
+
+            try:
+                self.write_lines(lines)
+            except OSError:
+                # Nowhere to report it: the records are lost
+                pass
+
+    def write_lines(self, lines):
+        """
+            Append the lines to the log file, rotating it if needed.
+            :param lines: The lines to write
+            :type lines: list of str
+        """
+        if len(lines) == 0:
+            return
+
+        directory = os.path.dirname(self.log_file_path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        if self.must_rotate():
+            self.rotate()
+
+        if self.opened is None:
+            self.opened = os.path.getctime(self.log_file_path) if os.path.exists(self.log_file_path) else time.time()
+
+        with open(self.log_file_path, "a", encoding="utf-8") as log_file:
+            log_file.write("".join(lines))
+
+    def must_rotate(self):
+        """
+            Check if the log file must be rotated.
+            :return: True if the file exceeds the maximum size or age
+            :rtype: bool
+        """
+        if not os.path.exists(self.log_file_path):
+            return False
+
+        if self.max_size > 0 and os.path.getsize(self.log_file_path) > self.max_size:
+            return True
+
+        return self.max_age > 0 and self.opened is not None and time.time() - self.opened > self.max_age
+
+    def rotate(self):
+        """
+            Rotate the log file, removing the oldest backup.
+        """
+        for index in range(self.backup_count - 1, 0, -1):
+            source = "{}.{}".format(self.log_file_path, index)
+            if os.path.exists(source):
+                os.replace(source, "{}.{}".format(self.log_file_path, index + 1))
+
+        if self.backup_count > 0:
+            os.replace(self.log_file_path, self.log_file_path + ".1")
+        else:
+            os.remove(self.log_file_path)
+        self.opened = time.time()
@@ -0,0 +1,245 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+
+import re
+
+from qgis.core import Qgis, QgsApplication
+
+from .. import configuration
+from .csi_settings import CsiSettings
+
+
+# The text written in place of the credentials
+REDACTED = "***"
+
+# The names of the fields holding credentials
+SECRET_KEYS = re.compile(r"pass(word|wd)?|pwd|secret|token|authorization|cookie", re.IGNORECASE)
+
+# The patterns of the credentials in the text: 'key=value' pairs (e.g. password='...' in the data source URIs or
+# password=... in the query strings) and the 'user:password@' part of the URLs
+SECRET_PATTERNS = [
+    (re.compile(r"\b((?:password|passwd|pwd|secret|token)\s*[=:]\s*)('[^']*'|\"[^\"]*\"|[^\s&;,'\"]+)",
+                re.IGNORECASE), r"\1" + REDACTED),
+    (re.compile(r"(://[^/\s:@]+:)[^/\s@]+@"), r"\1" + REDACTED + "@"),
+]
+
+
+def redact(text):
+    """
+        Replace the credentials in the text.
+        :param text: The text
+        :type text: str
+        :return: The text without credentials
+        :rtype: str
+    """
+    for pattern, replacement in SECRET_PATTERNS:
+        text = pattern.sub(replacement, text)
+    return text
+
+
+class CsiLogger(object):
+    """
+        Write the messages to the QGIS message log, provided their level is not lower than the configured one.
+        The level is checked before formatting: the arguments are formatted only for the messages actually written,
+        and the callable arguments are called only then. The credentials are removed from the written messages.
+    """
+
+    def __init__(self, tag=configuration.LOGGER_TAG):
+        """
+            Initialize the logger reading the level from the settings.
+            :param tag: The tag of the messages
+            :type tag: str
+        """
+        self.tag = tag
+        self.settings = CsiSettings.instance()
+        self.level = Qgis.Warning
+        self.load_level()
+        self.settings.changed.connect(self.slot_settings_changed)
+
+    def load_level(self):
+        """
+            Read the level from the settings: in debug mode all the messages are written.
+        """
+        if self.settings.value("CSIAtlanteWI/debug", default=configuration.DEBUG, value_type=bool):
+            self.level = Qgis.Info
+        else:
+            self.level = self.settings.value("CSIAtlanteWI/logger_level", default=configuration.LOGGER_LEVEL,
+                                             value_type=int)
+
+    def slot_settings_changed(self, value_key, value):
+        """
+            Read again the level in case one of its settings is changed.
+            :param value_key: The key of the changed value
+            :type value_key: str
+            :param value: The new value
+            :type value: type
+        """
+        if value_key in ("CSIAtlanteWI/debug", "CSIAtlanteWI/logger_level"):
+            self.load_level()
+
+    def is_enabled(self, level):
+        """
+            Check whether the messages with the level are written.
+            :param level: The level
+            :type level: Qgis.MessageLevel
+            :return: True in case they are written
+            :rtype: bool
+        """
+        return level >= self.level
+
+    def log(self, level, message, *args):
+        """
+            Write the message, in case its level is enabled.
+            :param level: The level
+            :type level: Qgis.MessageLevel
+            :param message: The message, with the '{}' fields replaced by the arguments
+            :type message: str
+            :param args: The arguments: the callable ones are called to retrieve the value
+            :type args: tuple
+        """
+        if not self.is_enabled(level):
+            return
+
+        if len(args) > 0:
+            message = message.format(*[arg() if callable(arg) else arg for arg in args])
+        QgsApplication.messageLog().logMessage(redact(message), tag=self.tag, level=level)
+
+    def info(self, message, *args):
+        """
+            Write the message with the Info level.
+            :param message: The message
+            :type message: str
+            :param args: The arguments
+            :type args: tuple
+        """
+        self.log(Qgis.Info, message, *args)
+
+    def warning(self, message, *args):
+        """
+            Write the message with the Warning level.
+            :param message: The message
+            :type message: str
+            :param args: The arguments
+            :type args: tuple
+        """
+        self.log(Qgis.Warning, message, *args)
+
+    def critical(self, message, *args):
+        """
+            Write the message with the Critical level.
+            :param message: The message
+            :type message: str
+            :param args: The arguments
+            :type args: tuple
+        """
+        self.log(Qgis.Critical, message, *args)
+
+    def operation(self, name, level=Qgis.Info):
+        """
+            Start the record of an operation.
+            :param name: The operation name
+            :type name: str
+            :param level: The initial level of the record
+            :type level: Qgis.MessageLevel
+            :return: The record
+            :rtype: CsiLogRecord
+        """
+        return CsiLogRecord(self, name, level)
+
+
+class CsiLogRecord(object):
+    """
+        Collect the fields of an operation and write them as a single message once the operation ends.
+        The values are formatted only if the message is written, and the callable values are called only then.
+        The values of the fields named as credentials (see SECRET_KEYS) are never written.
+    """
+
+    def __init__(self, logger, name, level):
+        """
+            Initialize the record.
+            :param logger: The logger writing the record
+            :type logger: CsiLogger
+            :param name: The operation name
+            :type name: str
+            :param level: The initial level
+            :type level: Qgis.MessageLevel
+        """
+        self.logger = logger
+        self.name = name
+        self.level = level
+        self.fields = []
+
+    def add(self, key, value):
+        """
+            Add a field.
+            :param key: The field name
+            :type key: str
+            :param value: The value, or a callable returning it
+            :type value: type
+        """
+        self.fields.append((key, value))
+
+    def raise_level(self, level):
+        """
+            Raise the record level (e.g. in case the operation fails), never lowering it.
+            :param level: The level
+            :type level: Qgis.MessageLevel
+        """
+        self.level = max(self.level, level)
+
+    def is_enabled(self):
+        """
+            Check whether the record would be written with its current level.
+            :return: True in case it is written
+            :rtype: bool
+        """
+        return self.logger.is_enabled(self.level)
+
+    def emit(self):
+        """
+            Write the record, in case its level is enabled.
+        """
+        if not self.is_enabled():
+            return
+
+        fields = []
+        for key, value in self.fields:
+            if SECRET_KEYS.search(key):
+                value = REDACTED
+            elif callable(value):
+                value = value()
+            fields.append("{}={}".format(key, value))
+        self.logger.log(self.level, "{}: {}".format(self.name, "; ".join(fields)))
@@ -35,10 +35,24 @@ The content of this file is based on
 
 from PyQt5.QtWidgets import QMessageBox
 from qgis.PyQt import QtNetwork
+from qgis.PyQt.QtCore import QDateTime, QUrl, QTimer, QT_VERSION_STR, pyqtSignal
 from qgis.core import Qgis, QgsApplication
 
+from . import csi_utils
 from .. import configuration
-from .csi_certificate import CsiCertificate
+from .csi_cache_policy import CsiCachePolicyRules, TTL_ATTRIBUTE, REVALIDATION_ATTRIBUTE
+from .csi_connection_warmer import CsiConnectionWarmer
+from .csi_logger import CsiLogger
+from .csi_network_cache import CsiNetworkCache
+from .csi_network_metrics import CsiNetworkMetrics, ORIGIN_ATTRIBUTE
+from .csi_network_replies import CsiBufferedReply, CsiInflightRequest, COALESCE_ATTRIBUTE
+from .csi_offline_snapshot import CsiOfflineSnapshot
+from .csi_settings import CsiSettings
+from .csi_ssl_profile import CsiSslProfile
+from .csi_tls_sessions import CsiTlsSessions
+
+# The request attribute enabling HTTP/2, if supported by the Qt version
+HTTP2_ALLOWED_ATTRIBUTE = getattr(QtNetwork.QNetworkRequest, "Http2AllowedAttribute", None)
 
 
 class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
@@ -47,20 +61,88 @@ class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
         The methods override are for debug purposes.
     """
 
-    def __init__(self, old_manager, debug=False):
+    # Emitted with the new state when the offline mode is switched
+    offline_changed = pyqtSignal(bool)
+
+    def __init__(self, old_manager, debug=False, cache=None):
         """
             Wrap the NetworkAccessManager given in the 'old_manager'
             :param old_manager: The NetworkAccessManager to wrap
             :type old_manager: QNetworkAccessManager
             :param debug: True for processing debug information
             :type debug: bool
+            :param cache: The cache to use instead of the one of the 'old_manager'
+            :type cache: QAbstractNetworkCache
         """
         super().__init__()
         self.debug = debug
-        self.experiment = False
+        self.settings = CsiSettings.instance()
+        self.logger = CsiLogger(configuration.NETWORK_LOGGER_TAG)
+
+        # The client certificate attached to the requests, if enabled
+        self.ssl_profile = None
+        if self.settings.value("CSIAtlanteWI/ssl_client_certificate",
+                               default=configuration.SSL_CLIENT_CERTIFICATE, value_type=bool):
+            self.ssl_profile = CsiSslProfile(self)
+
+        # The collector of the requests timings and sizes, if enabled
+        self.metrics = None
+        if self.settings.value("CSIAtlanteWI/network_metrics", default=configuration.NETWORK_METRICS, value_type=bool):
+            self.metrics = CsiNetworkMetrics(self.settings.value(
+                "CSIAtlanteWI/network_metrics_size", default=configuration.NETWORK_METRICS_SIZE, value_type=int), self)
+
+        # The cache policy rules and the URLs being revalidated in background
+        self.cache_policy_rules = CsiCachePolicyRules()
+        self.revalidating_urls = set()
+
+        # The GET requests in flight, shared by the identical requests arriving meanwhile
+        self.coalesce_requests = self.settings.value(
+            "CSIAtlanteWI/coalesce_requests", default=configuration.COALESCE_REQUESTS, value_type=bool)
+        self.coalesce_max_size = self.settings.value(
+            "CSIAtlanteWI/coalesce_max_size", default=configuration.COALESCE_MAX_SIZE, value_type=int)
+        self.inflight_requests = {}
+
+        # The TLS sessions and the warm connections to the backend
+        url_plugin = self.settings.value("CSIAtlanteWI/url_plugin", default=configuration.ATLANTEWI_URL, value_type=str)
+        tls_sessions_file_path = None
+        if self.settings.value("CSIAtlanteWI/tls_session_persistence",
+                               default=configuration.TLS_SESSION_PERSISTENCE, value_type=bool):
+            tls_sessions_file_path = csi_utils.get_plugin_data_dir("tls_sessions.json")
+        self.tls_sessions = CsiTlsSessions([QUrl(url_plugin).host()], tls_sessions_file_path, self)
+        self.connection_warmer = CsiConnectionWarmer(
+            self, [url_plugin],
+            self.settings.value("CSIAtlanteWI/keep_alive_interval",
+                                default=configuration.KEEP_ALIVE_INTERVAL, value_type=int),
+            self.settings.value("CSIAtlanteWI/keep_alive_idle_limit",
+                                default=configuration.KEEP_ALIVE_IDLE_LIMIT, value_type=int),
+            self.settings.value("CSIAtlanteWI/keep_alive_url", default=configuration.KEEP_ALIVE_URL, value_type=str),
+            self)
+
+        # The snapshot of the backend responses, used in the offline mode
+        self.offline = self.settings.value("CSIAtlanteWI/offline_mode",
+                                           default=configuration.OFFLINE_MODE, value_type=bool)
+        self.offline_snapshot = None
+        if self.settings.value("CSIAtlanteWI/offline_snapshot",
+                               default=configuration.OFFLINE_SNAPSHOT, value_type=bool):
+            self.offline_snapshot = CsiOfflineSnapshot(
+                csi_utils.get_plugin_data_dir("offline"), url_plugin,
+                self.settings.value("CSIAtlanteWI/offline_snapshot_max_entry_size",
+                                    default=configuration.OFFLINE_SNAPSHOT_MAX_ENTRY_SIZE, value_type=int),
+                self.settings.value("CSIAtlanteWI/offline_snapshot_max_size",
+                                    default=configuration.OFFLINE_SNAPSHOT_MAX_SIZE, value_type=int),
+                self.settings.value("CSIAtlanteWI/offline_snapshot_ignored_parameters",
+                                    default=configuration.OFFLINE_SNAPSHOT_IGNORED_PARAMETERS,
+                                    value_type=str).split(","), self)
+
+        # HTTP/2, if enabled and supported by the Qt version (i.e. from Qt 5.8)
+        self.http2 = self.settings.value("CSIAtlanteWI/http2", default=configuration.HTTP2, value_type=bool)
+        if self.http2 and HTTP2_ALLOWED_ATTRIBUTE is None:
+            QgsApplication.messageLog().logMessage('HTTP/2 non supportato dalla versione Qt {}'.format(QT_VERSION_STR),
+                                                   tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+            self.http2 = False
 
         # Setting the same objects of the given 'old_manager'
-        self.setCache(old_manager.cache())
+        self.setCache(cache if cache is not None else old_manager.cache())
         self.setCookieJar(old_manager.cookieJar())
         self.setProxy(old_manager.proxy())
         self.setProxyFactory(old_manager.proxyFactory())
@@ -68,6 +150,35 @@ class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
         # Connecting slots
         self.finished.connect(self.slot_on_finished_handler)
         self.sslErrors.connect(self.slot_ssl_errors_handler)
+        self.encrypted.connect(self.slot_encrypted_handler)
+
+    @classmethod
+    def build(cls, old_manager, debug=False):
+        """
+            Create the manager wrapping the given one, with the plugin owned cache if enabled in the settings.
+            :param old_manager: The NetworkAccessManager to wrap
+            :type old_manager: QNetworkAccessManager
+            :param debug: True for processing debug information
+            :type debug: bool
+            :return: The manager
+            :rtype: CsiNetworkAccessManager
+        """
+        # Getting the configuration for the plugin owned cache, otherwise the cache of the wrapped
+        # NetworkAccessManager is used
+        settings = CsiSettings.instance()
+        network_cache = None
+        if settings.value("CSIAtlanteWI/use_plugin_cache", default=True, value_type=bool):
+            network_cache = CsiNetworkCache(
+                settings.value("CSIAtlanteWI/cache_dir", default=csi_utils.get_plugin_data_dir("cache"),
+                               value_type=str),
+                settings.value("CSIAtlanteWI/cache_size_static",
+                               default=configuration.CACHE_SIZE_STATIC, value_type=int),
+                settings.value("CSIAtlanteWI/cache_size_data",
+                               default=configuration.CACHE_SIZE_DATA, value_type=int))
+            QgsApplication.messageLog().logMessage('network cache: {}'.format(network_cache.get_statistics()),
+                                                   tag=configuration.LOGGER_TAG, level=Qgis.Info)
+
+        return cls(old_manager, debug, network_cache)
 
     def createRequest(self, operation, original_request, outgoing_data):
         """
@@ -81,74 +192,283 @@ class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
             :return: The reply in the open state
             :rtype: QNetworkReply
         """
-        # Invoking the original method
-        if not self.experiment:
-            reply = super().createRequest(operation, original_request, outgoing_data)
-            return reply
+        # Applying the cache policy rules
+        if operation == QtNetwork.QNetworkAccessManager.GetOperation:
+            original_request = self.apply_cache_policy(original_request)
 
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('createRequest: overrided', tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-
-        # 28 March 2019
-        certificate = CsiCertificate()
-        qba_cert = certificate.get_certificate()
-        qba_key = certificate.get_key()
-        qgs_logger.logMessage('_createRequest: csi cert {}'.format(qba_cert.__class__.__name__),
-                              tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-        ssl_conf = original_request.sslConfiguration()
-        ca_cert_list = ssl_conf.caCertificates()
-        qgs_logger.logMessage('_createRequest: ca_cert_list {}'.format(ca_cert_list.__class__.__name__),
-                              tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-        for ca in ca_cert_list:
-            qgs_logger.logMessage('_createRequest: ca {}'.format(ca.__class__.__name__),
-                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-
-        ca_cert = QtNetwork.QSslCertificate.fromData(qba_cert, QtNetwork.QSsl.Pem)
-        ca_cert_list.append(ca_cert)
-
-        ssl_key = QtNetwork.QSslKey(qba_key, QtNetwork.QSsl.Rsa)
-        ssl_cert = QtNetwork.QSslCertificate(qba_cert)
-        ssl_conf.setLocalCertificate(ssl_cert)
-        ssl_conf.setPrivateKey(ssl_key)
-        ssl_conf.setProtocol(QtNetwork.QSsl.AnyProtocol)
-        original_request.setSslConfiguration(ssl_conf)
+        # Attaching the client certificate, if enabled, the TLS session to resume and the HTTP/2 negotiation
+        original_request = self.apply_ssl(original_request)
+        self.connection_warmer.notify_request(original_request)
 
         # Following is useful for testing issues on HTTPS and WMS Basic auth:
         if self.debug:
-            qgs_logger.logMessage('createRequest: operation {}'.format(str(operation)),
-                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            qgs_logger.logMessage('createRequest: request {}'.format(original_request),
-                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            if outgoing_data is not None:
-                qgs_logger.logMessage('createRequest: data {}'.format(str(outgoing_data)),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            if outgoing_data and hasattr(outgoing_data, 'bytesAvailable'):
-                qgs_logger.logMessage('createRequest: data size {}'.format(str(outgoing_data.bytesAvailable())),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-
-            # Logging URL data
-            url = original_request.url()
-            qgs_logger.logMessage('createRequest: url {}'.format(url),
-                                  configuration=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            if hasattr(url, 'encodedPath'):
-                qgs_logger.logMessage('createRequest: encoded query items {}'.format(url.encodedPath()),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            if hasattr(url, 'encodedQuery'):
-                qgs_logger.logMessage('_createRequest: encoded query items {}'.format(url.encodedQuery()),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            if hasattr(url, 'encodedQueryItems'):
-                qgs_logger.logMessage('_createRequest: encoded query items {}'.format(url.encodedQueryItems()),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            if hasattr(url, 'queryItems'):
-                qgs_logger.logMessage('_createRequest: queryItems? {}'.format(url.queryItems()),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
-            qgs_logger.logMessage('_createRequest: headers {}'.format(original_request.rawHeaderList()),
-                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
+            self.log_request(operation, original_request, outgoing_data)
 
         # Generating the request
-        reply = super().createRequest(operation, original_request, outgoing_data)
+        return self.send_request(operation, original_request, outgoing_data)
+
+    def apply_ssl(self, request):
+        """
+            Apply to the request the client certificate, if enabled, the TLS session to resume, if any, and the
+            HTTP/2 negotiation, if enabled.
+            :param request: The request
+            :type request: QNetworkRequest
+            :return: The request to send
+            :rtype: QNetworkRequest
+        """
+        if self.ssl_profile is not None:
+            request = self.ssl_profile.apply(request)
+
+        request = self.tls_sessions.apply(request)
+
+        # HTTP/2 is negotiated during the TLS handshake: the servers not supporting it keep answering with HTTP/1.1.
+        # The compression is negotiated by Qt, which asks for gzip and deflate and decodes the responses
+        # transparently, unless the request sets its own Accept-Encoding header (e.g. for brotli, which Qt 5 cannot
+        # decode)
+        if self.http2 and request.url().scheme().lower() == "https":
+            request = QtNetwork.QNetworkRequest(request)
+            request.setAttribute(HTTP2_ALLOWED_ATTRIBUTE, True)
+
+        return request
+
+    def pre_connect(self):
+        """
+            Open in background the connections to the backend, before the first request.
+        """
+        self.connection_warmer.pre_connect()
+
+    def send_request(self, operation, request, outgoing_data):
+        """
+            Send the request, sharing the reply of an identical GET request already in flight, if any.
+            The network reply of a GET request which can be shared is read by the request in flight, which passes the
+            data to the reply of each identical request: the first one included, so that a single network request
+            serves them all. The data is kept by each reply until it is read, and by the request in flight, for the
+            identical requests arriving late, only within 'coalesce_max_size' bytes.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :param outgoing_data: The outgoing data
+            :type outgoing_data: QIODevice
+            :return: The reply in the open state
+            :rtype: QNetworkReply
+        """
+        # Offline, the backend requests are answered from the snapshot, or from the network cache for the other
+        # resources of the catalog page (e.g. scripts and images)
+        if self.offline and self.offline_snapshot is not None and \
+                self.offline_snapshot.is_backend_url(request.url()):
+            if operation != QtNetwork.QNetworkAccessManager.GetOperation or \
+                    self.offline_snapshot.contains(request.url().toString()):
+                return self.create_offline_reply(operation, request)
+            request = QtNetwork.QNetworkRequest(request)
+            request.setAttribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute,
+                                 QtNetwork.QNetworkRequest.AlwaysCache)
+
+        key = self.get_coalescing_key(operation, request, outgoing_data)
+        inflight_request = self.inflight_requests.get(key) if self.coalesce_requests else None
+        if inflight_request is not None and inflight_request.is_shared():
+            if self.metrics is not None:
+                self.metrics.coalesced_requests += 1
+            return inflight_request.attach(operation, request)
+
+        reply = super().createRequest(operation, request, outgoing_data)
+        if self.metrics is not None:
+            self.metrics.track(reply, operation, request, outgoing_data)
+        if key is None:
+            return reply
+
+        # The responses stored in the offline snapshot (i.e. the catalog page and its JSON data only) are collected
+        # through the buffer of the request in flight
+        capture = self.offline_snapshot is not None and self.offline_snapshot.accepts(operation, request)
+        if not (self.coalesce_requests or capture):
+            return reply
+
+        max_size = self.coalesce_max_size
+        if capture:
+            max_size = max(max_size, self.offline_snapshot.max_entry_size)
+        inflight_request = CsiInflightRequest(key, reply, max_size, self)
+        inflight_request.completed.connect(self.slot_inflight_request_completed)
+        if self.coalesce_requests:
+            self.inflight_requests[key] = inflight_request
+        return inflight_request.attach(operation, request)
+
+    def get_coalescing_key(self, operation, request, outgoing_data):
+        """
+            Retrieve the key identifying the requests which can share the same reply.
+            Only the GET requests without a body and not for a range of the content can be shared.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :param outgoing_data: The outgoing data
+            :type outgoing_data: QIODevice
+            :return: The key, None if the request cannot be shared
+            :rtype: tuple
+        """
+        if operation != QtNetwork.QNetworkAccessManager.GetOperation:
+            return None
+        if outgoing_data is not None or request.hasRawHeader(b"Range"):
+            return None
+        if request.attribute(COALESCE_ATTRIBUTE) is False:
+            return None
+
+        headers = tuple(sorted((bytes(name), bytes(request.rawHeader(name))) for name in request.rawHeaderList()))
+        load_control = request.attribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute,
+                                         QtNetwork.QNetworkRequest.PreferNetwork)
+        return request.url().toString(), headers, int(load_control)
+
+    def slot_inflight_request_completed(self, inflight_request):
+        """
+            Forget the completed request, so that the next identical requests are sent again, and store its
+            response in the offline snapshot, if required.
+            :param inflight_request: The completed request
+            :type inflight_request: CsiInflightRequest
+        """
+        if self.inflight_requests.get(inflight_request.key) is inflight_request:
+            del self.inflight_requests[inflight_request.key]
+
+        reply = inflight_request.reply
+        if inflight_request.content is not None and self.offline_snapshot is not None \
+                and self.offline_snapshot.accepts(reply.operation(), reply.request()) \
+                and reply.error() == QtNetwork.QNetworkReply.NoError \
+                and reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute) == 200:
+            self.offline_snapshot.store(reply.url().toString(), reply.rawHeaderPairs(), bytes(inflight_request.content))
+
+    def set_offline(self, offline):
+        """
+            Switch the offline mode, in which the backend requests are answered from the snapshot.
+            :param offline: True for the offline mode
+            :type offline: bool
+        """
+        if offline == self.offline:
+            return
+
+        QgsApplication.messageLog().logMessage('modalita\' offline: {}'.format(offline),
+                                               tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+        self.offline = offline
+        self.offline_changed.emit(offline)
+
+    def create_offline_reply(self, operation, request):
+        """
+            Create the reply answering the request from the offline snapshot.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :return: The reply in the open state
+            :rtype: QNetworkReply
+        """
+        response = None
+        if operation == QtNetwork.QNetworkAccessManager.GetOperation:
+            response = self.offline_snapshot.load(request.url().toString())
+
+        reply = CsiBufferedReply(operation, request, self)
+        # The reply is completed asynchronously, as for a network reply
+        QTimer.singleShot(0, lambda: self.answer_offline_reply(reply, response))
         return reply
 
+    @staticmethod
+    def answer_offline_reply(reply, response):
+        """
+            Complete the reply with the response from the offline snapshot.
+            :param reply: The reply
+            :type reply: CsiBufferedReply
+            :param response: The headers and the body of the response, None if not available
+            :type response: tuple
+        """
+        if response is None:
+            reply.finish(QtNetwork.QNetworkReply.ContentNotFoundError,
+                         "Risorsa non disponibile in modalita' offline: {}".format(reply.url().toString()))
+            return
+
+        raw_headers, content = response
+        reply.set_meta_data(raw_headers, {QtNetwork.QNetworkRequest.HttpStatusCodeAttribute: 200,
+                                          QtNetwork.QNetworkRequest.HttpReasonPhraseAttribute: b"OK",
+                                          QtNetwork.QNetworkRequest.SourceIsFromCacheAttribute: True})
+        reply.append_data(content)
+        reply.finish()
+
+    def log_request(self, operation, original_request, outgoing_data):
+        """
+            Log the request details, for debug purposes.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param original_request: The request
+            :type original_request: QNetworkRequest
+            :param outgoing_data: The outgoing data
+            :type outgoing_data: QIODevice
+        """
+        record = self.logger.operation("createRequest")
+        record.add("operation", operation)
+        record.add("url", lambda: original_request.url().toString())
+        if outgoing_data is not None:
+            record.add("data", outgoing_data)
+            if hasattr(outgoing_data, 'bytesAvailable'):
+                record.add("data size", outgoing_data.bytesAvailable)
+        record.add("headers", lambda: [bytes(header).decode("latin-1") for header in original_request.rawHeaderList()])
+        record.emit()
+
+    def apply_cache_policy(self, original_request):
+        """
+            Apply to the request the cache policy of the rule matching its URL, if any.
+            :param original_request: The request
+            :type original_request: QNetworkRequest
+            :return: The request to send
+            :rtype: QNetworkRequest
+        """
+        if original_request.attribute(REVALIDATION_ATTRIBUTE):
+            return original_request
+
+        url = original_request.url()
+        rule = self.cache_policy_rules.get_rule(url.toString())
+        if rule is None or self.cache() is None:
+            return original_request
+
+        load_control, revalidate = rule.get_load_control(self.cache().metaData(url))
+        request = QtNetwork.QNetworkRequest(original_request)
+        request.setAttribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute, load_control)
+        # The expiration is renewed only by the responses coming from (or confirmed by) the server
+        network_load_controls = (QtNetwork.QNetworkRequest.PreferNetwork, QtNetwork.QNetworkRequest.AlwaysNetwork)
+        if rule.ttl > 0 and load_control in network_load_controls:
+            request.setAttribute(TTL_ATTRIBUTE, rule.ttl)
+
+        if revalidate:
+            self.revalidate(url, rule.ttl)
+
+        return request
+
+    def revalidate(self, url, ttl):
+        """
+            Refresh in background the cached response for the URL.
+            :param url: The URL
+            :type url: QUrl
+            :param ttl: The seconds the refreshed response is kept fresh, 0 for keeping the server expiration
+            :type ttl: int
+        """
+        if url.toString() in self.revalidating_urls:
+            return
+
+        self.revalidating_urls.add(url.toString())
+        request = QtNetwork.QNetworkRequest(url)
+        request.setAttribute(REVALIDATION_ATTRIBUTE, True)
+        request.setAttribute(ORIGIN_ATTRIBUTE, "revalidation")
+        request.setAttribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute,
+                             QtNetwork.QNetworkRequest.PreferNetwork)
+        if ttl > 0:
+            request.setAttribute(TTL_ATTRIBUTE, ttl)
+
+        reply = self.get(request)
+        reply.finished.connect(lambda: self.revalidating_urls.discard(url.toString()))
+        reply.finished.connect(reply.deleteLater)
+
+    def slot_encrypted_handler(self, reply):
+        """
+            Handler for the completed TLS handshakes: store the negotiated session for the next connections.
+            :param reply: The reply which opened the connection
+            :type reply: QNetworkReply
+        """
+        self.tls_sessions.update(reply)
+
     def slot_ssl_errors_handler(self, reply, errors):
         """
             Handler for the arisen SSL errors, usually encountered during set-up.
@@ -158,63 +478,26 @@ class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
             :param errors: The list of errors
             :type errors: QList of QSslError
         """
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('slot_ssl_errors_handler: connected', tag=configuration.NETWORK_LOGGER_TAG,
-                              level=Qgis.Info)
-        url = reply.url().toString()
-        qgs_logger.logMessage('slot_ssl_errors_handler: ignoreSslErrors() {}'.format(url),
-                              tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-
-        # The list of the fields identifiers to print (i.e. from 0 to 5 included)
-        certificate_fields_list = range(0, 6)
+        # The errors are collected in a single record
+        record = self.logger.operation("slot_ssl_errors_handler", Qgis.Critical)
+        record.add("url", lambda: reply.url().toString())
 
         # Processing the errors
         errors_messages = []
         for e in errors:
-            # Logging the error data
-            qgs_logger.logMessage('slot_ssl_errors_handler: e {}'.format(e.__class__.__name__),
-                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Critical)
-            qgs_logger.logMessage('slot_ssl_errors_handler: errorString {}'.format(e.errorString()),
-                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Critical)
-            if len(errors_messages) > 0:
-                errors_messages.append("\n")
-
             errors_messages.append(e.errorString())
+            record.add("error", e.errorString())
 
             # In case the debug flag is enabled, log additional details
             if self.debug:
-                # Logging the certificate
-                certificate = e.certificate()
-                qgs_logger.logMessage('slot_ssl_errors_handler: certificate {}'.format(certificate),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-
-                # Printing the certificate 'data' for subjectInfo and issuerInfo fields
-                for i in certificate_fields_list:
-                    qgs_logger.logMessage('slot_ssl_errors_handler: subjectInfo[{}] {}'
-                                          .format(i, certificate.subjectInfo(i)), tag=configuration.NETWORK_LOGGER_TAG,
-                                          level=Qgis.Warning)
-                    qgs_logger.logMessage('slot_ssl_errors_handler: issuerInfo[{}] {}'
-                                          .format(i, certificate.issuerInfo(i)), tag=configuration.NETWORK_LOGGER_TAG,
-                                          level=Qgis.Warning)
-
-                # Printing other certificate 'data'
-                qgs_logger.logMessage('slot_ssl_errors_handler: version {}'.format(certificate.version()),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-                qgs_logger.logMessage('slot_ssl_errors_handler: effectiveDate {}'
-                                      .format(certificate.effectiveDate().toString("dd.MM.yyyy hh:mm:ss.zzz")),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-                expiration_date = certificate.expiryDate().toString("dd.MM.yyyy hh:mm:ss.zzz")
-                qgs_logger.logMessage('slot_ssl_errors_handler: expiryDate {}'.format(expiration_date),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
-                public_key = certificate.publicKey()
-                qgs_logger.logMessage('slot_ssl_errors_handler: publicKey {}'.format(public_key),
-                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+                record.add("certificate", lambda certificate=e.certificate(): self.describe_certificate(certificate))
+        record.emit()
 
         # Letting the user decide to proceed
         message = "Si sta cercando di connettersi ad un indirizzo in HTTPs, ma sono sorti dei problemi. "
         if len(errors_messages) > 0:
             message += "Riscontrati i seguenti errori:\n\n"
-            message += "".join(errors_messages)
+            message += "\n".join(errors_messages)
         else:
             message += "Probabilmente problema di certificato SSL."
         message += "\n\nProcedere comunque?"
@@ -224,6 +507,23 @@ class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
 
         reply.ignoreSslErrors()
 
+    @staticmethod
+    def describe_certificate(certificate):
+        """
+            Describe the certificate data, for debug purposes.
+            :param certificate: The certificate
+            :type certificate: QSslCertificate
+            :return: The description
+            :rtype: str
+        """
+        # The subjectInfo and issuerInfo fields identifiers to describe (i.e. from 0 to 5 included)
+        certificate_fields_list = range(0, 6)
+        return "subjectInfo {} issuerInfo {} version {} effectiveDate {} expiryDate {} publicKey {}".format(
+            [certificate.subjectInfo(i) for i in certificate_fields_list],
+            [certificate.issuerInfo(i) for i in certificate_fields_list], certificate.version(),
+            certificate.effectiveDate().toString("dd.MM.yyyy hh:mm:ss.zzz"),
+            certificate.expiryDate().toString("dd.MM.yyyy hh:mm:ss.zzz"), certificate.publicKey())
+
     def slot_on_finished_handler(self, reply):
         """
             QNetworkAccessManager has an asynchronous API.
@@ -247,6 +547,14 @@ class CsiNetworkAccessManager(QtNetwork.QNetworkAccessManager):
                                   tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Critical)
             return
 
+        # Keeping the response fresh in cache for the TTL of its rule
+        ttl = reply.request().attribute(TTL_ATTRIBUTE)
+        if ttl and self.cache() is not None:
+            meta_data = self.cache().metaData(reply.url())
+            if meta_data.isValid():
+                meta_data.setExpirationDate(QDateTime.currentDateTimeUtc().addSecs(ttl))
+                self.cache().updateMetaData(meta_data)
+
         # In case the reply doesn't have any error
         if self.debug:
             from_cache = reply.attribute(QtNetwork.QNetworkRequest.SourceIsFromCacheAttribute)
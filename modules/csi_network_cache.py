@@ -0,0 +1,199 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+from qgis.PyQt import QtNetwork
+
+
+class CsiNetworkCache(QtNetwork.QAbstractNetworkCache):
+    """
+        The persistent HTTP cache of the AtlanteWI web interface, owned by the plugin.
+        The responses are stored in two QNetworkDiskCache with separate quotas: one for the static assets of the web
+        interface (HTML, Javascript, CSS, images, fonts) and one for the catalog data (JSON and XML), so that the
+        catalog data can't evict the assets, and vice versa.
+    """
+
+    STATIC = "static"
+    DATA = "data"
+
+    def __init__(self, cache_dir, static_max_size, data_max_size, parent=None):
+        """
+            Initialize the caches in the sub-directories of the given directory.
+            :param cache_dir: The cache directory
+            :type cache_dir: str
+            :param static_max_size: The maximum size in bytes for the static assets
+            :type static_max_size: int
+            :param data_max_size: The maximum size in bytes for the catalog data
+            :type data_max_size: int
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiNetworkCache, self).__init__(parent)
+        self.caches = {}
+        for name, max_size in ((self.STATIC, static_max_size), (self.DATA, data_max_size)):
+            cache = QtNetwork.QNetworkDiskCache(self)
+            cache.setCacheDirectory(os.path.join(cache_dir, name))
+            cache.setMaximumCacheSize(max_size)
+            self.caches[name] = cache
+
+        # The devices returned by 'prepare', waiting to be inserted in their cache
+        self.pending = {}
+        self.hits = 0
+        self.misses = 0
+
+    def get_cache_name(self, meta_data):
+        """
+            Choose the cache for the response described by the given meta data.
+            :param meta_data: The response meta data
+            :type meta_data: QNetworkCacheMetaData
+            :return: The cache name
+            :rtype: str
+        """
+        for header, value in meta_data.rawHeaders():
+            if bytes(header).lower() != b"content-type":
+                continue
+
+            content_type = bytes(value).decode("latin-1").lower()
+            if "json" in content_type or ("xml" in content_type and "html" not in content_type):
+                return self.DATA
+
+        return self.STATIC
+
+    def find_cache(self, url):
+        """
+            Retrieve the cache storing the given URL.
+            :param url: The URL
+            :type url: QUrl
+            :return: The cache or None
+            :rtype: QNetworkDiskCache
+        """
+        for cache in self.caches.values():
+            if cache.metaData(url).isValid():
+                return cache
+
+        return None
+
+    def metaData(self, url):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#metaData
+        """
+        cache = self.find_cache(url)
+        if cache is None:
+            self.misses += 1
+            return QtNetwork.QNetworkCacheMetaData()
+
+        return cache.metaData(url)
+
+    def updateMetaData(self, meta_data):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#updateMetaData
+        """
+        cache = self.find_cache(meta_data.url())
+        if cache is not None:
+            cache.updateMetaData(meta_data)
+
+    def data(self, url):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#data
+        """
+        cache = self.find_cache(url)
+        if cache is None:
+            return None
+
+        self.hits += 1
+        return cache.data(url)
+
+    def remove(self, url):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#remove
+        """
+        # Discarding the devices prepared for the URL, deleted by the cache
+        self.pending = {device: (cache, pending_url) for device, (cache, pending_url) in self.pending.items()
+                        if pending_url != url}
+
+        removed = False
+        for cache in self.caches.values():
+            removed = cache.remove(url) or removed
+
+        return removed
+
+    def cacheSize(self):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#cacheSize
+        """
+        return sum(cache.cacheSize() for cache in self.caches.values())
+
+    def prepare(self, meta_data):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#prepare
+        """
+        cache = self.caches[self.get_cache_name(meta_data)]
+        device = cache.prepare(meta_data)
+        if device is not None:
+            self.pending[device] = (cache, meta_data.url())
+
+        return device
+
+    def insert(self, device):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#insert
+        """
+        cache, _ = self.pending.pop(device, (None, None))
+        if cache is not None:
+            cache.insert(device)
+
+    def clear(self):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qabstractnetworkcache.html#clear
+        """
+        self.pending.clear()
+        for cache in self.caches.values():
+            cache.clear()
+
+    def get_statistics(self):
+        """
+            Retrieve the cache statistics.
+            :return: The directory, the size and the maximum size of each cache, together with the hits and misses
+            :rtype: dict
+        """
+        statistics = {"hits": self.hits, "misses": self.misses}
+        for name, cache in self.caches.items():
+            statistics[name] = {
+                "directory": cache.cacheDirectory(),
+                "size": cache.cacheSize(),
+                "max_size": cache.maximumCacheSize()
+            }
+
+        return statistics
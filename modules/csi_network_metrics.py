@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import csv
+import json
+import time
+import codecs
+import collections
+from qgis.PyQt import QtCore, QtNetwork
+
+# The request attribute storing the name of the operation (e.g. the Javascript slot) which originated the request
+ORIGIN_ATTRIBUTE = QtNetwork.QNetworkRequest.User
+
+# The request attribute excluding the request from the metrics (e.g. the keep-alive requests)
+UNTRACKED_ATTRIBUTE = QtNetwork.QNetworkRequest.Attribute(QtNetwork.QNetworkRequest.User + 4)
+
+# The fields of each record, in the exported order. Qt doesn't expose the DNS lookup and TCP connection times, which
+# are reported empty. The 'tls_session' is "handshake" for the replies opening a new encrypted connection, "reused"
+# for the ones sent on an already open connection: Qt doesn't tell whether a handshake resumed a previous session,
+# whose savings show in the 'tls_ms' only. The 'bytes_in' are the decoded bytes, while the
+# 'bytes_wire' are the transferred ones according to the Content-Length of the compressed responses
+FIELDS = ["started", "origin", "operation", "url", "status", "error", "from_cache", "bytes_out", "bytes_in",
+          "bytes_wire", "content_encoding", "http2", "dns_ms", "connect_ms", "tls_ms", "tls_session", "ttfb_ms",
+          "total_ms"]
+
+# The reply attribute telling whether the response was received through HTTP/2, if supported by the Qt version
+HTTP2_WAS_USED_ATTRIBUTE = getattr(QtNetwork.QNetworkRequest, "Http2WasUsedAttribute", None)
+
+OPERATIONS = {
+    QtNetwork.QNetworkAccessManager.HeadOperation: "HEAD",
+    QtNetwork.QNetworkAccessManager.GetOperation: "GET",
+    QtNetwork.QNetworkAccessManager.PutOperation: "PUT",
+    QtNetwork.QNetworkAccessManager.PostOperation: "POST",
+    QtNetwork.QNetworkAccessManager.DeleteOperation: "DELETE",
+    QtNetwork.QNetworkAccessManager.CustomOperation: "CUSTOM"
+}
+
+
+class CsiNetworkMetrics(QtCore.QObject):
+    """
+        Collects the timings and the sizes of the requests sent through the CsiNetworkAccessManager.
+        The records of the completed requests are kept in a ring buffer holding the most recent 'capacity' ones.
+    """
+
+    def __init__(self, capacity, parent=None):
+        """
+            Initialize the collector.
+            :param capacity: The maximum number of records kept
+            :type capacity: int
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiNetworkMetrics, self).__init__(parent)
+        self.records = collections.deque(maxlen=capacity)
+        # The requests served by sharing the reply of an identical request in flight
+        self.coalesced_requests = 0
+
+    def track(self, reply, operation, request, outgoing_data):
+        """
+            Start collecting the metrics of the given reply.
+            :param reply: The reply just created
+            :type reply: QNetworkReply
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :param outgoing_data: The outgoing data
+            :type outgoing_data: QIODevice
+        """
+        if request.attribute(UNTRACKED_ATTRIBUTE):
+            return
+
+        origin = request.attribute(ORIGIN_ATTRIBUTE)
+        record = {field: None for field in FIELDS}
+        record.update({
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "origin": origin if origin else "webview",
+            "operation": OPERATIONS.get(operation, str(operation)),
+            "url": request.url().toString(),
+            "bytes_out": outgoing_data.size() if outgoing_data is not None else 0,
+            "bytes_in": 0
+        })
+
+        # The tracker is a child of the reply, so it is released together with it
+        CsiRequestMetrics(reply, record, self.records)
+
+    def get_summary(self):
+        """
+            Aggregate the collected records.
+            :return: The number of requests, the cache hits, the errors, the received bytes, the average total time,
+            the number of coalesced requests, the TLS connections counts, the number of HTTP/2 and compressed
+            responses and the bytes saved by the compression
+            :rtype: dict
+        """
+        count = len(self.records)
+        total_ms = [r["total_ms"] for r in self.records if r["total_ms"] is not None]
+        return {
+            "requests": count,
+            "cache_hits": sum(1 for r in self.records if r["from_cache"]),
+            "errors": sum(1 for r in self.records if r["error"]),
+            "bytes_in": sum(r["bytes_in"] for r in self.records),
+            "avg_total_ms": round(sum(total_ms) / len(total_ms), 1) if total_ms else None,
+            "coalesced_requests": self.coalesced_requests,
+            "tls_handshakes": sum(1 for r in self.records if r["tls_session"] == "handshake"),
+            "tls_reused_connections": sum(1 for r in self.records if r["tls_session"] == "reused"),
+            "http2_requests": sum(1 for r in self.records if r["http2"]),
+            "compressed_responses": sum(1 for r in self.records if r["content_encoding"]),
+            "bytes_saved": sum(r["bytes_in"] - r["bytes_wire"] for r in self.records
+                               if r["content_encoding"] and r["bytes_wire"] is not None)
+        }
+
+    def export_csv(self, file_path):
+        """
+            Export the collected records to a CSV file.
+            :param file_path: The CSV file path
+            :type file_path: str
+        """
+        with codecs.open(file_path, "w", "utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=FIELDS, lineterminator="\n")
+            writer.writeheader()
+            writer.writerows(self.records)
+
+    def export_json(self, file_path):
+        """
+            Export the summary and the collected records to a JSON file.
+            :param file_path: The JSON file path
+            :type file_path: str
+        """
+        with codecs.open(file_path, "w", "utf-8") as f:
+            json.dump({"summary": self.get_summary(), "requests": list(self.records)}, f, indent=2)
+
+    def clear(self):
+        """
+            Remove the collected records.
+        """
+        self.records.clear()
+        self.coalesced_requests = 0
+
+
+class CsiRequestMetrics(QtCore.QObject):
+    """
+        Measures a single reply and appends its record to the ring buffer once finished.
+    """
+
+    def __init__(self, reply, record, records):
+        """
+            Start measuring the reply.
+            :param reply: The reply to measure, which becomes the parent of the object
+            :type reply: QNetworkReply
+            :param record: The record to fill
+            :type record: dict
+            :param records: The ring buffer of the completed records
+            :type records: collections.deque
+        """
+        super(CsiRequestMetrics, self).__init__(reply)
+        self.reply = reply
+        self.record = record
+        self.records = records
+        self.timer = QtCore.QElapsedTimer()
+        self.timer.start()
+
+        reply.encrypted.connect(self.slot_encrypted)
+        reply.metaDataChanged.connect(self.slot_meta_data_changed)
+        reply.uploadProgress.connect(self.slot_upload_progress)
+        reply.downloadProgress.connect(self.slot_download_progress)
+        reply.finished.connect(self.slot_finished)
+
+    def slot_encrypted(self):
+        """
+            The TLS handshake completed.
+        """
+        self.record["tls_ms"] = self.timer.elapsed()
+
+    def slot_meta_data_changed(self):
+        """
+            The response headers arrived (i.e. time to first byte).
+        """
+        if self.record["ttfb_ms"] is None:
+            self.record["ttfb_ms"] = self.timer.elapsed()
+
+    def slot_upload_progress(self, bytes_sent, bytes_total):
+        """
+            Track the sent bytes.
+        """
+        self.record["bytes_out"] = max(self.record["bytes_out"], bytes_sent)
+
+    def slot_download_progress(self, bytes_received, bytes_total):
+        """
+            Track the received bytes.
+        """
+        self.record["bytes_in"] = max(self.record["bytes_in"], bytes_received)
+
+    def slot_finished(self):
+        """
+            Complete the record and append it to the ring buffer.
+        """
+        self.record["total_ms"] = self.timer.elapsed()
+        self.record["status"] = self.reply.attribute(QtNetwork.QNetworkRequest.HttpStatusCodeAttribute)
+        self.record["from_cache"] = bool(self.reply.attribute(QtNetwork.QNetworkRequest.SourceIsFromCacheAttribute))
+        if self.reply.error() != QtNetwork.QNetworkReply.NoError:
+            self.record["error"] = self.reply.errorString()
+        if HTTP2_WAS_USED_ATTRIBUTE is not None:
+            self.record["http2"] = bool(self.reply.attribute(HTTP2_WAS_USED_ATTRIBUTE))
+
+        # Qt decodes the compressed responses transparently, the transferred size is the declared one
+        self.record["bytes_wire"] = self.record["bytes_in"]
+        content_encoding = bytes(self.reply.rawHeader(b"Content-Encoding")).decode("latin-1").strip()
+        if content_encoding and content_encoding.lower() != "identity":
+            content_length = self.reply.header(QtNetwork.QNetworkRequest.ContentLengthHeader)
+            self.record["content_encoding"] = content_encoding
+            self.record["bytes_wire"] = int(content_length) if content_length is not None else None
+
+        if self.record["tls_ms"] is not None:
+            self.record["tls_session"] = "handshake"
+        elif self.reply.url().scheme().lower() == "https" and not self.record["from_cache"] \
+                and self.record["status"] is not None:
+            self.record["tls_session"] = "reused"
+
+        self.records.append(self.record)
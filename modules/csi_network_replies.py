@@ -0,0 +1,337 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+from qgis.PyQt import QtCore, QtNetwork, sip
+
+# The request attribute for excluding a request from the coalescing (e.g. the large files streamed to disk)
+COALESCE_ATTRIBUTE = QtNetwork.QNetworkRequest.Attribute(QtNetwork.QNetworkRequest.User + 3)
+
+# The reply attributes copied from the actual reply to the coalesced ones
+COPIED_ATTRIBUTES = [
+    QtNetwork.QNetworkRequest.HttpStatusCodeAttribute,
+    QtNetwork.QNetworkRequest.HttpReasonPhraseAttribute,
+    QtNetwork.QNetworkRequest.RedirectionTargetAttribute,
+    QtNetwork.QNetworkRequest.SourceIsFromCacheAttribute,
+    QtNetwork.QNetworkRequest.ConnectionEncryptedAttribute
+]
+
+# The content types of the streamed responses, which are never shared
+STREAM_CONTENT_TYPES = ("text/event-stream", "multipart/x-mixed-replace")
+
+
+class CsiBufferedReply(QtNetwork.QNetworkReply):
+    """
+        A reply whose content is provided by the plugin through 'append_data', rather than by a network connection.
+        The data is kept until it is read.
+    """
+
+    def __init__(self, operation, request, parent=None):
+        """
+            Initialize the reply for the given request.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiBufferedReply, self).__init__(parent)
+        self.setRequest(request)
+        self.setUrl(request.url())
+        self.setOperation(operation)
+        self.content = bytearray()
+        self.received = 0
+        self.open(QtCore.QIODevice.ReadOnly | QtCore.QIODevice.Unbuffered)
+
+    def set_meta_data(self, raw_headers, attributes):
+        """
+            Set the response headers and attributes, then notify them.
+            :param raw_headers: The list of (name, value) headers
+            :type raw_headers: list of tuple
+            :param attributes: The reply attributes
+            :type attributes: dict
+        """
+        for name, value in raw_headers:
+            self.setRawHeader(name, value)
+        for attribute, value in attributes.items():
+            if value is not None:
+                self.setAttribute(attribute, value)
+
+        self.metaDataChanged.emit()
+
+    def append_data(self, data):
+        """
+            Append data to the content and notify its availability.
+            :param data: The data
+            :type data: bytes
+        """
+        if len(data) == 0:
+            return
+
+        self.content.extend(data)
+        self.received += len(data)
+        self.downloadProgress.emit(self.received, -1)
+        self.readyRead.emit()
+
+    def finish(self, error=QtNetwork.QNetworkReply.NoError, error_string=""):
+        """
+            Complete the reply.
+            :param error: The error, if any
+            :type error: QNetworkReply.NetworkError
+            :param error_string: The error description
+            :type error_string: str
+        """
+        if error != QtNetwork.QNetworkReply.NoError:
+            self.setError(error, error_string)
+
+        self.downloadProgress.emit(self.received, self.received)
+        self.setFinished(True)
+        self.finished.emit()
+
+    def abort(self):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qnetworkreply.html#abort
+        """
+        if self.isFinished():
+            return
+
+        self.finish(QtNetwork.QNetworkReply.OperationCanceledError, "Operation canceled")
+
+    def isSequential(self):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qiodevice.html#isSequential
+        """
+        return True
+
+    def bytesAvailable(self):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qiodevice.html#bytesAvailable
+        """
+        return len(self.content) + super(CsiBufferedReply, self).bytesAvailable()
+
+    def readData(self, max_size):
+        """
+            Overridden method. See https://doc.qt.io/qt-5/qiodevice.html#readData
+        """
+        data = bytes(self.content[:max_size])
+        del self.content[:len(data)]
+        return data
+
+
+class CsiCoalescedReply(CsiBufferedReply):
+    """
+        A reply sharing the actual network reply of an identical request in flight.
+    """
+
+    def __init__(self, operation, request, inflight_request, parent=None):
+        """
+            Initialize the reply attached to the request in flight.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :param inflight_request: The shared request in flight
+            :type inflight_request: CsiInflightRequest
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiCoalescedReply, self).__init__(operation, request, parent)
+        self.inflight_request = inflight_request
+
+    def abort(self):
+        """
+            Overridden method: detach from the request in flight.
+        """
+        self.inflight_request.detach(self)
+        super(CsiCoalescedReply, self).abort()
+
+
+class CsiInflightRequest(QtCore.QObject):
+    """
+        A GET request in flight, whose actual reply is shared by all the identical requests arriving meanwhile.
+        The content received so far is kept for the replies attached late, up to 'max_size' bytes: a larger or
+        streamed body stops the sharing, so that the content is held only by the replies until they read it.
+    """
+
+    # Emitted with the CsiInflightRequest instance once the actual reply finished
+    completed = QtCore.pyqtSignal(object)
+
+    def __init__(self, key, reply, max_size, parent=None):
+        """
+            Start following the actual reply.
+            :param key: The key identifying the identical requests
+            :type key: tuple
+            :param reply: The actual network reply
+            :type reply: QNetworkReply
+            :param max_size: The maximum size in bytes of the shared content
+            :type max_size: int
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiInflightRequest, self).__init__(parent)
+        self.key = key
+        self.reply = reply
+        self.max_size = max_size
+        # The content received so far, None once the sharing stopped
+        self.content = bytearray()
+        self.replies = []
+        self.late_replies = []
+        self.meta_data = None
+
+        reply.metaDataChanged.connect(self.slot_meta_data_changed)
+        reply.readyRead.connect(self.slot_ready_read)
+        reply.finished.connect(self.slot_finished)
+
+    def attach(self, operation, request):
+        """
+            Create a reply for an identical request, sharing the actual one.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :return: The coalesced reply
+            :rtype: CsiCoalescedReply
+        """
+        coalesced_reply = CsiCoalescedReply(operation, request, self, self.parent())
+        self.replies.append(coalesced_reply)
+
+        # Bringing the late reply up to date, asynchronously as for a network reply
+        if self.meta_data is not None:
+            self.late_replies.append(coalesced_reply)
+            QtCore.QTimer.singleShot(0, lambda: self.replay(coalesced_reply))
+
+        return coalesced_reply
+
+    def is_shared(self):
+        """
+            Check if identical requests can still attach to the request in flight.
+            :return: True until the sharing stopped
+            :rtype: bool
+        """
+        return self.content is not None
+
+    def stop_sharing(self):
+        """
+            Stop attaching identical requests, after bringing the late replies up to date, and release the content.
+        """
+        if self.content is None:
+            return
+
+        for coalesced_reply in list(self.late_replies):
+            self.replay(coalesced_reply)
+        self.content = None
+
+    def replay(self, coalesced_reply):
+        """
+            Notify to a late reply the headers and the data received so far.
+            :param coalesced_reply: The late reply
+            :type coalesced_reply: CsiCoalescedReply
+        """
+        if coalesced_reply not in self.late_replies:
+            return
+
+        self.late_replies.remove(coalesced_reply)
+        if sip.isdeleted(coalesced_reply) or coalesced_reply not in self.replies:
+            return
+
+        coalesced_reply.set_meta_data(*self.meta_data)
+        coalesced_reply.append_data(bytes(self.content))
+
+    def detach(self, coalesced_reply):
+        """
+            Detach the reply, aborting the actual one when no reply is waiting for it anymore.
+            :param coalesced_reply: The reply to detach
+            :type coalesced_reply: CsiCoalescedReply
+        """
+        if coalesced_reply in self.replies:
+            self.replies.remove(coalesced_reply)
+
+        if len(self.get_live_replies()) == 0 and not self.reply.isFinished():
+            self.reply.abort()
+
+    def get_live_replies(self):
+        """
+            Retrieve the replies not yet deleted by their consumers.
+            :return: The replies
+            :rtype: list of CsiCoalescedReply
+        """
+        self.replies = [r for r in self.replies if not sip.isdeleted(r)]
+        return self.replies
+
+    def slot_meta_data_changed(self):
+        """
+            Forward the response headers and attributes.
+        """
+        self.meta_data = (self.reply.rawHeaderPairs(),
+                          {attribute: self.reply.attribute(attribute) for attribute in COPIED_ATTRIBUTES})
+        for coalesced_reply in self.get_live_replies():
+            coalesced_reply.set_meta_data(*self.meta_data)
+
+        # The bodies declared larger than the shared content and the streams are not shared
+        content_type = bytes(self.reply.rawHeader(b"Content-Type")).decode("latin-1").lower()
+        content_length = self.reply.header(QtNetwork.QNetworkRequest.ContentLengthHeader)
+        if content_type.startswith(STREAM_CONTENT_TYPES) or (content_length or 0) > self.max_size:
+            self.stop_sharing()
+
+    def slot_ready_read(self):
+        """
+            Store the received data in the shared content and notify it.
+        """
+        data = self.reply.readAll().data()
+        if self.content is not None and len(self.content) + len(data) > self.max_size:
+            self.stop_sharing()
+        if self.content is not None:
+            self.content.extend(data)
+        for coalesced_reply in self.get_live_replies():
+            coalesced_reply.append_data(data)
+
+    def slot_finished(self):
+        """
+            Complete all the replies.
+        """
+        self.slot_ready_read()
+        if self.meta_data is None:
+            self.slot_meta_data_changed()
+
+        for coalesced_reply in list(self.late_replies):
+            self.replay(coalesced_reply)
+
+        for coalesced_reply in self.get_live_replies():
+            if not coalesced_reply.isFinished():
+                coalesced_reply.finish(self.reply.error(), self.reply.errorString())
+
+        self.completed.emit(self)
+        self.reply.deleteLater()
+        self.deleteLater()
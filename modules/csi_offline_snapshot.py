@@ -0,0 +1,251 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+import time
+import hashlib
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+from qgis.PyQt import QtCore, QtNetwork
+from qgis.core import Qgis, QgsApplication
+
+from . import csi_utils
+from .. import configuration
+from .csi_network_metrics import ORIGIN_ATTRIBUTE
+
+
+class CsiOfflineSnapshot(QtCore.QObject):
+    """
+        Local snapshot of the backend responses (i.e. the catalog page and its JSON data), used for answering the
+        requests when the backend is unreachable. Its other resources (e.g. scripts and images) are served by the
+        network cache.
+        The successful GET responses sent by the page to the backend host are stored by normalized URL (i.e. without
+        the cache-busting parameters), each content in a file named after the URL SHA-1, while the index maps each
+        URL to the file and to the response headers. The responses to authenticated requests and the ones the server
+        marks as not storable are skipped. The least recently used responses are evicted once the snapshot exceeds
+        its maximum size.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    # The response headers excluding the response from the snapshot
+    NO_STORE_DIRECTIVES = ("no-store", "private")
+
+    def __init__(self, snapshot_dir, shell_url, max_entry_size, max_size, ignored_parameters, parent=None):
+        """
+            Load the snapshot index from the given directory.
+            :param snapshot_dir: The snapshot directory
+            :type snapshot_dir: str
+            :param shell_url: The URL of the catalog page, whose host is the backend one
+            :type shell_url: str
+            :param max_entry_size: The maximum size in bytes of a stored response
+            :type max_entry_size: int
+            :param max_size: The maximum size in bytes of all the stored responses
+            :type max_size: int
+            :param ignored_parameters: The names of the query string parameters ignored in the URLs (i.e. the
+            cache-busting ones)
+            :type ignored_parameters: list of str
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiOfflineSnapshot, self).__init__(parent)
+        self.snapshot_dir = snapshot_dir
+        self.hosts = set(h for h in [QtCore.QUrl(shell_url).host().lower()] if h)
+        self.max_entry_size = max_entry_size
+        self.max_size = max_size
+        self.ignored_parameters = set(p.strip() for p in ignored_parameters if p.strip())
+        self.shell_key = self.get_key(shell_url)
+        self.index_file_path = os.path.join(snapshot_dir, self.INDEX_FILE_NAME)
+        self.entries = csi_utils.load_json_file(self.index_file_path, default={})
+        for entry in self.entries.values():
+            if "size" not in entry:
+                file_path = os.path.join(snapshot_dir, entry["file"])
+                entry["size"] = os.path.getsize(file_path) if os.path.isfile(file_path) else 0
+
+        # The index is saved once the burst of responses of a page load ends
+        self.save_timer = QtCore.QTimer(self)
+        self.save_timer.setSingleShot(True)
+        self.save_timer.setInterval(2000)
+        self.save_timer.timeout.connect(self.save)
+
+    def accepts(self, operation, request):
+        """
+            Check if the response to the request must be stored in the snapshot.
+            Only the page requests for the catalog page or for JSON data are stored, not the ones of the plugin (e.g.
+            packages downloads) nor the authenticated ones.
+            :param operation: The operation
+            :type operation: QNetworkAccessManager.Operation
+            :param request: The request
+            :type request: QNetworkRequest
+            :return: True if the response must be stored
+            :rtype: bool
+        """
+        if operation != QtNetwork.QNetworkAccessManager.GetOperation or not self.is_backend_url(request.url()) \
+                or request.attribute(ORIGIN_ATTRIBUTE) or request.hasRawHeader(b"Authorization"):
+            return False
+
+        accept = bytes(request.rawHeader(b"Accept")).decode("latin-1").lower()
+        return self.get_key(request.url().toString()) == self.shell_key or "json" in accept \
+            or request.url().path().lower().endswith(".json")
+
+    def get_key(self, url):
+        """
+            Retrieve the key of the URL in the snapshot: the URL without the fragment and the ignored parameters,
+            with the query string parameters sorted.
+            :param url: The URL
+            :type url: str
+            :return: The key
+            :rtype: str
+        """
+        scheme, netloc, path, query, _ = urlsplit(url)
+        parameters = sorted((name, value) for name, value in parse_qsl(query, keep_blank_values=True)
+                            if name not in self.ignored_parameters)
+        return urlunsplit((scheme.lower(), netloc.lower(), path, urlencode(parameters), ""))
+
+    def is_backend_url(self, url):
+        """
+            Check if the URL refers to a backend host.
+            :param url: The URL
+            :type url: QUrl
+            :return: True for the backend URLs
+            :rtype: bool
+        """
+        return url.host().lower() in self.hosts
+
+    def contains(self, url):
+        """
+            Check if the snapshot holds the response for the URL.
+            :param url: The URL
+            :type url: str
+            :return: True if the response is available
+            :rtype: bool
+        """
+        entry = self.entries.get(self.get_key(url))
+        return entry is not None and os.path.isfile(os.path.join(self.snapshot_dir, entry["file"]))
+
+    def store(self, url, raw_headers, content):
+        """
+            Store the successful response for the URL.
+            :param url: The URL
+            :type url: str
+            :param raw_headers: The list of (name, value) response headers
+            :type raw_headers: list of tuple
+            :param content: The response body
+            :type content: bytes
+        """
+        if len(content) > self.max_entry_size or len(content) > self.max_size:
+            return
+
+        headers = {bytes(n).decode("latin-1").lower(): bytes(v).decode("latin-1").lower() for n, v in raw_headers}
+        if any(directive in headers.get("cache-control", "") for directive in self.NO_STORE_DIRECTIVES):
+            return
+
+        key = self.get_key(url)
+        file_name = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        try:
+            if not os.path.exists(self.snapshot_dir):
+                os.makedirs(self.snapshot_dir)
+            tmp_file_path = os.path.join(self.snapshot_dir, file_name + ".tmp")
+            with open(tmp_file_path, "wb") as f:
+                f.write(content)
+            os.replace(tmp_file_path, os.path.join(self.snapshot_dir, file_name))
+        except OSError as e:
+            QgsApplication.messageLog().logMessage('CsiOfflineSnapshot: {}'.format(e),
+                                                   tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+            return
+
+        # The headers describing the stored body only, the transfer ones don't apply to the local copy
+        skipped_headers = (b"content-length", b"content-encoding", b"transfer-encoding", b"connection", b"set-cookie")
+        now = time.time()
+        self.entries[key] = {
+            "file": file_name,
+            "headers": [[bytes(n).decode("latin-1"), bytes(v).decode("latin-1")] for n, v in raw_headers
+                        if bytes(n).lower() not in skipped_headers],
+            "size": len(content),
+            "saved": now,
+            "accessed": now
+        }
+        self.evict(key)
+        self.save_timer.start()
+
+    def load(self, url):
+        """
+            Retrieve the stored response for the URL.
+            :param url: The URL
+            :type url: str
+            :return: The list of (name, value) response headers and the body, None if not available
+            :rtype: tuple
+        """
+        entry = self.entries.get(self.get_key(url))
+        if entry is None:
+            return None
+
+        try:
+            with open(os.path.join(self.snapshot_dir, entry["file"]), "rb") as f:
+                content = f.read()
+        except OSError:
+            return None
+
+        entry["accessed"] = time.time()
+        self.save_timer.start()
+        return [(n.encode("latin-1"), v.encode("latin-1")) for n, v in entry["headers"]], content
+
+    def evict(self, keep_key=None):
+        """
+            Remove the least recently used responses until the snapshot size is within 'max_size'.
+            :param keep_key: The key of the response never evicted (i.e. the one just stored)
+            :type keep_key: str
+        """
+        snapshot_size = sum(entry.get("size", 0) for entry in self.entries.values())
+        for key, entry in sorted(self.entries.items(), key=lambda item: item[1].get("accessed", item[1]["saved"])):
+            if snapshot_size <= self.max_size:
+                break
+            if key == keep_key:
+                continue
+
+            del self.entries[key]
+            file_path = os.path.join(self.snapshot_dir, entry["file"])
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            snapshot_size -= entry.get("size", 0)
+
+    def save(self):
+        """
+            Persist the snapshot index.
+        """
+        try:
+            csi_utils.save_json_file(self.index_file_path, self.entries)
+        except OSError as e:
+            QgsApplication.messageLog().logMessage('CsiOfflineSnapshot: {}'.format(e),
+                                                   tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
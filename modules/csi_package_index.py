@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+import email.utils
+
+from . import csi_utils
+
+
+class CsiPackageIndex(object):
+    """
+        Index of the packages downloaded in a folder, storing for each file the server validators (ETag,
+        Last-Modified and Content-Length) used for checking with a conditional request whether the remote file
+        changed since the download.
+    """
+
+    INDEX_FILE_NAME = ".csiatlantewi_pacchetti.json"
+
+    def __init__(self, download_folder_path):
+        """
+            Load the index of the given download folder.
+            :param download_folder_path: The download folder path
+            :type download_folder_path: str
+        """
+        self.index_file_path = os.path.join(download_folder_path, self.INDEX_FILE_NAME)
+        self.entries = csi_utils.load_json_file(self.index_file_path, default={})
+
+    def get_validation_headers(self, url, local_file_path):
+        """
+            Retrieve the headers for a conditional request of the remote file, in case the local copy is valid.
+            :param url: The URL of the remote file
+            :type url: str
+            :param local_file_path: The local file path
+            :type local_file_path: str
+            :return: The request headers, empty in case the file must be downloaded
+            :rtype: dict
+        """
+        if not os.path.isfile(local_file_path):
+            return {}
+
+        entry = self.entries.get(os.path.basename(local_file_path))
+
+        # File downloaded by a previous version of the plugin: relying on its modification time
+        if entry is None:
+            return {"If-Modified-Since": email.utils.formatdate(os.path.getmtime(local_file_path), usegmt=True)}
+
+        # The local copy is incomplete or it was modified
+        if entry["url"] != url or os.path.getsize(local_file_path) != entry["content_length"]:
+            return {}
+
+        headers = {}
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def store(self, download):
+        """
+            Store the validators of the completed download.
+            :param download: The successfully completed download
+            :type download: CsiFileDownload
+        """
+        # The validators of a resumed download are the ones merged across the attempts
+        validators = download.metadata or download.response_headers
+        self.entries[os.path.basename(download.local_file_path)] = {
+            "url": download.url,
+            "etag": validators.get("etag", ""),
+            "last_modified": validators.get("last_modified", validators.get("last-modified", "")),
+            "content_length": os.path.getsize(download.local_file_path)
+        }
+        csi_utils.save_json_file(self.index_file_path, self.entries)
@@ -0,0 +1,286 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+import time
+import shutil
+import hashlib
+
+from . import csi_utils
+
+
+class CsiQmlCache(object):
+    """
+        Persistent cache of the *.qml style files.
+        The files are stored by content (i.e. the SHA-1 of the file), so that the same style published at different
+        URLs is stored once. The index maps each URL to its content and to the validators (ETag and Last-Modified)
+        returned by the server, used for revalidating the entry with a conditional request.
+        The least recently used contents are evicted once the cache exceeds its maximum size.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    def __init__(self, cache_dir, max_age, max_size):
+        """
+            Load the cache index from the given directory.
+            :param cache_dir: The cache directory
+            :type cache_dir: str
+            :param max_age: The seconds an entry is used without revalidating it with the server
+            :type max_age: int
+            :param max_size: The maximum size in bytes of the cached contents
+            :type max_size: int
+        """
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.max_size = max_size
+        self.index_file_path = os.path.join(cache_dir, self.INDEX_FILE_NAME)
+        self.entries = csi_utils.load_json_file(self.index_file_path, default={})
+
+    def lookup(self, url):
+        """
+            Retrieve the entry for the given URL, in case its content is available.
+            :param url: The *.qml URL
+            :type url: str
+            :return: The entry or None
+            :rtype: dict
+        """
+        entry = self.entries.get(url)
+        if entry is None or not os.path.isfile(self.get_content_file_path(entry["sha1"])):
+            return None
+
+        return entry
+
+    def is_fresh(self, entry):
+        """
+            Check if the entry can be used without revalidating it with the server.
+            :param entry: The cache entry
+            :type entry: dict
+            :return: True in case the entry has been validated within the last 'max_age' seconds
+            :rtype: bool
+        """
+        return time.time() - entry["validated"] < self.max_age
+
+    def get_validation_headers(self, entry):
+        """
+            Retrieve the headers for a conditional request revalidating the entry.
+            :param entry: The cache entry, could be None
+            :type entry: dict
+            :return: The request headers
+            :rtype: dict
+        """
+        headers = {}
+        if entry is None:
+            return headers
+
+        if entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def get_download_file_path(self, url):
+        """
+            Retrieve the temporary path where to download the content for the URL.
+            :param url: The *.qml URL
+            :type url: str
+            :return: The file path
+            :rtype: str
+        """
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        return os.path.join(self.cache_dir, hashlib.sha1(url.encode("utf-8")).hexdigest() + ".download")
+
+    def get_content_file_path(self, sha1):
+        """
+            Retrieve the path of the cached content.
+            :param sha1: The content SHA-1
+            :type sha1: str
+            :return: The file path
+            :rtype: str
+        """
+        return os.path.join(self.cache_dir, sha1 + ".qml")
+
+    def store(self, url, download_file_path, response_headers):
+        """
+            Store the downloaded content for the URL.
+            :param url: The *.qml URL
+            :type url: str
+            :param download_file_path: The downloaded file path, which is moved into the cache
+            :type download_file_path: str
+            :param response_headers: The response headers, with lower case names
+            :type response_headers: dict
+            :return: False in case the content is not stored, because missing or larger than the cache: a larger
+            content is left in the downloaded file
+            :rtype: bool
+        """
+        # The same download could be shared by several requests for the same URL
+        if not os.path.isfile(download_file_path):
+            return url in self.entries
+
+        # The content is not cached, otherwise it would evict the whole cache and itself
+        if os.path.getsize(download_file_path) > self.max_size:
+            if self.remove_entry(url):
+                self.save()
+            return False
+
+        sha1 = hashlib.sha1()
+        with open(download_file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(65536), b""):
+                sha1.update(chunk)
+        sha1 = sha1.hexdigest()
+
+        content_file_path = self.get_content_file_path(sha1)
+        if os.path.exists(content_file_path):
+            os.remove(download_file_path)
+        else:
+            os.replace(download_file_path, content_file_path)
+
+        now = time.time()
+        previous_entry = self.entries.get(url)
+        self.entries[url] = {
+            "sha1": sha1,
+            "size": os.path.getsize(content_file_path),
+            "etag": response_headers.get("etag", ""),
+            "last_modified": response_headers.get("last-modified", ""),
+            "validated": now,
+            "accessed": now
+        }
+        # The previous content of the URL (i.e. the style changed) is removed, unless other URLs refer to it
+        if previous_entry is not None and previous_entry["sha1"] != sha1:
+            self.release(previous_entry["sha1"])
+        self.evict(sha1)
+        self.save()
+        return True
+
+    def remove_entry(self, url):
+        """
+            Remove the entry for the URL, together with its content unless other URLs refer to it.
+            :param url: The *.qml URL
+            :type url: str
+            :return: True in case the entry was found
+            :rtype: bool
+        """
+        entry = self.entries.pop(url, None)
+        if entry is None:
+            return False
+
+        self.release(entry["sha1"])
+        return True
+
+    def release(self, sha1):
+        """
+            Remove the content in case no entry refers to it anymore.
+            :param sha1: The content SHA-1
+            :type sha1: str
+        """
+        if any(entry["sha1"] == sha1 for entry in self.entries.values()):
+            return
+
+        content_file_path = self.get_content_file_path(sha1)
+        if os.path.exists(content_file_path):
+            os.remove(content_file_path)
+
+    def mark_validated(self, url):
+        """
+            Mark the entry as just confirmed by the server (i.e. '304 Not Modified').
+            :param url: The *.qml URL
+            :type url: str
+        """
+        entry = self.entries.get(url)
+        if entry is None:
+            return
+
+        entry["validated"] = time.time()
+        self.save()
+
+    def copy_to(self, url, local_file_path):
+        """
+            Copy the cached content for the URL to the given path.
+            :param url: The *.qml URL
+            :type url: str
+            :param local_file_path: The destination file path
+            :type local_file_path: str
+            :return: True in case the content was available
+            :rtype: bool
+        """
+        entry = self.lookup(url)
+        if entry is None:
+            return False
+
+        try:
+            shutil.copyfile(self.get_content_file_path(entry["sha1"]), local_file_path)
+        except OSError:
+            return False
+        entry["accessed"] = time.time()
+        self.save()
+        return True
+
+    def evict(self, keep_sha1=None):
+        """
+            Remove the least recently used contents until the cache size is within 'max_size'.
+            :param keep_sha1: The SHA-1 of the content never evicted (i.e. the one just stored)
+            :type keep_sha1: str
+        """
+        # The contents no entry refers to (e.g. left by a previous version of the plugin) are not counted: remove them
+        referenced_files = set(entry["sha1"] + ".qml" for entry in self.entries.values())
+        for file_name in os.listdir(self.cache_dir):
+            if file_name.endswith(".qml") and file_name not in referenced_files:
+                os.remove(os.path.join(self.cache_dir, file_name))
+
+        # The size of each content and its last access, among all the URLs referring to it
+        contents = {}
+        for entry in self.entries.values():
+            size, accessed = contents.get(entry["sha1"], (entry["size"], 0))
+            contents[entry["sha1"]] = (size, max(accessed, entry["accessed"]))
+
+        cache_size = sum(size for size, _ in contents.values())
+        for sha1, (size, _) in sorted(contents.items(), key=lambda item: item[1][1]):
+            if cache_size <= self.max_size:
+                break
+            if sha1 == keep_sha1:
+                continue
+
+            self.entries = {url: entry for url, entry in self.entries.items() if entry["sha1"] != sha1}
+            content_file_path = self.get_content_file_path(sha1)
+            if os.path.exists(content_file_path):
+                os.remove(content_file_path)
+            cache_size -= size
+
+    def save(self):
+        """
+            Save the cache index.
+        """
+        csi_utils.save_json_file(self.index_file_path, self.entries)
@@ -0,0 +1,162 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+from qgis.PyQt import QtCore
+from qgis.core import QgsApplication
+
+from .. import configuration
+
+
+class CsiSettings(QtCore.QObject):
+    """
+        The plugin settings, loaded once from the QSettings and kept in memory.
+        The groups in GROUPS are loaded at once, so that reading their keys doesn't access the QSettings storage
+        (i.e. the Windows registry), while the keys of the other groups are read and kept on the first access.
+        The changed values are written back together, once no other value changes for FLUSH_DELAY milliseconds.
+    """
+
+    # The groups loaded at once
+    GROUPS = ["CSIAtlanteWI", "proxy"]
+
+    # Emitted with the key and the new value when a value is changed through 'set_value'
+    changed = QtCore.pyqtSignal(str, object)
+
+    # The shared instance
+    _instance = None
+
+    @classmethod
+    def instance(cls):
+        """
+            Retrieve the shared instance, loading the settings on the first use.
+            :return: The settings
+            :rtype: CsiSettings
+        """
+        if cls._instance is None:
+            cls._instance = CsiSettings()
+        return cls._instance
+
+    def __init__(self, parent=None):
+        """
+            Load the settings.
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiSettings, self).__init__(parent)
+        self.values = {}
+        self.pending = {}
+
+        self.flush_timer = QtCore.QTimer(self)
+        self.flush_timer.setSingleShot(True)
+        self.flush_timer.setInterval(configuration.SETTINGS_FLUSH_DELAY)
+        self.flush_timer.timeout.connect(self.flush)
+        QgsApplication.instance().aboutToQuit.connect(self.flush)
+
+        self.reload()
+
+    def reload(self):
+        """
+            Load again the settings, discarding the values in memory. The changes not written yet are kept.
+        """
+        qgs_settings = QtCore.QSettings()
+        self.values = {}
+        for group in self.GROUPS:
+            qgs_settings.beginGroup(group)
+            for key in qgs_settings.allKeys():
+                self.values[group + "/" + key] = qgs_settings.value(key)
+            qgs_settings.endGroup()
+        self.values.update(self.pending)
+
+    def value(self, value_key, default=None, value_type=str):
+        """
+            Retrieve the value for the key 'value_key' or the value in 'default' if there is no value (or it is an
+            empty string, since QSettings values are string-based).
+            The value is cast to the 'value_type', but if it fails, 'default' is returned. The strings "true" and
+            "false" are cast to the corresponding bool.
+            :param value_key: The value key (e.g. CSIAtlanteWI/debug)
+            :type value_key: str
+            :param default: The value to return in case there is no value for 'value_key'
+            :type default: type
+            :param value_type: The expected returned value type
+            :type value_type: type
+            :return: The value for the 'value_key' or 'default'
+            :rtype: type
+        """
+        if not value_key:
+            return default
+
+        if value_key not in self.values and value_key.split("/")[0] not in self.GROUPS:
+            self.values[value_key] = QtCore.QSettings().value(value_key, None)
+
+        value = self.values.get(value_key)
+        if not value:
+            return default
+
+        if value_type is bool and isinstance(value, str):
+            return value.strip().lower() in ("true", "1", "yes")
+
+        try:
+            return value_type(value)
+        except (TypeError, ValueError):
+            return default
+
+    def set_value(self, value_key, value):
+        """
+            Change the value for the key 'value_key', which is written to the QSettings with the next flush.
+            :param value_key: The value key (e.g. CSIAtlanteWI/user)
+            :type value_key: str
+            :param value: The value
+            :type value: type
+        """
+        if self.values.get(value_key) == value:
+            return
+
+        self.values[value_key] = value
+        self.pending[value_key] = value
+        self.flush_timer.start()
+        self.changed.emit(value_key, value)
+
+    def flush(self):
+        """
+            Write the changed values to the QSettings.
+        """
+        self.flush_timer.stop()
+        if len(self.pending) == 0:
+            return
+
+        qgs_settings = QtCore.QSettings()
+        for value_key, value in self.pending.items():
+            qgs_settings.setValue(value_key, value)
+        qgs_settings.sync()
+        self.pending = {}
@@ -0,0 +1,206 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import os
+import time
+from qgis.PyQt import QtCore, QtNetwork
+from qgis.core import Qgis, QgsApplication
+
+from . import csi_utils
+from .. import configuration
+from .csi_certificate import CsiCertificate
+
+
+class CsiSslProfile(QtCore.QObject):
+    """
+        The client certificate SSL configuration shared by all the requests.
+        The certificate and the key are loaded and validated once, from the first available source among:
+        - the QGIS authentication configuration in the "CSIAtlanteWI/ssl_authcfg" setting
+        - the PEM files in the "CSIAtlanteWI/ssl_certificate_file" and "CSIAtlanteWI/ssl_key_file" settings
+        - the values of the CsiCertificate class
+        The configuration is built again when the source changes (i.e. different settings, modified files or
+        updated authentication database).
+    """
+
+    def __init__(self, parent=None):
+        """
+            Initialize the profile, loaded at its first use.
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiSslProfile, self).__init__(parent)
+        self.ssl_configuration = None
+        self.source = None
+        self.checked = 0
+        QgsApplication.authManager().authDatabaseChanged.connect(self.invalidate)
+
+    def invalidate(self):
+        """
+            Discard the loaded configuration, so that it is loaded again at the next use.
+        """
+        self.source = None
+
+    def get_source(self):
+        """
+            Retrieve the identifiers of the current source of the certificate.
+            :return: The authentication configuration, the files paths and their modification times
+            :rtype: tuple
+        """
+        authcfg = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/ssl_authcfg",
+                                                              default=configuration.SSL_AUTHCFG, value_type=str)
+        certificate_file = csi_utils.get_qgs_settings_value_or_default(
+            "CSIAtlanteWI/ssl_certificate_file", default=configuration.SSL_CERTIFICATE_FILE, value_type=str)
+        key_file = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/ssl_key_file",
+                                                               default=configuration.SSL_KEY_FILE, value_type=str)
+        mtimes = tuple(os.path.getmtime(f) if f and os.path.isfile(f) else None for f in (certificate_file, key_file))
+        return authcfg, certificate_file, key_file, mtimes
+
+    def get_ssl_configuration(self):
+        """
+            Retrieve the SSL configuration, loading it if its source changed.
+            The source is checked at most once every SSL_PROFILE_CHECK_INTERVAL seconds.
+            :return: The configuration, None if no valid certificate is available
+            :rtype: QSslConfiguration
+        """
+        now = time.time()
+        if self.source is not None and now - self.checked < configuration.SSL_PROFILE_CHECK_INTERVAL:
+            return self.ssl_configuration
+
+        self.checked = now
+        source = self.get_source()
+        if source != self.source:
+            self.source = source
+            self.ssl_configuration = self.load(*source)
+
+        return self.ssl_configuration
+
+    def apply(self, request):
+        """
+            Attach the SSL configuration to the request, if any.
+            :param request: The request
+            :type request: QNetworkRequest
+            :return: The request to send
+            :rtype: QNetworkRequest
+        """
+        ssl_configuration = self.get_ssl_configuration()
+        if ssl_configuration is None or request.url().scheme().lower() != "https":
+            return request
+
+        request = QtNetwork.QNetworkRequest(request)
+        request.setSslConfiguration(ssl_configuration)
+        return request
+
+    def load(self, authcfg, certificate_file, key_file, mtimes):
+        """
+            Load and validate the certificate and the key from the given source.
+            :param authcfg: The QGIS authentication configuration identifier
+            :type authcfg: str
+            :param certificate_file: The PEM certificate file path
+            :type certificate_file: str
+            :param key_file: The PEM key file path
+            :type key_file: str
+            :param mtimes: The files modification times
+            :type mtimes: tuple
+            :return: The configuration, None if no valid certificate is available
+            :rtype: QSslConfiguration
+        """
+        qgs_logger = QgsApplication.messageLog()
+        if authcfg:
+            request = QtNetwork.QNetworkRequest()
+            if not QgsApplication.authManager().updateNetworkRequest(request, authcfg):
+                qgs_logger.logMessage('CsiSslProfile: authcfg {} non disponibile'.format(authcfg),
+                                      tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+                return None
+            ssl_configuration = request.sslConfiguration()
+            return self.validate(ssl_configuration.localCertificate(), ssl_configuration.privateKey(), authcfg)
+
+        if certificate_file and key_file:
+            try:
+                with open(certificate_file, "rb") as f:
+                    certificate_data = f.read()
+                with open(key_file, "rb") as f:
+                    key_data = f.read()
+            except OSError as e:
+                qgs_logger.logMessage('CsiSslProfile: {}'.format(e), tag=configuration.NETWORK_LOGGER_TAG,
+                                      level=Qgis.Warning)
+                return None
+            source = certificate_file
+        else:
+            certificate_data = CsiCertificate.get_certificate().data()
+            key_data = CsiCertificate.get_key().data()
+            source = "CsiCertificate"
+
+        if not certificate_data or not key_data:
+            return None
+
+        certificate = QtNetwork.QSslCertificate(QtCore.QByteArray(certificate_data), QtNetwork.QSsl.Pem)
+        key = QtNetwork.QSslKey(QtCore.QByteArray(key_data), QtNetwork.QSsl.Rsa, QtNetwork.QSsl.Pem)
+        return self.validate(certificate, key, source)
+
+    @staticmethod
+    def validate(certificate, key, source):
+        """
+            Build the SSL configuration if the certificate and the key are valid.
+            :param certificate: The client certificate
+            :type certificate: QSslCertificate
+            :param key: The private key
+            :type key: QSslKey
+            :param source: The description of the source, for logging purposes
+            :type source: str
+            :return: The configuration, None if the certificate or the key are not valid
+            :rtype: QSslConfiguration
+        """
+        qgs_logger = QgsApplication.messageLog()
+        if certificate.isNull() or key.isNull():
+            qgs_logger.logMessage('CsiSslProfile: certificato o chiave non validi ({})'.format(source),
+                                  tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Critical)
+            return None
+
+        if certificate.expiryDate() < QtCore.QDateTime.currentDateTime():
+            qgs_logger.logMessage('CsiSslProfile: certificato scaduto il {} ({})'.format(
+                certificate.expiryDate().toString(QtCore.Qt.ISODate), source),
+                tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
+
+        ssl_configuration = QtNetwork.QSslConfiguration.defaultConfiguration()
+        ca_certificates = ssl_configuration.caCertificates()
+        ca_certificates.append(certificate)
+        ssl_configuration.setCaCertificates(ca_certificates)
+        ssl_configuration.setLocalCertificate(certificate)
+        ssl_configuration.setPrivateKey(key)
+        ssl_configuration.setProtocol(QtNetwork.QSsl.AnyProtocol)
+        qgs_logger.logMessage('CsiSslProfile: certificato {} caricato ({})'.format(
+            ", ".join(certificate.subjectInfo(QtNetwork.QSslCertificate.CommonName)), source),
+            tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Info)
+        return ssl_configuration
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+import base64
+import time
+from qgis.PyQt import QtCore, QtNetwork
+from qgis.core import Qgis, QgsApplication
+
+from . import csi_utils
+from .. import configuration
+
+
+class CsiTlsSessions(QtCore.QObject):
+    """
+        The TLS sessions of the backend hosts, offered to the new connections for an abbreviated handshake.
+        The sessions are persisted in a JSON file, so that the first connection after a QGIS restart can resume
+        the last session instead of performing a full handshake.
+        Note: the serialized sessions contain the TLS master secret, so the file is kept in the QGIS user profile.
+    """
+
+    def __init__(self, hosts, file_path=None, parent=None):
+        """
+            Load the persisted sessions of the given hosts.
+            :param hosts: The backend hosts names
+            :type hosts: list of str
+            :param file_path: The JSON file persisting the sessions, None for keeping them only in memory
+            :type file_path: str
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiTlsSessions, self).__init__(parent)
+        self.hosts = set(h.lower() for h in hosts if h)
+        self.file_path = file_path
+        self.sessions = {}
+
+        now = time.time()
+        for host, session in csi_utils.load_json_file(file_path, {}).items() if file_path else []:
+            if host in self.hosts and session.get("expires", 0) > now:
+                self.sessions[host] = session
+
+    def apply(self, request):
+        """
+            Enable the session tickets for the request to a backend host, offering the last session, if any.
+            :param request: The request
+            :type request: QNetworkRequest
+            :return: The request to send
+            :rtype: QNetworkRequest
+        """
+        url = request.url()
+        if url.scheme().lower() != "https" or url.host().lower() not in self.hosts:
+            return request
+
+        ssl_configuration = request.sslConfiguration()
+        ssl_configuration.setSslOption(QtNetwork.QSsl.SslOptionDisableSessionTickets, False)
+        ssl_configuration.setSslOption(QtNetwork.QSsl.SslOptionDisableSessionPersistence, False)
+        session = self.sessions.get(url.host().lower())
+        if session is not None:
+            ssl_configuration.setSessionTicket(QtCore.QByteArray(base64.b64decode(session["ticket"])))
+
+        request = QtNetwork.QNetworkRequest(request)
+        request.setSslConfiguration(ssl_configuration)
+        return request
+
+    def update(self, reply):
+        """
+            Store the session ticket issued with the reply, if it is new.
+            Qt doesn't tell whether the handshake resumed the offered session (e.g. TLS 1.3 and the servers rotating
+            the tickets issue a new ticket in both cases), so the resumption is not reported.
+            :param reply: The reply which completed the TLS handshake
+            :type reply: QNetworkReply
+        """
+        host = reply.url().host().lower()
+        ssl_configuration = reply.sslConfiguration()
+        ticket = ssl_configuration.sessionTicket()
+        if host not in self.hosts or ticket.isEmpty():
+            return
+
+        ticket = base64.b64encode(ticket.data()).decode("ascii")
+        if self.sessions.get(host, {}).get("ticket") == ticket:
+            return
+
+        lifetime = ssl_configuration.sessionTicketLifeTimeHint()
+        self.sessions[host] = {
+            "ticket": ticket,
+            "expires": time.time() + (lifetime if lifetime > 0 else configuration.TLS_SESSION_LIFETIME)
+        }
+        if self.file_path:
+            try:
+                csi_utils.save_json_file(self.file_path, self.sessions)
+            except OSError as e:
+                QgsApplication.messageLog().logMessage('CsiTlsSessions: {}'.format(e),
+                                                       tag=configuration.NETWORK_LOGGER_TAG, level=Qgis.Warning)
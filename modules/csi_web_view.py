@@ -35,7 +35,7 @@ The content of this file is based on
 
 from qgis.PyQt import QtWidgets
 from qgis.PyQt.QtWebKitWidgets import QWebView
-from qgis.PyQt.QtWidgets import QMessageBox
+from qgis.PyQt.QtWidgets import QMessageBox, QFileDialog
 from qgis.core import Qgis, QgsApplication
 
 from .. import configuration
@@ -53,6 +53,13 @@ class CsiWebView(QWebView):
         # Adding custom action to the widget (right-click activated)
         self.clearCacheAction = QtWidgets.QAction('Pulisci cache e cronologia', self)
         self.clearCacheAction.triggered.connect(self.slot_clear_cache)
+        self.cacheStatisticsAction = QtWidgets.QAction('Statistiche cache', self)
+        self.cacheStatisticsAction.triggered.connect(self.slot_cache_statistics)
+        self.exportMetricsAction = QtWidgets.QAction('Esporta metriche di rete', self)
+        self.exportMetricsAction.triggered.connect(self.slot_export_metrics)
+        self.offlineAction = QtWidgets.QAction('Modalita\' offline', self)
+        self.offlineAction.setCheckable(True)
+        self.offlineAction.triggered.connect(self.slot_offline)
 
     def slot_clear_cache(self):
         """
@@ -71,6 +78,61 @@ class CsiWebView(QWebView):
             qgs_logger.logMessage('CsiWebView clear_cache!', tag=configuration.LOGGER_TAG, level=Qgis.Warning)
             cache.clear()
 
+    def slot_cache_statistics(self):
+        """
+            Show the statistics of the plugin cache.
+        """
+        cache = self.page().networkAccessManager().cache()
+        if not hasattr(cache, "get_statistics"):
+            QMessageBox.information(self, 'Statistiche cache', "La cache del plugin non e' attiva")
+            return
+
+        statistics = cache.get_statistics()
+        lines = []
+        for name, label in (("static", "Risorse dell'interfaccia"), ("data", "Dati del catalogo")):
+            lines.append("{}: {:.1f} MB di {:.1f} MB\n{}".format(label, statistics[name]["size"] / 1048576.0,
+                                                                 statistics[name]["max_size"] / 1048576.0,
+                                                                 statistics[name]["directory"]))
+        lines.append("Richieste servite dalla cache: {}\nRichieste non presenti in cache: {}"
+                     .format(statistics["hits"], statistics["misses"]))
+        QMessageBox.information(self, 'Statistiche cache', "\n\n".join(lines))
+
+    def slot_export_metrics(self):
+        """
+            Export the network metrics to a CSV or JSON file chosen by the user.
+        """
+        metrics = getattr(self.page().networkAccessManager(), "metrics", None)
+        if metrics is None:
+            QMessageBox.information(self, 'Metriche di rete', "La raccolta delle metriche di rete non e' attiva")
+            return
+
+        file_path, _ = QFileDialog.getSaveFileName(self, 'Esporta metriche di rete', '', "CSV (*.csv);;JSON (*.json)")
+        if not file_path:
+            return
+
+        if file_path.lower().endswith(".json"):
+            metrics.export_json(file_path)
+        else:
+            metrics.export_csv(file_path)
+
+        qgs_logger = QgsApplication.messageLog()
+        qgs_logger.logMessage('CsiWebView metrics exported: {}'.format(file_path), tag=configuration.LOGGER_TAG,
+                              level=Qgis.Info)
+
+    def slot_offline(self, offline):
+        """
+            Switch the offline mode and reload the page, either from the local snapshot or from the backend.
+            :param offline: True for the offline mode
+            :type offline: bool
+        """
+        network_access_manager = self.page().networkAccessManager()
+        if getattr(network_access_manager, "offline_snapshot", None) is None:
+            QMessageBox.information(self, 'Modalita\' offline', "La copia locale del catalogo non e' attiva")
+            return
+
+        network_access_manager.set_offline(offline)
+        self.reload()
+
     def contextMenuEvent(self, event):
         """
             Overridden method.
@@ -81,5 +143,11 @@ class CsiWebView(QWebView):
         menu = self.page().createStandardContextMenu()
         # Adding the clear-cache action
         menu.addAction(self.clearCacheAction)
+        # Adding the cache statistics and the network metrics export actions
+        menu.addAction(self.cacheStatisticsAction)
+        menu.addAction(self.exportMetricsAction)
+        # Adding the offline mode switch
+        self.offlineAction.setChecked(bool(getattr(self.page().networkAccessManager(), "offline", False)))
+        menu.addAction(self.offlineAction)
         # Show the menu on the specific position
         menu.exec(event.globalPos())
@@ -0,0 +1,414 @@
+# -*- coding: utf-8 -*-
+
+"""
+/*******************************************
+Copyright: Regione Piemonte 2012-2019
+SPDX-Licene-Identifier: GPL-2.0-or-later
+*******************************************/
+
+/***************************************************************************
+CSIAtlanteWI
+Accesso organizzato a dati e geoservizi
+A QGIS plugin, designed for an organization where the Administrators of the
+Geographic Information System want to guide end users
+in organized access to the data and geo-services of their interest.
+Date : 2019-11-16
+copyright : (C) 2012-2019 by Regione Piemonte
+author : Enzo Ciarmoli(CSI Piemonte), Luca Guida(Genegis), Matteo Tranquillini(Trilogis), Stefano Giorgi (CSI Piemonte) 
+email : supporto.gis@csi.it
+Note:
+The content of this file is based on
+- DB Manager by Giuseppe Sucameli <brush.tyler@gmail.com> (GPLv2 license)
+- PG_Manager by Martin Dobias <wonder.sk@gmail.com> (GPLv2 license)
+***************************************************************************/
+
+/***************************************************************************
+* *
+* This program is free software; you can redistribute it and/or modify *
+* it under the terms of the GNU General Public License as published by *
+* the Free Software Foundation; either version 2 of the License, or *
+* (at your option) any later version. *
+* *
+***************************************************************************/
+"""
+
+
+
+import os
+import time
+import hashlib
+from urllib.parse import unquote_plus, urlsplit, urlunsplit
+from xml.etree import ElementTree
+
+from qgis.PyQt import QtCore, QtNetwork
+from qgis.PyQt.QtCore import QByteArray, QDateTime, QUrl
+from qgis.core import QgsNetworkAccessManager
+
+from . import csi_utils
+from .csi_network_metrics import ORIGIN_ATTRIBUTE
+
+
+class CsiWmsCapabilities(QtCore.QObject):
+    """
+        Persistent cache of the WMS GetCapabilities documents, by service endpoint and user (the layers published to
+        each user may differ), shared by all the WMS added in the session. Each document is downloaded once every
+        'max_age' seconds and the names of the published layers are kept in the index, so that the requested layers
+        can be checked before building the layer. A layer missing in the cached document may have been published
+        later: the document is downloaded again ('refresh') before rejecting it.
+        The cached document is also inserted in the QGIS network cache under the URL requested by the QGIS WMS
+        provider, which reads it from there instead of downloading it again.
+    """
+
+    INDEX_FILE_NAME = "index.json"
+
+    # Seconds a failed download is not retried: meanwhile the WMS are added without checking the layers
+    FAILURE_RETRY_DELAY = 60
+
+    # Seconds a document is not downloaded again for the layers missing in it
+    REFRESH_DELAY = 60
+
+    # The GetMap parameters set by the QGIS WMS provider: found in the query string of a WMS URL, they are removed
+    # from the endpoint URL (the provider would send them twice). The other ones (i.e. vendor parameters such as map
+    # files, tokens or tiling hints) are kept in the endpoint URL, which the provider extends with its parameters
+    REQUEST_PARAMETERS = ("service", "request", "version", "layers", "styles", "format", "crs", "srs", "bbox", "width",
+                          "height", "transparent", "bgcolor", "exceptions")
+
+    def __init__(self, network_access_manager, cache_dir, max_age, parent=None):
+        """
+            Load the cache index from the given directory.
+            :param network_access_manager: The network access manager downloading the documents
+            :type network_access_manager: QNetworkAccessManager
+            :param cache_dir: The cache directory
+            :type cache_dir: str
+            :param max_age: The seconds a document is used without downloading it again, 0 for disabling the cache
+            :type max_age: int
+            :param parent: The parent object
+            :type parent: QObject
+        """
+        super(CsiWmsCapabilities, self).__init__(parent)
+        self.network_access_manager = network_access_manager
+        self.cache_dir = cache_dir
+        self.max_age = max_age
+        self.index_file_path = os.path.join(cache_dir, self.INDEX_FILE_NAME)
+        self.entries = csi_utils.load_json_file(self.index_file_path, default={})
+        # The callbacks waiting for the documents being downloaded, by cache key
+        self.pending = {}
+        # The time of the last failed download, by cache key
+        self.failures = {}
+        # The cache key of the document inserted in the QGIS network cache in this session, by endpoint
+        self.published = {}
+
+    @staticmethod
+    def split_url(url):
+        """
+            Split a WMS URL in the endpoint URL, keeping the vendor parameters of the query string as they are, and the
+            WMS request parameters of the query string.
+            :param url: The WMS URL
+            :type url: str
+            :return: The endpoint URL, ending with '?' or '&', and the request parameters by lower case name
+            :rtype: tuple of (str, dict)
+        """
+        scheme, netloc, path, query, fragment = urlsplit(url.strip())
+        vendor_parameters = []
+        request_parameters = {}
+        for parameter in query.split("&"):
+            if not parameter:
+                continue
+            name, _, value = parameter.partition("=")
+            name = unquote_plus(name).strip().lower()
+            if name in CsiWmsCapabilities.REQUEST_PARAMETERS:
+                request_parameters[name] = unquote_plus(value)
+            else:
+                # The original encoding is kept, the server may be picky about it (e.g. signed tokens)
+                vendor_parameters.append(parameter)
+        endpoint_url = urlunsplit((scheme, netloc, path, "", "")) + "?"
+        if vendor_parameters:
+            endpoint_url += "&".join(vendor_parameters) + "&"
+        return endpoint_url, request_parameters
+
+    @staticmethod
+    def get_capabilities_url(url):
+        """
+            Build the GetCapabilities URL of the endpoint, the same requested by the QGIS WMS provider.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :return: The GetCapabilities URL
+            :rtype: str
+        """
+        if "?" not in url:
+            url += "?"
+        elif not url.endswith("?") and not url.endswith("&"):
+            url += "&"
+        return url + "SERVICE=WMS&REQUEST=GetCapabilities"
+
+    @staticmethod
+    def parse_layer_names(content):
+        """
+            Retrieve the names of the layers published in the GetCapabilities document.
+            :param content: The document
+            :type content: bytes
+            :return: The layer names or None if the content is not a WMS GetCapabilities document
+            :rtype: list of str
+        """
+        try:
+            root = ElementTree.fromstring(content)
+        except ElementTree.ParseError:
+            return None
+
+        # The tags are compared without the namespace, which is missing before the WMS 1.3.0
+        if root.tag.split("}")[-1] not in ("WMS_Capabilities", "WMT_MS_Capabilities"):
+            return None
+
+        layer_names = []
+        for element in root.iter():
+            if element.tag.split("}")[-1] != "Layer":
+                continue
+            for child in element:
+                if child.tag.split("}")[-1] == "Name" and child.text and child.text.strip():
+                    layer_names.append(child.text.strip())
+        return layer_names
+
+    @staticmethod
+    def get_missing_layers(entry, layer_names):
+        """
+            Retrieve the requested layers not published by the service.
+            :param entry: The cache entry of the service
+            :type entry: dict
+            :param layer_names: The requested layer names
+            :type layer_names: list of str
+            :return: The layer names missing in the GetCapabilities document
+            :rtype: list of str
+        """
+        published = set(entry["layers"])
+        return [layer_name for layer_name in layer_names if layer_name not in published]
+
+    @staticmethod
+    def get_key(url, user):
+        """
+            Retrieve the cache key of the document of the endpoint for the user.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :param user: The user the document is requested for, empty if anonymous
+            :type user: str
+            :return: The key
+            :rtype: str
+        """
+        return "{} {}".format(user, url) if user else url
+
+    def get_content_file_path(self, key):
+        """
+            Retrieve the path of the cached document.
+            :param key: The cache key
+            :type key: str
+            :return: The file path
+            :rtype: str
+        """
+        return os.path.join(self.cache_dir, hashlib.sha1(key.encode("utf-8")).hexdigest() + ".xml")
+
+    def lookup(self, url, user=""):
+        """
+            Retrieve the entry of the endpoint for the user, in case its document is still fresh.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :param user: The user the document is requested for, empty if anonymous
+            :type user: str
+            :return: The entry or None
+            :rtype: dict
+        """
+        key = self.get_key(url, user)
+        entry = self.entries.get(key)
+        if entry is None or time.time() - entry["fetched"] >= self.max_age or \
+                not os.path.isfile(self.get_content_file_path(key)):
+            return None
+
+        return entry
+
+    def needs_refresh(self, entry, layer_names):
+        """
+            Check if the document must be downloaded again before rejecting the requested layers, because some of
+            them are missing and it was not downloaded in the last 'REFRESH_DELAY' seconds.
+            :param entry: The cache entry of the service, could be None
+            :type entry: dict
+            :param layer_names: The requested layer names
+            :type layer_names: list of str
+            :return: True if the document must be downloaded again
+            :rtype: bool
+        """
+        return entry is not None and time.time() - entry["fetched"] >= self.REFRESH_DELAY and \
+            len(self.get_missing_layers(entry, layer_names)) > 0
+
+    def request(self, url, callback, headers=None, user="", refresh=False):
+        """
+            Retrieve the entry of the endpoint, downloading its document if missing or stale. The callback is invoked
+            immediately when the entry is available (or the cache disabled), otherwise once the download ends.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :param callback: The function invoked with the entry, None if not available
+            :type callback: function
+            :param headers: The additional request headers (e.g. Authorization)
+            :type headers: dict
+            :param user: The user the document is requested for, empty if anonymous
+            :type user: str
+            :param refresh: True for downloading the document even if the cached one is fresh
+            :type refresh: bool
+        """
+        if self.max_age <= 0:
+            callback(None)
+            return
+
+        key = self.get_key(url, user)
+        entry = None if refresh else self.lookup(url, user)
+        if entry is not None:
+            # The document loaded from the previous sessions (or for another user) is offered to the QGIS WMS
+            # provider too
+            if self.published.get(url) != key:
+                self.publish(url, key, entry)
+            callback(entry)
+            return
+
+        if time.time() - self.failures.get(key, 0) < self.FAILURE_RETRY_DELAY:
+            callback(None)
+            return
+
+        # The document is already being downloaded
+        if key in self.pending:
+            self.pending[key].append(callback)
+            return
+
+        self.pending[key] = [callback]
+        request = QtNetwork.QNetworkRequest(QUrl(self.get_capabilities_url(url)))
+        request.setAttribute(ORIGIN_ATTRIBUTE, "wms_capabilities")
+        # The document published in the QGIS network cache must not answer the request
+        request.setAttribute(QtNetwork.QNetworkRequest.CacheLoadControlAttribute,
+                             QtNetwork.QNetworkRequest.AlwaysNetwork)
+        for header, value in (headers or {}).items():
+            request.setRawHeader(header.encode("utf-8"), value.encode("utf-8"))
+        reply = self.network_access_manager.get(request)
+        reply.finished.connect(lambda: self.slot_finished(url, key, reply))
+
+    def request_all(self, urls, callback, headers=None, user="", refresh=False):
+        """
+            Retrieve the entries of the endpoints, invoking the callback once all are available.
+            :param urls: The WMS endpoint URLs
+            :type urls: list of str
+            :param callback: The function invoked without arguments once every entry is available
+            :type callback: function
+            :param headers: The additional request headers (e.g. Authorization)
+            :type headers: dict
+            :param user: The user the documents are requested for, empty if anonymous
+            :type user: str
+            :param refresh: True for downloading the documents even if the cached ones are fresh
+            :type refresh: bool
+        """
+        pending_urls = set(urls)
+        if len(pending_urls) == 0:
+            callback()
+            return
+
+        def slot_entry(url):
+            pending_urls.discard(url)
+            if len(pending_urls) == 0:
+                callback()
+
+        for url in list(pending_urls):
+            self.request(url, lambda entry, url=url: slot_entry(url), headers, user, refresh)
+
+    def slot_finished(self, url, key, reply):
+        """
+            Store the downloaded document and invoke the waiting callbacks.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :param key: The cache key
+            :type key: str
+            :param reply: The reply
+            :type reply: QNetworkReply
+        """
+        reply.deleteLater()
+        entry = None
+        if reply.error() == QtNetwork.QNetworkReply.NoError:
+            content = bytes(reply.readAll())
+            layer_names = self.parse_layer_names(content)
+            if layer_names is not None:
+                entry = self.store(url, key, content, layer_names)
+
+        if entry is None:
+            self.failures[key] = time.time()
+
+        for callback in self.pending.pop(key, []):
+            callback(entry)
+
+    def store(self, url, key, content, layer_names):
+        """
+            Store the document of the endpoint.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :param key: The cache key
+            :type key: str
+            :param content: The document
+            :type content: bytes
+            :param layer_names: The names of the published layers
+            :type layer_names: list of str
+            :return: The entry
+            :rtype: dict
+        """
+        if not os.path.exists(self.cache_dir):
+            os.makedirs(self.cache_dir)
+
+        content_file_path = self.get_content_file_path(key)
+        with open(content_file_path + ".tmp", "wb") as f:
+            f.write(content)
+        os.replace(content_file_path + ".tmp", content_file_path)
+
+        entry = {"size": len(content), "layers": layer_names, "fetched": time.time()}
+        self.entries[key] = entry
+        self.failures.pop(key, None)
+        self.save()
+        self.publish(url, key, entry, content)
+        return entry
+
+    def publish(self, url, key, entry, content=None):
+        """
+            Insert the document in the QGIS network cache under the GetCapabilities URL of the QGIS WMS provider,
+            expiring with the entry. The provider prefers the cached document to the network.
+            :param url: The WMS endpoint URL
+            :type url: str
+            :param key: The cache key
+            :type key: str
+            :param entry: The entry
+            :type entry: dict
+            :param content: The document, read from the cache directory if not given
+            :type content: bytes
+        """
+        self.published[url] = key
+        cache = QgsNetworkAccessManager.instance().cache()
+        if cache is None:
+            return
+
+        if content is None:
+            try:
+                with open(self.get_content_file_path(key), "rb") as f:
+                    content = f.read()
+            except OSError:
+                return
+
+        meta_data = QtNetwork.QNetworkCacheMetaData()
+        meta_data.setUrl(QUrl(self.get_capabilities_url(url)))
+        meta_data.setSaveToDisk(True)
+        meta_data.setLastModified(QDateTime.fromMSecsSinceEpoch(int(entry["fetched"] * 1000)))
+        meta_data.setExpirationDate(QDateTime.fromMSecsSinceEpoch(int((entry["fetched"] + self.max_age) * 1000)))
+        meta_data.setRawHeaders([(QByteArray(b"Content-Type"), QByteArray(b"text/xml")),
+                                 (QByteArray(b"Content-Length"), QByteArray(str(len(content)).encode("ascii")))])
+        meta_data.setAttributes({QtNetwork.QNetworkRequest.HttpStatusCodeAttribute: 200,
+                                 QtNetwork.QNetworkRequest.HttpReasonPhraseAttribute: QByteArray(b"OK")})
+        device = cache.prepare(meta_data)
+        if device is None:
+            return
+
+        device.write(content)
+        cache.insert(device)
+
+    def save(self):
+        """
+            Save the cache index.
+        """
+        csi_utils.save_json_file(self.index_file_path, self.entries)
@@ -34,19 +34,28 @@ The content of this file is based on
 """
 
 import os
+import base64
+import shutil
 import codecs
+import json
 from PyQt5.QtCore import QFileInfo
 from qgis.PyQt import QtCore
 from qgis.PyQt.QtGui import QDesktopServices
 from qgis.PyQt.QtWidgets import qApp, QMessageBox, QFileDialog
-from qgis.PyQt.QtCore import QUrl, QEventLoop
-from qgis.PyQt import QtNetwork
-from qgis.core import Qgis, QgsDataSourceUri, QgsRasterLayer, QgsProject, QgsVectorLayer, QgsApplication
+from qgis.PyQt.QtCore import QUrl
+from qgis import utils as qgis_utils
+from qgis.core import Qgis, QgsDataSourceUri, QgsLayerTreeLayer, QgsRasterLayer, QgsProject, QgsVectorLayer
 
 from . import csi_utils
 from .. import configuration
+from .csi_download_manager import CsiDownloadManager
+from .csi_layer_tasks import CsiLayerPipeline, CsiLayerSet, CsiLayerTask, LAYER_EVENT
+from .csi_logger import CsiLogger
+from .csi_package_index import CsiPackageIndex
+from .csi_qml_cache import CsiQmlCache
+from .csi_settings import CsiSettings
 from .csi_web_view import CsiWebView
-from .csi_atlante_wi_metadata import DialogMetadata
+from .csi_wms_capabilities import CsiWmsCapabilities
 
 
 class JsManager(QtCore.QObject):
@@ -64,12 +73,49 @@ class JsManager(QtCore.QObject):
         """
         super(JsManager, self).__init__()
         self.web_view = web_view
+        self.settings = CsiSettings.instance()
+        self.logger = CsiLogger()
         self.download_folder_path = ""
         self.session_password = ""
         self.session_user = ""
         self.load_configuration()
         self.dialog_metadata = None
         self.background_color = background_color
+        self.download_manager = CsiDownloadManager(self.web_view.page().networkAccessManager(), self)
+        self.qml_cache = CsiQmlCache(
+            self.settings.value("CSIAtlanteWI/qml_cache_dir",
+                                default=csi_utils.get_plugin_data_dir("qml"), value_type=str),
+            self.settings.value("CSIAtlanteWI/qml_cache_max_age",
+                                default=configuration.QML_CACHE_MAX_AGE, value_type=int),
+            self.settings.value("CSIAtlanteWI/qml_cache_max_size",
+                                default=configuration.QML_CACHE_MAX_SIZE, value_type=int))
+
+        # The WMS GetCapabilities documents, shared by all the WMS
+        self.wms_capabilities = CsiWmsCapabilities(
+            self.web_view.page().networkAccessManager(),
+            self.settings.value("CSIAtlanteWI/wms_capabilities_dir",
+                                default=csi_utils.get_plugin_data_dir("wms"), value_type=str),
+            self.settings.value("CSIAtlanteWI/wms_capabilities_max_age",
+                                default=configuration.WMS_CAPABILITIES_MAX_AGE, value_type=int), self)
+
+        # Building the layers in background
+        self.layer_pipeline = CsiLayerPipeline(
+            self.settings.value("CSIAtlanteWI/layer_tasks", default=configuration.LAYER_TASKS, value_type=bool), self)
+
+        # Notifying the page about the offline mode switches
+        network_access_manager = self.web_view.page().networkAccessManager()
+        if hasattr(network_access_manager, "offline_changed"):
+            network_access_manager.offline_changed.connect(
+                lambda offline: self.notify_page("qgis:offline", {"offline": offline}))
+
+    def is_offline(self):
+        """
+            Check if the plugin is in the offline mode, in which the operations requiring the network are not
+            available.
+            :return: True in the offline mode
+            :rtype: bool
+        """
+        return bool(getattr(self.web_view.page().networkAccessManager(), "offline", False))
 
     def show_message(self, title, message):
         """
@@ -81,6 +127,19 @@ class JsManager(QtCore.QObject):
         """
         QMessageBox.information(None, title, message)
 
+    def notify_page(self, event_name, detail):
+        """
+            Dispatch a DOM CustomEvent on the AtlanteWI page, so that its Javascript can react to the operations
+            completed in background.
+            :param event_name: The event name (e.g. qgis:download)
+            :type event_name: str
+            :param detail: The event data, which must be JSON serializable
+            :type detail: dict
+        """
+        js_script = "document.dispatchEvent(new CustomEvent({0}, {{detail: {1}}}));".format(json.dumps(event_name),
+                                                                                          json.dumps(detail))
+        self.web_view.page().mainFrame().evaluateJavaScript(js_script)
+
     @QtCore.pyqtSlot(str, str)
     def showMessageJS(self, title, message):
         """
@@ -93,6 +152,18 @@ class JsManager(QtCore.QObject):
         """
         self.show_message(title, message)
 
+    @QtCore.pyqtSlot(result=bool)
+    def isOffline(self):
+        """
+            # Slot for exposing the same-name function to Javascript. #
+            Check if the plugin is in the offline mode: the page is loaded from the local snapshot and only the
+            packages, the *.qml files and the projects already available locally can be used.
+            The page is notified about the mode switches through the 'qgis:offline' event.
+            :return: True in the offline mode
+            :rtype: bool
+        """
+        return self.is_offline()
+
     @QtCore.pyqtSlot(result=str)
     def getColorBG(self):
         """
@@ -208,15 +279,15 @@ class JsManager(QtCore.QObject):
         self.session_user = user
 
         # Prompt the user for storing the credential in case they differs from the previous configured
-        old_password = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/password", default="", value_type=str)
-        old_user = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/user", default="", value_type=str)
+        old_password = self.settings.value("CSIAtlanteWI/password", default="", value_type=str)
+        old_user = self.settings.value("CSIAtlanteWI/user", default="", value_type=str)
         if password != old_password or user != old_user:
             user_reply = QMessageBox.question(None, 'Salvare la password?',
                                               'Si desidera salvare la password per accedere in automatico al plugin?',
                                               QMessageBox.Yes, QMessageBox.No)
             if user_reply == QMessageBox.Yes:
-                csi_utils.set_qgs_settings_value("CSIAtlanteWI/password", password)
-                csi_utils.set_qgs_settings_value("CSIAtlanteWI/user", user)
+                self.settings.set_value("CSIAtlanteWI/password", password)
+                self.settings.set_value("CSIAtlanteWI/user", user)
 
         # Invoke
         js_script = "submitUser('', false, 'INFO');"
@@ -249,7 +320,7 @@ class JsManager(QtCore.QObject):
             # Slot for exposing the same-name function to Javascript. #
             Retrieve the password from settings and execut Javascript code to set in that scope.
         """
-        password = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/password", default="", value_type=str)
+        password = self.settings.value("CSIAtlanteWI/password", default="", value_type=str)
         # Executing Javascript for storing the password
         js_script = "setPassword('{0}', false, 'INFO');".format(password)
         self.web_view.page().mainFrame().evaluateJavaScript(js_script)
@@ -260,7 +331,7 @@ class JsManager(QtCore.QObject):
             # Slot for exposing the same-name function to Javascript. #
             Retrieve the user from settings and execute Javascript code to set in that scope.
         """
-        user = csi_utils.get_qgs_settings_value_or_default("CSIAtlanteWI/user", default="", value_type=str)
+        user = self.settings.value("CSIAtlanteWI/user", default="", value_type=str)
         # Executing Javascript for storing the user
         js_script = "setUser('{0}', false, 'INFO');".format(user)
         self.web_view.page().mainFrame().evaluateJavaScript(js_script)
@@ -285,14 +356,14 @@ class JsManager(QtCore.QObject):
             :type url_metadata: str
         """
         if self.dialog_metadata is None:
+            # The dialog module is imported on the first use
+            from .csi_atlante_wi_metadata import DialogMetadata
             self.dialog_metadata = DialogMetadata()
 
         self.dialog_metadata.set_title(layer_name)
         self.dialog_metadata.set_url(url_metadata)
 
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('showMetadataDialog: {} {}'.format(layer_name, url_metadata),
-                              tag=configuration.LOGGER_TAG, level=Qgis.Info)
+        self.logger.info("showMetadataDialog: {} {}", layer_name, url_metadata)
         self.dialog_metadata.exec()
 
     @QtCore.pyqtSlot(str, str)
@@ -305,9 +376,7 @@ class JsManager(QtCore.QObject):
             :param url_metadata: The URL for the metadata to show
             :type url_metadata: str
         """
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('showMetadata: {} {}'.format(layer_name, url_metadata),
-                              tag=configuration.LOGGER_TAG, level=Qgis.Info)
+        self.logger.info("showMetadata: {} {}", layer_name, url_metadata)
         QDesktopServices.openUrl(QUrl(url_metadata))
 
     @QtCore.pyqtSlot(result=str)
@@ -345,114 +414,191 @@ class JsManager(QtCore.QObject):
         self.save_configuration()
 
     @QtCore.pyqtSlot(str, str, str, str, str, str)
-    def addWms(self, wms_name, url, layers, mime_type, epsg_code, protocol):
+    def addWms(self, wms_name, url, layers, mime_type, epsg_code, protocol, layer_set=None):
         """
             # Slot for exposing the same-name function to Javascript. #
             Adding the WMS to the QGis TOC.
             :param wms_name: The WMS name to add in TOC as group
             :type wms_name: str
-            :param url: The WMS URL
+            :param url: The WMS URL. The vendor parameters of its query string (e.g. map, token, tiled) are sent with
+            every request, the WMS ones (e.g. LAYERS, FORMAT, CRS) are used when the arguments miss them
             :type url: str
-            :param layers: The list of the WMS layers to add
-            :type layers: list of str
+            :param layers: The WMS layers to add, separated by comma. They are requested together in a single GetMap,
+            unless the CSIAtlanteWI/wms_split_layers setting is enabled
+            :type layers: str
             :param mime_type: The image MIME TYPE (e.g. image/png)
             :type mime_type: str
             :param epsg_code: The EPSG code (e.g. the number 32632)
             :type epsg_code: int
             :param protocol: The protocol (i.e. should be 'ba' for applying basic authentication). Not yet managed.
             :type protocol: str
+            :param layer_set: The set collecting the layer, instead of adding it to the QGis TOC once built
+            :type layer_set: CsiLayerSet
         """
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('addWms: wms_name = {}'.format(wms_name), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: url = {}'.format(url), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: layers = {}'.format(layers), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: mime_type = {}'.format(mime_type), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: epsg_code = {}'.format(epsg_code), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: protocol = {}'.format(protocol), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
+        # The WMS request parameters in the query string of the URL are used when the arguments miss them, the vendor
+        # parameters are kept in the endpoint URL
+        endpoint_url, url_parameters = CsiWmsCapabilities.split_url(url)
+
+        # The layers requested, separated by comma
+        layers_list = [layer.strip() for layer in (layers or url_parameters.get("layers", "")).split(",")
+                       if layer.strip()]
+
+        # On request, each layer is added separately (i.e. composed by QGIS rather than by the server)
+        if len(layers_list) > 1 and self.settings.value("CSIAtlanteWI/wms_split_layers",
+                                                        default=configuration.WMS_SPLIT_LAYERS, value_type=bool):
+            self.add_wms_split(wms_name, url, layers_list, mime_type, epsg_code, protocol, layer_set)
+            return
+
+        record = self.logger.operation("addWms")
+        record.add("wms_name", wms_name)
+        record.add("url", url)
+        record.add("layers", layers)
+        record.add("mime_type", mime_type)
+        record.add("epsg_code", epsg_code)
+        record.add("protocol", protocol)
 
         # For storing the URI data
         uri = QgsDataSourceUri()
 
-        # Split the host with the request data
-        pieces = url.split("?")
-        if len(pieces) == 1:
-            qgs_logger.logMessage('len(pieces) == 1', tag=configuration.LOGGER_TAG, level=Qgis.Info)
-        elif len(pieces) == 2:
-            qgs_logger.logMessage('len(pieces) == 2', tag=configuration.LOGGER_TAG, level=Qgis.Info)
-            # Overriding the URL
-            url = "{}{}".format(pieces[0], "?")
-            parameters_values = pieces[1].split("=")
-            if len(parameters_values) == 2:
-                qgs_logger.logMessage('len(parameters) == 2', tag=configuration.LOGGER_TAG, level=Qgis.Info)
-                uri.setParam(parameters_values[0], parameters_values[1])
-                qgs_logger.logMessage('uri.param({}): {}'.format(parameters_values[0], uri.param(parameters_values[0])),
-                                      tag=configuration.LOGGER_TAG, level=Qgis.Info)
-            else:
-                qgs_logger.logMessage('len(p) != 2', tag=configuration.LOGGER_TAG, level=Qgis.Info)
-        else:
-            qgs_logger.logMessage('len(pieces) > 2 Not yet managed!', tag=configuration.LOGGER_TAG, level=Qgis.Warning)
+        # Setting the endpoint URL to the URI: the QGIS WMS provider appends its parameters to the vendor ones
+        uri.setParam("url", endpoint_url)
+        record.add("endpoint_url", endpoint_url)
+        if url_parameters:
+            record.add("url_parameters", url_parameters)
 
-        # Setting the URL to the URI
-        uri.setParam("url", url)
+        # Styles seems required (https://gis.stackexchange.com/questions/183485/load-wms-with-pyqgis): an entry for
+        # each layer, empty for its default style
+        styles_list = url_parameters.get("styles", "").split(",")
+        if len(styles_list) != len(layers_list):
+            styles_list = [""] * len(layers_list)
 
-        # Process the layers accordingly if just an element or a list of elements
-        layers_list = []
-        if "," in layers:
-            layers_list = layers.split(",")
+        if epsg_code:
+            crs = "EPSG:{}".format(epsg_code)
         else:
-            layers_list.append(layers)
-
-        # Setting the parameter 'layers' in the URI
-        for val in layers_list:
-            uri.setParam("layers", val)
+            crs = url_parameters.get("crs", url_parameters.get("srs", ""))
 
-        # Setting the other parameters
-        # Styles seems required: https://gis.stackexchange.com/questions/183485/load-wms-with-pyqgis
-        uri.setParam("styles", "")
-        uri.setParam("format", mime_type)
-        uri.setParam("crs", "EPSG:{}".format(epsg_code))
+        # All the layers are set in a single source, so that the server composes them in one GetMap request
+        uri.setParam("layers", layers_list)
+        uri.setParam("styles", styles_list)
+        uri.setParam("format", mime_type or url_parameters.get("format", ""))
+        uri.setParam("crs", crs)
 
         # https://docs.qgis.org/3.4/en/docs/pyqgis_developer_cookbook/loadlayer.html#raster-layers
         # Ignore GetCoverage URL advertised by GetCapabilities. May be necessary if a server is not configured properly.
         uri.setParam("IgnoreGetMapUrl", "1")
 
         # Adding the parameters for the basic authentication
-        qgs_logger.logMessage('Applying Basic-Authentication', tag=configuration.LOGGER_TAG, level=Qgis.Info)
         uri.setParam("username", self.session_user)
         uri.setParam("password", self.session_password)
 
-        # Logging the parameters for debugging
-        qgs_logger.logMessage('uri.param(url): {}'.format(uri.param("url")), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('uri.param(layers): {}'.format(uri.param("layers")), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('uri.param(format): {}'.format(uri.param("format")), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('uri.param(crs): {}'.format(uri.param("crs")), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('uri.service(): {}'.format(uri.service()), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('encodedUri: {}'.format(str(uri.encodedUri())), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('uri.uri(): {}'.format(uri.uri()), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-
-        # Generating the WMS layer
-        wms_layer = QgsRasterLayer(str(uri.encodedUri()), wms_name, 'wms')
-
-        # If the WMS is correctly generated, add to the QGis TOC
-        if wms_layer.isValid():
-            QgsProject.instance().addMapLayer(wms_layer)
-        else:
-            qgs_logger.logMessage('Impossibile aggiungere il WMS: {}'.format(wms_name), tag=configuration.LOGGER_TAG,
-                                  level=Qgis.Warning)
-            self.show_message("Attenzione!", "Impossibile aggiungere il WMS " + wms_name + " al progetto")
+        # The URI is formatted only in case the record is written
+        encoded_uri = str(uri.encodedUri())
+        record.add("uri", uri.uri)
+
+        # The requested layers are checked against the capabilities of the service, downloaded once per endpoint
+        self.wms_capabilities.request(
+            endpoint_url, lambda capabilities: self.slot_wms_capabilities(capabilities, wms_name, endpoint_url,
+                                                                          encoded_uri, layers_list, record, layer_set),
+            self.get_authorization_headers(), self.session_user)
+
+    def add_wms_split(self, wms_name, url, layers_list, mime_type, epsg_code, protocol, layer_set=None):
+        """
+            Add each layer of the WMS as a separate raster layer, in a group named after the WMS. The layers are
+            added together once all are built.
+            :param wms_name: The WMS name, used for the group
+            :type wms_name: str
+            :param url: The WMS URL
+            :type url: str
+            :param layers_list: The WMS layers
+            :type layers_list: list of str
+            :param mime_type: The image MIME TYPE (e.g. image/png)
+            :type mime_type: str
+            :param epsg_code: The EPSG code (e.g. the number 32632)
+            :type epsg_code: int
+            :param protocol: The protocol
+            :type protocol: str
+            :param layer_set: The set collecting the layers (without the group), if any
+            :type layer_set: CsiLayerSet
+        """
+        endpoint_url = CsiWmsCapabilities.split_url(url)[0]
+
+        def add_layers(capabilities, refreshed=False):
+            # The layers missing in the cached document may have been published later: it is downloaded again, unless
+            # the set has already checked it
+            if layer_set is None and not refreshed and self.wms_capabilities.needs_refresh(capabilities, layers_list):
+                self.wms_capabilities.request(endpoint_url, lambda entry: add_layers(entry, True),
+                                              self.get_authorization_headers(), self.session_user, True)
+                return
+
+            wms_set = layer_set
+            if wms_set is None:
+                wms_set = CsiLayerSet(self.layer_pipeline, lambda s: self.slot_layer_set_built(wms_name, s))
+            for layer in layers_list:
+                self.addWms(layer, url, layer, mime_type, epsg_code, protocol, wms_set)
+            if layer_set is None:
+                wms_set.start()
+
+        # Once the capabilities are available, the layers are checked and collected in the set right away
+        self.wms_capabilities.request(endpoint_url, add_layers, self.get_authorization_headers(), self.session_user)
+
+    def slot_wms_capabilities(self, capabilities, wms_name, endpoint_url, encoded_uri, layers_list, record, layer_set,
+                              refreshed=False):
+        """
+            Build the WMS layer once the capabilities of the service are available, unless the service doesn't
+            publish the requested layers. The layers missing in the cached document are checked again against the
+            document downloaded from the service, since they may have been published later.
+            :param capabilities: The capabilities cache entry of the service, None if not available
+            :type capabilities: dict
+            :param wms_name: The WMS name
+            :type wms_name: str
+            :param endpoint_url: The WMS endpoint URL
+            :type endpoint_url: str
+            :param encoded_uri: The layer data source URI
+            :type encoded_uri: str
+            :param layers_list: The requested layers
+            :type layers_list: list of str
+            :param record: The log record of the operation
+            :type record: CsiLogRecord
+            :param layer_set: The set collecting the layer, if any. Its documents are already checked again
+            :type layer_set: CsiLayerSet
+            :param refreshed: True in case the document has just been downloaded again
+            :type refreshed: bool
+        """
+        failure_message = "Impossibile aggiungere il WMS " + wms_name + " al progetto"
+
+        if layer_set is None and not refreshed and self.wms_capabilities.needs_refresh(capabilities, layers_list):
+            record.add("capabilities", "refresh")
+            self.wms_capabilities.request(
+                endpoint_url, lambda entry: self.slot_wms_capabilities(entry, wms_name, endpoint_url, encoded_uri,
+                                                                       layers_list, record, layer_set, True),
+                self.get_authorization_headers(), self.session_user, True)
+            return
+
+        if capabilities is not None:
+            missing_layers = self.wms_capabilities.get_missing_layers(capabilities, layers_list)
+            if len(missing_layers) > 0:
+                record.add("missing_layers", missing_layers)
+                record.raise_level(Qgis.Warning)
+                record.emit()
+                self.reject_layer(wms_name, failure_message + "\nLayer non pubblicati dal servizio: " +
+                                  ", ".join(missing_layers), layer_set)
+                return
+
+        # Generating the WMS layer in background, it is added to the QGis TOC once valid
+        self.build_layer(CsiLayerTask(wms_name, encoded_uri, 'wms', raster=True), record, failure_message, layer_set)
+
+    def get_authorization_headers(self):
+        """
+            Retrieve the headers for the basic authentication with the session credentials, as sent by the QGIS
+            WMS provider.
+            :return: The request headers
+            :rtype: dict
+        """
+        if not self.session_user:
+            return {}
+
+        credentials = "{}:{}".format(self.session_user, self.session_password).encode("utf-8")
+        return {"Authorization": "Basic " + base64.b64encode(credentials).decode("ascii")}
 
     @QtCore.pyqtSlot(str, str, str, str)
     def addWfsQML(self, name, url, data, qml_url):
@@ -478,11 +624,11 @@ class JsManager(QtCore.QObject):
             return False
 
         qml_file_name = self.get_qml_file_name(qml_url)
-        qml_file_path = self.download_qml(qml_url, qml_file_name)
-        self.addWfs(name, url, layer, epsg_code, qml_file_path)
+        self.download_qml(qml_url, qml_file_name,
+                          lambda qml_file_path: self.addWfs(name, url, layer, epsg_code, qml_file_path), "addWfsQML")
 
     @QtCore.pyqtSlot(str, str, str, str, str)
-    def addWfs(self, name, url, layer, epsg_code, qml_file_path):
+    def addWfs(self, name, url, layer, epsg_code, qml_file_path, layer_set=None):
         """
             # Slot for exposing the same-name function to Javascript. #
             Add the WFS to the QGis TOC.
@@ -496,10 +642,15 @@ class JsManager(QtCore.QObject):
             :type epsg_code: int
             :param qml_file_path: The *.qml file path
             :type qml_file_path: str
+            :param layer_set: The set collecting the layer, instead of adding it to the QGis TOC once built
+            :type layer_set: CsiLayerSet
         """
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('addWms: {} {} {} {} {}'.format(name, url, layer, epsg_code, qml_file_path),
-                              tag=configuration.LOGGER_TAG, level=Qgis.Info)
+        record = self.logger.operation("addWfs")
+        record.add("name", name)
+        record.add("url", url)
+        record.add("layer", layer)
+        record.add("epsg_code", epsg_code)
+        record.add("qml_file_path", qml_file_path)
 
         # Preparing the URI
         uri = QgsDataSourceUri()
@@ -508,15 +659,9 @@ class JsManager(QtCore.QObject):
         uri.setParam('srsname', "EPSG:" + str(epsg_code))
         uri.setParam('version', "auto")
 
-        # Instantiate
-        wfs_layer = QgsVectorLayer(uri.uri(), name, "WFS", QgsVectorLayer.LayerOptions(False))
-
-        # Add to map in case it is valid
-        if wfs_layer.isValid():
-            QgsProject.instance().addMapLayer(wfs_layer)
-            wfs_layer.loadNamedStyle(qml_file_path)
-        else:
-            self.show_message("Attenzione!", "Impossibile aggiungere il WFS " + name + " al progetto")
+        # Instantiate in background, the layer is added to the QGis TOC once valid
+        self.build_layer(CsiLayerTask(name, uri.uri(), "WFS", qml_file_path=qml_file_path, load_default_style=False),
+                         record, "Impossibile aggiungere il WFS " + name + " al progetto", layer_set)
 
     @QtCore.pyqtSlot(str, str)
     def apriFileLocale(self, name, local_file_path):
@@ -546,6 +691,9 @@ class JsManager(QtCore.QObject):
         """
             # Slot for exposing the same-name function to Javascript. #
             Open the remote file.
+            The download runs in background: the layer is added once the transfer ends and the page is notified
+            through the 'qgis:download' event. An interrupted download continues from the data already received.
+            A file already in the download folder is downloaded again only if the remote file changed.
             :param name: The name
             :type name: str
             :param url: The URL for accessing the remote file
@@ -556,41 +704,75 @@ class JsManager(QtCore.QObject):
         if not self.check_download_folder():
             return False
 
-        # Retrieving the file name from the URL
-        file_name = url.split("://")
-        file_name = file_name[len(file_name) - 1]
-        file_name = file_name.replace("/", "_")
-
         # The local path
-        local_file_path = os.path.join(self.download_folder_path, file_name)
+        local_file_path = os.path.join(self.download_folder_path, self.get_remote_file_name(url))
+
+        # Offline, only the local copy can be used
+        if self.is_offline():
+            if os.path.isfile(local_file_path):
+                self.notify_page("qgis:download", {"status": "completed", "name": name, "url": url,
+                                                   "path": local_file_path, "downloaded": False, "offline": True})
+                self.add_package_layer(name, local_file_path)
+            else:
+                self.show_message("Attenzione!", "Il pacchetto " + name + " non e' disponibile in modalita' offline")
+            return
 
-        # Check if already exists the file
-        to_download = True
-        if os.path.exists(local_file_path) and os.path.isfile(local_file_path):
-            reply = QMessageBox.question(None,
-                                         'Attenzione',
-                                         'file gia\' presente nella cartella di scarico. \nSovrascrivere?',
-                                         QMessageBox.Yes, QMessageBox.No)
-            if reply == QMessageBox.No:
-                to_download = False
-                reply = QMessageBox.question(None,
-                                             'Scarico del dato annullato',
-                                             'Caricare il dato presente in locale?',
+        # The same file is already being downloaded
+        if self.download_manager.is_downloading(local_file_path):
+            self.show_message("Attenzione!", "Il pacchetto " + name + " e' in fase di scarico")
+            return
+
+        # In case the file already exists, the request is conditional: the server sends it again only if changed
+        headers = CsiPackageIndex(self.download_folder_path).get_validation_headers(url, local_file_path)
+
+        # Download the file, the layer is added when the transfer ends
+        self.notify_page("qgis:download", {"status": "started", "name": name, "url": url})
+        self.download_manager.download(url, local_file_path,
+                                       lambda download: self.slot_package_downloaded(name, download),
+                                       headers=headers, resumable=True, origin="apriFileRemoto")
+
+    def slot_package_downloaded(self, name, download):
+        """
+            Add the downloaded package to the QGis TOC and notify the page about the download result.
+            :param name: The name
+            :type name: str
+            :param download: The finished download
+            :type download: CsiFileDownload
+        """
+        if not download.succeeded:
+            self.notify_page("qgis:download", {"status": "failed", "name": name, "url": download.url,
+                                               "message": download.error_message})
+            message = "Impossibile scaricare il pacchetto " + name + "\n" + download.error_message
+            if os.path.exists(download.part_file_path):
+                message += "\n\nRiprovando, lo scarico riprendera' dai dati gia' ricevuti."
+
+            # The local copy, if any, can't be verified but it is still usable
+            if os.path.isfile(download.local_file_path):
+                reply = QMessageBox.question(None, 'Attenzione', message + "\n\nCaricare il dato presente in locale?",
                                              QMessageBox.Yes, QMessageBox.No)
-                if reply == QMessageBox.No:
-                    return
-
-        # Download the file if marked to do so
-        if to_download:
-            request = QtNetwork.QNetworkRequest(QUrl(url))
-            reply = self.web_view.page().networkAccessManager().get(request)
-            evloop = QEventLoop()
-            reply.finished.connect(evloop.quit)
-            evloop.exec_()
-            response = bytearray(reply.readAll())
-            with open(local_file_path, "wb") as f:
-                f.write(response)
+                if reply == QMessageBox.Yes:
+                    self.add_package_layer(name, download.local_file_path)
+                return
+
+            self.show_message("Attenzione!", message)
+            return
+
+        # The downloaded file is tracked for the next conditional requests
+        if not download.not_modified:
+            CsiPackageIndex(self.download_folder_path).store(download)
 
+        self.notify_page("qgis:download", {"status": "completed", "name": name, "url": download.url,
+                                           "path": download.local_file_path, "downloaded": not download.not_modified})
+        self.add_package_layer(name, download.local_file_path)
+
+    def add_package_layer(self, name, local_file_path):
+        """
+            Add the local package to the QGis TOC.
+            :param name: The name
+            :type name: str
+            :param local_file_path: The package file path
+            :type local_file_path: str
+        """
         # Instantiate
         vector_layer = QgsVectorLayer(local_file_path, name, "ogr")
 
@@ -600,6 +782,259 @@ class JsManager(QtCore.QObject):
         else:
             self.show_message("Attenzione!", "Impossibile aggiungere il pacchetto " + name + " al progetto")
 
+    @QtCore.pyqtSlot(str)
+    def addLayerBatch(self, layers_json):
+        """
+            # Slot for exposing the same-name function to Javascript. #
+            Add a set of layers to the QGis TOC, see addLayerSet.
+            :param layers_json: The JSON list of the layer descriptors
+            :type layers_json: str
+        """
+        self.addLayerSet("", layers_json)
+
+    @QtCore.pyqtSlot(str, str)
+    def addLayerSet(self, group_name, layers_json):
+        """
+            # Slot for exposing the same-name function to Javascript. #
+            Add a set of layers to the QGis TOC at once. The *.qml files and the packages of all the layers are
+            downloaded concurrently, then the layers are built in background with their styles already applied and
+            added together, in the given order, with a single refresh of the TOC and of the map. The packages
+            already present in the download folder are downloaded again only if the remote file changed.
+            The page is notified of the progress and of the result through the 'qgis:batch' event.
+            :param group_name: The name of the TOC group containing the layers, empty for adding them to the root
+            :type group_name: str
+            :param layers_json: The JSON list of the layer descriptors. Each descriptor is an object with the 'type'
+            (one of: wms, wfs, tabella, pacchetto) and the parameters of addWms, addWfsQML, addTabellaQML or
+            apriFileRemoto respectively, by the same names.
+            :type layers_json: str
+        """
+        try:
+            descriptors = json.loads(layers_json)
+        except ValueError as e:
+            self.show_message("Attenzione!", "Elenco dei layer non valido\n" + str(e))
+            return
+        if not isinstance(descriptors, list):
+            self.show_message("Attenzione!", "Elenco dei layer non valido")
+            return
+
+        # Check the download folder
+        if not self.check_download_folder():
+            return
+
+        # Collecting the files to download
+        requests = []
+        package_index = CsiPackageIndex(self.download_folder_path)
+        for index, descriptor in enumerate(descriptors):
+            try:
+                layer_type = descriptor.get("type")
+                if layer_type in ("wfs", "tabella"):
+                    qml_url = descriptor["qml_url"]
+                    qml_file_path = os.path.join(self.download_folder_path, self.get_qml_file_name(qml_url))
+                    # Only the *.qml files missing in the cache or to revalidate are requested to the server
+                    entry = self.qml_cache.lookup(qml_url)
+                    if entry is None or not self.qml_cache.is_fresh(entry):
+                        requests.append((qml_url, self.qml_cache.get_download_file_path(qml_url),
+                                         self.qml_cache.get_validation_headers(entry), False))
+                    descriptor["qml_file_path"] = qml_file_path
+                elif layer_type == "pacchetto":
+                    url = descriptor["url"]
+                    local_file_path = os.path.join(self.download_folder_path, self.get_remote_file_name(url))
+                    requests.append((url, local_file_path,
+                                     package_index.get_validation_headers(url, local_file_path), True))
+                    descriptor["local_file_path"] = local_file_path
+            except (KeyError, TypeError, AttributeError):
+                # The invalid descriptor is reported as a failed layer of the set, the others are added anyway
+                name = descriptor.get("name", descriptor.get("wms_name", "")) if isinstance(descriptor, dict) else ""
+                self.logger.warning("addLayerSet: descrittore {} non valido: {}", index, descriptor)
+                descriptors[index] = {"type": "invalid", "name": name or "#{}".format(index + 1)}
+
+        # Offline, the layers are added with the local copies only
+        if self.is_offline():
+            requests = []
+
+        self.notify_page("qgis:batch", {"status": "started", "count": len(descriptors), "group": group_name})
+        self.download_manager.download_batch(
+            requests, lambda downloads: self.slot_layer_batch_downloaded(group_name, descriptors, downloads),
+            "addLayerBatch")
+
+    def slot_layer_batch_downloaded(self, group_name, descriptors, downloads):
+        """
+            Build the layers of the set in background, once all their files have been downloaded.
+            :param group_name: The name of the TOC group containing the layers, empty for the root
+            :type group_name: str
+            :param descriptors: The layer descriptors, as given to addLayerSet
+            :type descriptors: list of dict
+            :param downloads: The finished downloads
+            :type downloads: list of CsiFileDownload
+        """
+        qml_urls = [d["qml_url"] for d in descriptors if "qml_file_path" in d]
+        package_index = CsiPackageIndex(self.download_folder_path)
+
+        # Updating the *.qml cache and the packages index with the downloaded files
+        uncached_qml_files = {}
+        for download in downloads:
+            if download.not_modified:
+                self.qml_cache.mark_validated(download.url)
+            elif download.succeeded and download.url in qml_urls:
+                if not self.qml_cache.store(download.url, download.local_file_path, download.response_headers):
+                    uncached_qml_files[download.url] = download.local_file_path
+            elif download.succeeded:
+                package_index.store(download)
+
+        for descriptor in descriptors:
+            if "qml_file_path" in descriptor:
+                self.provide_qml(descriptor["qml_url"], descriptor["qml_file_path"],
+                                 uncached_qml_files.get(descriptor["qml_url"]))
+
+        # The capabilities of the WMS services are downloaded first, once per endpoint, so that each WMS layer is
+        # checked and collected in the set right away
+        wms_urls = [CsiWmsCapabilities.split_url(d["url"])[0] for d in descriptors
+                    if d.get("type") == "wms" and isinstance(d.get("url"), str)]
+        self.wms_capabilities.request_all(
+            wms_urls, lambda: self.refresh_layer_set_capabilities(group_name, descriptors),
+            self.get_authorization_headers(), self.session_user)
+
+    def refresh_layer_set_capabilities(self, group_name, descriptors):
+        """
+            Download again the capabilities of the WMS services whose cached document misses some layers of the set,
+            since they may have been published later, then build the layers of the set.
+            :param group_name: The name of the TOC group containing the layers, empty for the root
+            :type group_name: str
+            :param descriptors: The layer descriptors, as given to addLayerSet
+            :type descriptors: list of dict
+        """
+        refresh_urls = set()
+        for descriptor in descriptors:
+            if descriptor.get("type") != "wms" or not isinstance(descriptor.get("url"), str):
+                continue
+            endpoint_url, url_parameters = CsiWmsCapabilities.split_url(descriptor["url"])
+            layers = descriptor.get("layers") or url_parameters.get("layers", "")
+            if not isinstance(layers, str):
+                continue
+            layers_list = [layer.strip() for layer in layers.split(",") if layer.strip()]
+            if self.wms_capabilities.needs_refresh(self.wms_capabilities.lookup(endpoint_url, self.session_user),
+                                                   layers_list):
+                refresh_urls.add(endpoint_url)
+
+        self.wms_capabilities.request_all(refresh_urls, lambda: self.build_layer_set(group_name, descriptors),
+                                          self.get_authorization_headers(), self.session_user, True)
+
+    def build_layer_set(self, group_name, descriptors):
+        """
+            Build the layers of the set in background, adding them to the QGis TOC together once all are built.
+            :param group_name: The name of the TOC group containing the layers, empty for the root
+            :type group_name: str
+            :param descriptors: The layer descriptors, as given to addLayerSet
+            :type descriptors: list of dict
+        """
+        # The layers are collected in the set instead of being added one by one
+        layer_set = CsiLayerSet(self.layer_pipeline,
+                                lambda layer_set: self.slot_layer_set_built(group_name, layer_set),
+                                lambda layer_set, task: self.notify_page("qgis:batch", {
+                                    "status": "progress", "count": len(descriptors),
+                                    "built": len(layer_set.entries) - layer_set.pending, "group": group_name}))
+        for descriptor in descriptors:
+            name = descriptor.get("name", descriptor.get("wms_name", ""))
+            layer_type = descriptor.get("type")
+            try:
+                if layer_type == "wms":
+                    self.addWms(descriptor["wms_name"], descriptor["url"], descriptor["layers"],
+                                descriptor["mime_type"], descriptor["epsg_code"], descriptor.get("protocol", ""),
+                                layer_set)
+                elif layer_type == "wfs":
+                    data = descriptor["data"].split("|")
+                    self.addWfs(name, descriptor["url"], data[0], data[1], descriptor["qml_file_path"], layer_set)
+                elif layer_type == "tabella":
+                    port = descriptor["port"].split("|")
+                    table = descriptor["table"].split("|")
+                    self.add_postgres_layer(name, descriptor["host"], port[0], descriptor["database_name"],
+                                            descriptor["username"], descriptor["schema"], table[0],
+                                            descriptor["geom_col"], descriptor["id_col"], port[1],
+                                            descriptor["qml_file_path"], table[1], layer_set)
+                elif layer_type == "pacchetto":
+                    # In case the download failed, the local copy is used, if any
+                    if not os.path.isfile(descriptor["local_file_path"]):
+                        layer_set.add_failure(name)
+                        continue
+                    record = self.logger.operation("add_package_layer")
+                    record.add("name", name)
+                    record.add("local_file_path", descriptor["local_file_path"])
+                    layer_set.add(CsiLayerTask(name, descriptor["local_file_path"], "ogr"), record)
+                else:
+                    layer_set.add_failure(name)
+            except (KeyError, IndexError, TypeError, AttributeError):
+                layer_set.add_failure(name)
+
+        layer_set.start()
+
+    def slot_layer_set_built(self, group_name, layer_set):
+        """
+            Add the layers of the set built in background to the QGis TOC at once.
+            :param group_name: The name of the TOC group containing the layers, empty for the root
+            :type group_name: str
+            :param layer_set: The set
+            :type layer_set: CsiLayerSet
+        """
+        failed = list(layer_set.failed_names)
+        count = len(layer_set.entries) + len(failed)
+        layers = []
+        unstyled = []
+        for task, record in layer_set.entries:
+            if task.layer is not None:
+                layers.append(task.layer)
+                if task.style_error_message:
+                    record.add("style", task.style_error_message)
+                    record.raise_level(Qgis.Warning)
+                    unstyled.append(task.layer_name)
+            else:
+                record.add("result", task.error_message or "invalid layer")
+                record.raise_level(Qgis.Warning)
+                failed.append(task.layer_name)
+            record.emit()
+
+        self.add_map_layers(layers, group_name)
+
+        self.notify_page("qgis:batch", {"status": "completed", "count": count, "failed": failed, "group": group_name})
+        if len(failed) > 0:
+            self.show_message("Attenzione!", "Impossibile aggiungere al progetto i layer:\n" + "\n".join(failed))
+        if len(unstyled) > 0:
+            self.show_message("Attenzione!", "Stile non applicato ai layer:\n" + "\n".join(unstyled))
+
+    @staticmethod
+    def add_map_layers(layers, group_name=""):
+        """
+            Add the layers to the project with a single call, inserting them in the TOC at once and freezing the
+            map canvas meanwhile, so that the TOC and the map are refreshed once.
+            :param layers: The layers, in the order of addition (i.e. the last one is on top, as with addMapLayer)
+            :type layers: list of QgsMapLayer
+            :param group_name: The name of the TOC group containing the layers, created if missing. Empty for the root
+            :type group_name: str
+        """
+        if len(layers) == 0:
+            return
+
+        project = QgsProject.instance()
+        canvas = qgis_utils.iface.mapCanvas() if qgis_utils.iface is not None else None
+        if canvas is not None:
+            canvas.freeze(True)
+
+        try:
+            project.addMapLayers(layers, False)
+
+            # The nodes are inserted together, the last added layer on top
+            nodes = [QgsLayerTreeLayer(layer) for layer in reversed(layers)]
+            parent = project.layerTreeRoot()
+            if group_name:
+                group = parent.findGroup(group_name)
+                if group is None:
+                    group = parent.insertGroup(0, group_name)
+                parent = group
+            parent.insertChildNodes(0, nodes)
+        finally:
+            if canvas is not None:
+                canvas.freeze(False)
+                canvas.refresh()
+
     @QtCore.pyqtSlot(str, str, str, str, str, str, str, str, str, str)
     def addTabellaQML(self, name, host, port, database_name, username, schema, table, geom_col, id_col, qml_url):
         """
@@ -641,12 +1076,13 @@ class JsManager(QtCore.QObject):
 
         # Delegate
         file_name = self.get_qml_file_name(qml_url)
-        qml_file_path = self.download_qml(qml_url, file_name)
-        self.add_postgres_layer(name, host, port, database_name, username, schema, table, geom_col, id_col, ssl,
-                                qml_file_path, sql_filter)
+        self.download_qml(qml_url, file_name,
+                          lambda qml_file_path: self.add_postgres_layer(name, host, port, database_name, username,
+                                                                        schema, table, geom_col, id_col, ssl,
+                                                                        qml_file_path, sql_filter), "addTabellaQML")
 
     def add_postgres_layer(self, name, host, port, database_name, username, schema, table, geom_col, id_col, ssl,
-                           qml_file_path, sql_filter):
+                           qml_file_path, sql_filter, layer_set=None):
         """
             Add the database table in the QGis TOC and apply its associated QML.
             :param name: The name
@@ -674,34 +1110,22 @@ class JsManager(QtCore.QObject):
             :type qml_file_path: str
             :param sql_filter: The SQL where condition
             :type sql_filter: str
-        """
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('addWms: name = {}'.format(name), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: host = {}'.format(host), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: port = {}'.format(port), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: database_name = {}'.format(database_name), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: username = {}'.format(username), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: schema = {}'.format(schema), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: table = {}'.format(table), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: geom_col = {}'.format(geom_col), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: id_col = {}'.format(id_col), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: ssl = {}'.format(ssl), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: self.session_user = {}'.format(str(self.session_user)),
-                              tag=configuration.LOGGER_TAG, level=Qgis.Info)
-        qgs_logger.logMessage('addWms: qml_file_path = {}'.format(qml_file_path), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
-        qgs_logger.logMessage('addWms: sql_filter = {}'.format(sql_filter), tag=configuration.LOGGER_TAG,
-                              level=Qgis.Info)
+            :param layer_set: The set collecting the layer, instead of adding it to the QGis TOC once built
+            :type layer_set: CsiLayerSet
+        """
+        record = self.logger.operation("add_postgres_layer")
+        record.add("name", name)
+        record.add("host", host)
+        record.add("port", port)
+        record.add("database_name", database_name)
+        record.add("user", self.session_user)
+        record.add("schema", schema)
+        record.add("table", table)
+        record.add("geom_col", geom_col)
+        record.add("id_col", id_col)
+        record.add("ssl", ssl)
+        record.add("qml_file_path", qml_file_path)
+        record.add("sql_filter", sql_filter)
 
         uri = QgsDataSourceUri()
         ssl_mode = QgsDataSourceUri.SslAllow
@@ -725,26 +1149,111 @@ class JsManager(QtCore.QObject):
         else:
             uri.setDataSource(str(schema), str(table), str(geom_col), sql_filter, str(id_col))
 
-        # Instantiate
-        postgres_layer = QgsVectorLayer(uri.uri(), str(name), 'postgres')
+        # The details shown in case the layer is not valid
+        par = "\nhost: " + str(host)\
+            + "\nport: " + str(port)\
+            + "\ndbname: " + str(database_name)\
+            + "\nuser: " + str(self.session_user)\
+            + "\nssl: " + str(ssl)\
+            + "\nschema: " + str(schema)\
+            + "\ntable: " + str(table) \
+            + "\ngeom_col: " + str(geom_col) \
+            + "\nid_col: " + str(id_col) \
+            + "\npathQMLFile: " + str(qml_file_path) \
+            + "\nsqlFilter: " + str(sql_filter)
+
+        # Instantiate in background, the layer is added to the QGis TOC once valid
+        self.build_layer(CsiLayerTask(str(name), uri.uri(), 'postgres', qml_file_path=qml_file_path), record,
+                         "Impossibile aggiungere la tabella " + name + " al progetto.\n" + par, layer_set)
+
+    def build_layer(self, task, record, failure_message, layer_set=None):
+        """
+            Build the layer of the task in background and add it to the QGis TOC once valid. The page is notified
+            about the progress through the 'qgis:layer' event.
+            :param task: The task building the layer
+            :type task: CsiLayerTask
+            :param record: The log record of the operation, written once the task ends
+            :type record: CsiLogRecord
+            :param failure_message: The message shown in case the layer is not valid
+            :type failure_message: str
+            :param layer_set: The set collecting the task, which is run and added together with the others of the set
+            :type layer_set: CsiLayerSet
+        """
+        if layer_set is not None:
+            layer_set.add(task, record)
+            return
 
-        # In case the layer is valid, add to the QGis TOC
-        if postgres_layer.isValid():
-            QgsProject.instance().addMapLayer(postgres_layer)
-            postgres_layer.loadNamedStyle(qml_file_path)
-        else:
-            par = "\nhost: " + str(host)\
-                + "\nport: " + str(port)\
-                + "\ndbname: " + str(database_name)\
-                + "\nuser: " + str(self.session_user)\
-                + "\nssl: " + str(ssl)\
-                + "\nschema: " + str(schema)\
-                + "\ntable: " + str(table) \
-                + "\ngeom_col: " + str(geom_col) \
-                + "\nid_col: " + str(id_col) \
-                + "\npathQMLFile: " + str(qml_file_path) \
-                + "\nsqlFilter: " + str(sql_filter)
-            self.show_message("Attenzione!", "Impossibile aggiungere la tabella " + name + " al progetto.\n" + par)
+        self.notify_page(LAYER_EVENT, {"status": "started", "name": task.layer_name})
+        self.layer_pipeline.submit(task, lambda task: self.slot_layer_built(task, record),
+                                   lambda task: self.slot_layer_failed(task, record, failure_message),
+                                   self.slot_layer_progress)
+
+    def reject_layer(self, layer_name, failure_message, layer_set=None):
+        """
+            Notify the failure of a layer not built at all.
+            :param layer_name: The layer name
+            :type layer_name: str
+            :param failure_message: The message shown to the user
+            :type failure_message: str
+            :param layer_set: The set of the layer, which reports the failure together with the others, if any
+            :type layer_set: CsiLayerSet
+        """
+        if layer_set is not None:
+            layer_set.add_failure(layer_name)
+            return
+
+        self.notify_page(LAYER_EVENT, {"status": "failed", "name": layer_name, "message": failure_message})
+        self.show_message("Attenzione!", failure_message)
+
+    def slot_layer_built(self, task, record):
+        """
+            Add the layer built in background to the QGis TOC.
+            :param task: The ended task
+            :type task: CsiLayerTask
+            :param record: The log record of the operation
+            :type record: CsiLogRecord
+        """
+        QgsProject.instance().addMapLayer(task.layer)
+        if task.style_error_message:
+            record.add("style", task.style_error_message)
+            record.raise_level(Qgis.Warning)
+        record.emit()
+        self.notify_page(LAYER_EVENT, {"status": "completed", "name": task.layer_name, "id": task.layer.id()})
+        if task.style_error_message:
+            self.show_message("Attenzione!", "Stile non applicato al layer {}:\n{}"
+                              .format(task.layer_name, task.style_error_message))
+
+    def slot_layer_failed(self, task, record, failure_message):
+        """
+            Notify the failure of the layer built in background.
+            :param task: The ended task
+            :type task: CsiLayerTask
+            :param record: The log record of the operation
+            :type record: CsiLogRecord
+            :param failure_message: The message shown to the user
+            :type failure_message: str
+        """
+        record.add("result", "canceled" if task.isCanceled() else task.error_message or "invalid layer")
+        record.raise_level(Qgis.Warning)
+        record.emit()
+
+        # The user canceled the task from the QGIS task manager, no need to report it
+        if task.isCanceled():
+            self.notify_page(LAYER_EVENT, {"status": "canceled", "name": task.layer_name})
+            return
+
+        self.notify_page(LAYER_EVENT, {"status": "failed", "name": task.layer_name, "message": task.error_message})
+        self.show_message("Attenzione!", failure_message)
+
+    def slot_layer_progress(self, task, progress):
+        """
+            Notify the page about the progress of the layer built in background.
+            :param task: The task
+            :type task: CsiLayerTask
+            :param progress: The progress percentage
+            :type progress: float
+        """
+        self.notify_page(LAYER_EVENT, {"status": "progress", "name": task.layer_name, "progress": progress})
 
     def check_download_folder(self):
         """
@@ -773,30 +1282,94 @@ class JsManager(QtCore.QObject):
         QMessageBox.information(None, title, message)
         return False
 
-    def download_qml(self, qml_url, qml_file_name):
+    def download_qml(self, qml_url, qml_file_name, callback, origin=None):
         """
-            Download the *.qml file.
+            Retrieve the *.qml file from the cache or download it in background.
+            A cached file is used as is within its max age, afterwards it is revalidated with a conditional request.
             :param qml_url: The URL for retrieving the *.qml file
             :type qml_url: str
             :param qml_file_name: The *.qml file name
             :type qml_file_name: str
+            :param callback: The function invoked with the *.qml file path once it is available
+            :type callback: function
+            :param origin: The name of the operation requesting the *.qml file, reported in the network metrics
+            :type origin: str
         """
         local_file_path = os.path.join(self.download_folder_path, qml_file_name)
 
-        qgs_logger = QgsApplication.messageLog()
-        qgs_logger.logMessage('scaricaQML: {}'.format(qml_url), tag=configuration.LOGGER_TAG, level=Qgis.Info)
+        self.logger.info("scaricaQML: {}", qml_url)
+
+        # The cached file is still fresh, or it can't be revalidated offline: no need to contact the server
+        entry = self.qml_cache.lookup(qml_url)
+        if entry is not None and (self.qml_cache.is_fresh(entry) or self.is_offline()):
+            self.provide_qml(qml_url, local_file_path)
+            callback(local_file_path)
+            return
+
+        self.download_manager.download(qml_url, self.qml_cache.get_download_file_path(qml_url),
+                                       lambda download: self.slot_qml_downloaded(download, local_file_path, callback),
+                                       headers=self.qml_cache.get_validation_headers(entry), origin=origin)
+
+    def slot_qml_downloaded(self, download, local_file_path, callback):
+        """
+            Update the *.qml cache with the download result and provide the file to the callback.
+            :param download: The finished download
+            :type download: CsiFileDownload
+            :param local_file_path: The *.qml file path in the download folder
+            :type local_file_path: str
+            :param callback: The function invoked with the *.qml file path
+            :type callback: function
+        """
+        uncached_file_path = None
+        if download.not_modified:
+            self.qml_cache.mark_validated(download.url)
+        elif download.succeeded:
+            if not self.qml_cache.store(download.url, download.local_file_path, download.response_headers):
+                uncached_file_path = download.local_file_path
+
+        # In case of failure the layer is styled with the previously cached *.qml, if any
+        self.provide_qml(download.url, local_file_path, uncached_file_path)
+        callback(local_file_path)
+
+    def provide_qml(self, qml_url, local_file_path, uncached_file_path=None):
+        """
+            Copy the *.qml file to the download folder, from the cache or, for a file too large to be cached, from
+            the download. In case it is not available, the file previously copied there is removed, so that the
+            layer is not styled with a stale *.qml: the missing style is reported once the layer is built.
+            :param qml_url: The URL of the *.qml file
+            :type qml_url: str
+            :param local_file_path: The *.qml file path in the download folder
+            :type local_file_path: str
+            :param uncached_file_path: The downloaded file, not stored in the cache, if any
+            :type uncached_file_path: str
+            :return: True in case the file is available
+            :rtype: bool
+        """
+        if uncached_file_path is not None:
+            try:
+                shutil.copyfile(uncached_file_path, local_file_path)
+                return True
+            except OSError:
+                pass
+        elif self.qml_cache.copy_to(qml_url, local_file_path):
+            return True
 
-        # Download the file
-        request = QtNetwork.QNetworkRequest(QUrl(qml_url))
-        reply = self.web_view.page().networkAccessManager().get(request)
-        evloop = QEventLoop()
-        reply.finished.connect(evloop.quit)
-        evloop.exec_()
-        response = bytearray(reply.readAll())
-        with open(local_file_path, "wb") as f:
-            f.write(response)
+        self.logger.warning("provide_qml: stile non disponibile {}", qml_url)
+        if os.path.exists(local_file_path):
+            os.remove(local_file_path)
+        return False
 
-        return local_file_path
+    def get_remote_file_name(self, url):
+        """
+            Retrieve the local file name for the remote file from the URL.
+            :param url: The URL for accessing the remote file
+            :type url: str
+            :return: The file name
+            :rtype: str
+        """
+        file_name = url.split("://")
+        file_name = file_name[len(file_name) - 1]
+        return file_name.replace("/", "_")
 
     def get_qml_file_name(self, qml_url):
         """
@@ -815,12 +1388,10 @@ class JsManager(QtCore.QObject):
                 - the user in the session
                 - the user password in the session
         """
-        self.download_folder_path = csi_utils.get_qgs_settings_value_or_default(
+        self.download_folder_path = self.settings.value(
             "CSIAtlanteWI/cartellaScaricoPacchetti", default="", value_type=str)
-        self.session_user = csi_utils.get_qgs_settings_value_or_default(
-            "CSIAtlanteWI/user", default="", value_type=str)
-        self.session_password = csi_utils.get_qgs_settings_value_or_default(
-            "CSIAtlanteWI/password", default="", value_type=str)
+        self.session_user = self.settings.value("CSIAtlanteWI/user", default="", value_type=str)
+        self.session_password = self.settings.value("CSIAtlanteWI/password", default="", value_type=str)
 
     def save_configuration(self):
         """
@@ -829,9 +1400,9 @@ class JsManager(QtCore.QObject):
                 - the user in the session
                 - the user password in the session
         """
-        csi_utils.set_qgs_settings_value("CSIAtlanteWI/cartellaScaricoPacchetti", self.download_folder_path)
-        csi_utils.set_qgs_settings_value("CSIAtlanteWI/user", self.session_user)
-        csi_utils.set_qgs_settings_value("CSIAtlanteWI/password", self.session_password)
+        self.settings.set_value("CSIAtlanteWI/cartellaScaricoPacchetti", self.download_folder_path)
+        self.settings.set_value("CSIAtlanteWI/user", self.session_user)
+        self.settings.set_value("CSIAtlanteWI/password", self.session_password)
 
     @QtCore.pyqtSlot(str)
     def open_href(self, url):